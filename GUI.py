@@ -1,7 +1,7 @@
 import tkinter as tk
 from tkinter import filedialog
 import shutil
-import model  # 确保有一个名为model.py的文件，且其中包含一个名为main的函数
+import model_gui  # 确保有一个名为model_gui.py的文件，且其中包含一个名为main的函数
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from tkinter import PhotoImage
 from PIL import Image, ImageTk
@@ -22,7 +22,7 @@ def upload_image(move_name):
         # 保存文件
         shutil.copy(filepath, save_path + move_name + filepath[filepath.rfind('.'):])  # 拼接文件名和扩展名
         print("文件已保存到:", save_path + move_name + filepath[filepath.rfind('.'):])
-        model.main(move_name)  # 调用模型处理功能
+        model_gui.main(move_name)  # 调用模型处理功能
     else:
         print("没有选择文件")
 
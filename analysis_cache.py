@@ -0,0 +1,261 @@
+'''
+分析结果缓存
+
+同一图像或视频重复上传时直接返回上一次的分析结果，不再推理。缓存键由文件内容的SHA-256、
+姿势和分析参数组成，与文件名无关。内存中按LRU保留最近的结果；设置WUDAO_ANALYSIS_CACHE_DIR后
+结果同时以JSON写入该目录，进程重启或多个Web worker之间也能命中。
+视频结果带有base64编码的关键帧图像，单个结果可达数MB，内存缓存除条目数外还按结果的JSON字节数设上限。
+实时摄像头帧几乎不会重复，不进入缓存，避免挤掉图像和视频的结果。
+
+缓存只对已完成的分析生效。前端重试或重复点击时，相同的请求可能在第一个请求完成前到达，
+SingleFlight让这些请求等待正在进行的分析，共享同一个结果。
+'''
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# 内存中保留的结果数
+ANALYSIS_CACHE_SIZE = int(os.environ.get('WUDAO_ANALYSIS_CACHE_SIZE', 256))
+# 内存中保留的结果总字节数（按JSON序列化后的大小计），超过时淘汰最久未使用的结果
+ANALYSIS_CACHE_BYTES = int(os.environ.get('WUDAO_ANALYSIS_CACHE_BYTES', 64 * 1024 * 1024))
+# 磁盘缓存目录，为空时只使用内存缓存
+ANALYSIS_CACHE_DIR = os.environ.get('WUDAO_ANALYSIS_CACHE_DIR', '')
+# 磁盘上保留的结果数
+ANALYSIS_CACHE_DISK_SIZE = int(os.environ.get('WUDAO_ANALYSIS_CACHE_DISK_SIZE', 2048))
+# 每写入这么多个结果清理一次磁盘缓存，清理需要扫描整个目录，不在每次写入时进行
+DISK_PRUNE_INTERVAL = 64
+# 分析算法或结果格式变化时递增，使旧的缓存结果失效
+CACHE_VERSION = 1
+# 计算文件哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def content_hash(data):
+    """字节串的SHA-256"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def stream_hash(stream):
+    """
+    分块计算上传文件流的SHA-256，计算后把流移回开头，之后仍可正常保存
+
+    Args:
+        stream: 可seek的文件对象，例如request.files中FileStorage的stream
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    按内容寻址的分析结果LRU缓存，结果必须可以序列化为JSON
+
+    用法:
+        key = analysis_cache.make_key('image', stream_hash(file.stream), posture)
+        result = analysis_cache.get(key)
+        if result is None:
+            result = ...
+            analysis_cache.put(key, result)
+    """
+
+    def __init__(self, max_entries=ANALYSIS_CACHE_SIZE, directory=ANALYSIS_CACHE_DIR,
+                 max_disk_entries=ANALYSIS_CACHE_DISK_SIZE, max_bytes=ANALYSIS_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # 键 -> (结果, JSON字节数)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # 上次清理磁盘缓存后写入的结果数，首次写入时先清理一次
+        self._disk_writes = DISK_PRUNE_INTERVAL
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind, digest, posture, **params):
+        """
+        由接口类型、内容哈希、姿势和分析参数生成缓存键
+
+        Args:
+            kind: 结果类型，例如'image'、'camera'、'video'，不同接口的结果结构不同
+            digest: 文件内容的哈希
+            posture: 请求中的姿势名称
+            params: 影响结果的其他参数，例如采样策略
+        """
+        material = json.dumps([CACHE_VERSION, kind, digest, posture, sorted(params.items())], ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """取出缓存结果，未命中返回None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+        value, size = self._load(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value, size)
+        return value
+
+    def put(self, key, value):
+        """保存分析结果，内存中超出条目数或字节数上限时淘汰最久未使用的结果"""
+        data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            self._remember(key, value, len(data))
+        self._store(key, data)
+
+    def _remember(self, key, value, size):
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        # 单个结果超过字节上限时不放入内存，磁盘缓存不受影响
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._bytes -= self._entries.popitem(last=False)[1][1]
+
+    def _load(self, key):
+        """从磁盘读取结果，返回(结果, 文件字节数)，未命中时结果为None"""
+        if not self.directory or not os.path.exists(self._disk_path(key)):
+            return None, 0
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                data = f.read()
+            value = json.loads(data.decode('utf-8'))
+            # 以修改时间记录最近使用，淘汰磁盘缓存时使用
+            os.utime(self._disk_path(key))
+            return value, len(data)
+        except Exception as e:
+            print(f"读取分析缓存出错: {e}")
+            return None, 0
+
+    def _store(self, key, data):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self._disk_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+            with self._lock:
+                self._disk_writes += 1
+                prune = self._disk_writes >= DISK_PRUNE_INTERVAL
+                if prune:
+                    self._disk_writes = 0
+            if prune:
+                self._prune_disk()
+        except Exception as e:
+            print(f"写入分析缓存出错: {e}")
+
+    def _prune_disk(self):
+        """磁盘上的结果超出上限时删除最久未使用的文件，两次清理之间最多超出DISK_PRUNE_INTERVAL个"""
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk': bool(self.directory),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class SingleFlight:
+    """
+    合并同一个键上并发的相同调用：第一个调用者执行，其余调用者等待并得到同一个结果或异常
+
+    用法:
+        result, shared = single_flight.do(cache_key, run_analysis)
+    """
+
+    def __init__(self):
+        # 实际执行的次数，以及等待他人结果而省去的次数
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        执行fn()，同一个键已有调用在进行时等待其结果
+
+        Returns:
+            tuple: (fn的返回值, 是否共享了其他调用者的结果)
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+            }
+
+
+analysis_cache = AnalysisCache()
+single_flight = SingleFlight()
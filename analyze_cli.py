@@ -0,0 +1,310 @@
+'''
+批量分析命令行工具
+
+遍历目录中的全部图像和视频，由进程池逐个分析，每个进程占用一个CPU核心，结果写成JSON和CSV报告。
+每完成一个文件就把结果追加到检查点文件，中断后使用--resume重新运行会跳过已完成且未修改的文件。
+
+用法:
+    python analyze_cli.py archive/ --posture 弓步冲拳 --output reports/archive
+    python analyze_cli.py archive/ --output reports/archive --resume
+'''
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import model
+import video_analysis
+import web_model
+from posture_registry import AUTO_POSTURE, registry
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'webm'}
+DEFAULT_OUTPUT = 'analysis_report'
+# CSV报告的列
+CSV_FIELDS = ['path', 'type', 'posture', 'success', 'score', 'level', 'frames', 'seconds', 'message']
+
+
+def _extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def find_media(directory, recursive=True):
+    """
+    列出目录中的图像和视频
+
+    Returns:
+        list: [(相对路径, 'image'或'video')]，按路径排序
+    """
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+        for name in names:
+            if name.startswith('.'):
+                continue
+            extension = _extension(name)
+            kind = 'image' if extension in IMAGE_EXTENSIONS else 'video' if extension in VIDEO_EXTENSIONS else None
+            if kind:
+                files.append((os.path.relpath(os.path.join(root, name), directory), kind))
+        if not recursive:
+            break
+    return sorted(files)
+
+
+def file_signature(path):
+    """文件大小和修改时间，文件被替换或修改后检查点中的结果失效"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+def _analyze_image(path, posture):
+    img = model.cv_imread(path)
+    if img is None:
+        return {'success': False, 'message': model.INVALID_IMAGE_ERROR.format(path), 'posture': posture}
+    analysis = web_model.analyze_frame(img, posture)
+    if analysis.error:
+        return {'success': False, 'message': analysis.error, 'posture': analysis.posture}
+    return {
+        'success': True,
+        'posture': analysis.posture,
+        'posture_matches': analysis.matches,
+        'score': round(analysis.score, 2),
+        'feedback': analysis.feedback,
+        'angle_data': analysis.angle_data(),
+    }
+
+
+def _analyze_video(path, posture, policy, value, max_frames):
+    # 文件之间已经按进程并行，视频内部不再启动推理线程或分段进程
+    result = video_analysis.process_video(path, posture, policy=policy, value=value, max_frames=max_frames,
+                                          workers=1, segments=1)
+    if 'error' in result:
+        return {'success': False, 'message': result['error'], 'posture': posture}
+    return {
+        'success': True,
+        'posture': result['posture'],
+        'score': round(result['average_score'], 2),
+        'frames': len(result['frame_scores']),
+        'truncated': result['truncated'],
+        'frame_scores': result['frame_scores'],
+        'feedback': result['feedback'],
+        'angle_data': result['angle_data'],
+    }
+
+
+def analyze_file(directory, relative_path, kind, posture, policy, value, max_frames):
+    """在工作进程中分析一个文件，返回写入检查点和报告的记录"""
+    path = os.path.join(directory, relative_path)
+    start = time.perf_counter()
+    try:
+        if kind == 'image':
+            result = _analyze_image(path, posture)
+        else:
+            result = _analyze_video(path, posture, policy, value, max_frames)
+    except Exception as e:
+        result = {'success': False, 'message': f'分析出错: {str(e)}', 'posture': posture}
+    result.update(path=relative_path, type=kind, requested_posture=posture,
+                  seconds=round(time.perf_counter() - start, 3), **file_signature(path))
+    return result
+
+
+def load_checkpoint(checkpoint_path):
+    """读取检查点文件，返回{相对路径: 记录}；同一文件出现多次时以最后一条为准"""
+    records = {}
+    if not os.path.exists(checkpoint_path):
+        return records
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 进程被强行终止时最后一行可能不完整
+                continue
+            records[record['path']] = record
+    return records
+
+
+def is_done(record, directory, posture):
+    """检查点中的记录是否仍然有效：姿势相同、文件未修改；分析时抛出异常的文件会重新分析"""
+    if record is None or record.get('requested_posture') != posture:
+        return False
+    path = os.path.join(directory, record['path'])
+    if not os.path.exists(path) or file_signature(path) != {'size': record['size'], 'mtime': record['mtime']}:
+        return False
+    return record.get('success') or not record.get('message', '').startswith('分析出错')
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Progress:
+    """打印已完成数、吞吐量和预计剩余时间"""
+
+    def __init__(self, total, skipped=0):
+        self.total = total
+        self.done = skipped
+        self.skipped = skipped
+        self.start = time.perf_counter()
+
+    def update(self, record):
+        self.done += 1
+        elapsed = time.perf_counter() - self.start
+        completed = self.done - self.skipped
+        rate = completed / elapsed if elapsed > 0 else 0
+        eta = (self.total - self.done) / rate if rate > 0 else 0
+        status = f"{record['score']:.2f} {record['posture']}" if record.get('success') else record.get('message')
+        print(f"[{self.done}/{self.total}] {record['path']}: {status} | "
+              f"{rate:.2f} 个/秒, 已用 {format_duration(elapsed)}, 预计剩余 {format_duration(eta)}", flush=True)
+
+
+def summarize(records, elapsed, workers):
+    """报告的汇总统计"""
+    succeeded = [record for record in records if record.get('success')]
+    scores = [record['score'] for record in succeeded]
+    by_posture = {}
+    for record in succeeded:
+        entry = by_posture.setdefault(record['posture'], {'count': 0, 'total': 0.0})
+        entry['count'] += 1
+        entry['total'] += record['score']
+
+    return {
+        'total': len(records),
+        'images': sum(1 for record in records if record['type'] == 'image'),
+        'videos': sum(1 for record in records if record['type'] == 'video'),
+        'succeeded': len(succeeded),
+        'failed': len(records) - len(succeeded),
+        'average_score': round(sum(scores) / len(scores), 2) if scores else 0,
+        'by_posture': {name: {'count': entry['count'], 'average_score': round(entry['total'] / entry['count'], 2)}
+                       for name, entry in by_posture.items()},
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 3),
+    }
+
+
+def write_reports(output, records, summary):
+    """写出<output>.json（完整结果）和<output>.csv（每个文件一行）"""
+    output_dir = os.path.dirname(output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(f"{output}.json", 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, 'results': records}, f, ensure_ascii=False, indent=2)
+
+    # utf-8-sig让Excel正确识别中文
+    with open(f"{output}.csv", 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            writer.writerow(dict(record, level=record.get('feedback', {}).get('level', ''),
+                                 frames=record.get('frames', 1 if record['type'] == 'image' else 0),
+                                 score=record.get('score', '')))
+
+
+def run(directory, posture=AUTO_POSTURE, output=DEFAULT_OUTPUT, workers=None, resume=False, recursive=True,
+        policy='fps', value=None, max_frames=None, checkpoint=None):
+    """
+    分析目录中的全部图像和视频并写出报告
+
+    Returns:
+        dict: 汇总统计
+    """
+    value = value or video_analysis.SAMPLE_DEFAULTS[policy]
+    checkpoint = checkpoint or f"{output}.checkpoint.jsonl"
+    files = find_media(directory, recursive)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files) or 1))
+
+    previous = load_checkpoint(checkpoint) if resume else {}
+    records = {path: previous[path] for path, _ in files if is_done(previous.get(path), directory, posture)}
+    pending = [(path, kind) for path, kind in files if path not in records]
+    print(f"共 {len(files)} 个文件，检查点中已完成 {len(records)} 个，待分析 {len(pending)} 个，进程数 {workers}")
+
+    checkpoint_dir = os.path.dirname(checkpoint)
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    if not resume and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    progress = Progress(len(files), skipped=len(records))
+    start = time.perf_counter()
+    if pending:
+        # 使用spawn启动工作进程，与video_jobs一致
+        # 估计器按需创建，每个进程逐个分析文件，只会创建一个估计器
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            # 视频耗时远多于图像，先提交视频，避免最后只剩一个长视频在跑
+            order = sorted(pending, key=lambda item: item[1] != 'video')
+            futures = [executor.submit(analyze_file, directory, path, kind, posture, policy, value, max_frames)
+                       for path, kind in order]
+            with open(checkpoint, 'a', encoding='utf-8') as f:
+                for future in as_completed(futures):
+                    record = future.result()
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    f.flush()
+                    records[record['path']] = record
+                    progress.update(record)
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    ordered = [records[path] for path, _ in files]
+    summary = summarize(ordered, elapsed, workers)
+    write_reports(output, ordered, summary)
+    print(f"分析完成: 成功 {summary['succeeded']}，失败 {summary['failed']}，平均分 {summary['average_score']}，"
+          f"用时 {format_duration(elapsed)}")
+    print(f"报告已写入 {output}.json 和 {output}.csv")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='武道智评批量分析：分析目录中的全部图像和视频并生成报告')
+    parser.add_argument('directory', help='要分析的目录')
+    parser.add_argument('--posture', default=AUTO_POSTURE,
+                        help=f'姿势名称或拼音代号，默认{AUTO_POSTURE}自动识别')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help='报告路径前缀，生成<output>.json和<output>.csv')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认为CPU核心数')
+    parser.add_argument('--resume', action='store_true', help='从检查点继续，跳过已完成且未修改的文件')
+    parser.add_argument('--checkpoint', default=None, help='检查点文件，默认<output>.checkpoint.jsonl')
+    parser.add_argument('--no-recursive', action='store_true', help='只分析目录本身，不进入子目录')
+    parser.add_argument('--sample-policy', default='fps', choices=video_analysis.FrameSampler.POLICIES,
+                        help='视频采样策略')
+    parser.add_argument('--sample-value', type=float, default=None,
+                        help='视频采样参数，默认fps为2帧/秒、interval为每30帧、count为60帧')
+    parser.add_argument('--max-frames', type=int, default=None, help='每个视频最多读取的帧数，默认整段视频')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"目录不存在: {args.directory}")
+    posture = args.posture
+    if posture != AUTO_POSTURE:
+        if registry.get(posture) is None:
+            parser.error(f"未知的姿势: {posture}")
+        posture = registry.get(posture).name
+    if args.sample_value is not None:
+        try:
+            args.sample_value = video_analysis.check_sample_value(args.sample_policy, args.sample_value)
+        except ValueError as e:
+            parser.error(str(e))
+
+    try:
+        run(args.directory, posture, args.output, args.workers, args.resume, not args.no_recursive,
+            args.sample_policy, args.sample_value, args.max_frames, args.checkpoint)
+    except KeyboardInterrupt:
+        print("\n已中断，使用--resume重新运行可从检查点继续")
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,29 +4,46 @@ from flask_jwt_extended import JWTManager, create_access_token, jwt_required, ge
 import os
 import json
 import hashlib
+import multiprocessing
 from datetime import timedelta
-import cv2
 import numpy as np
 import base64
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 
 # Import project modules
 import model
-from coordinate_master import *
+from posture_registry import registry, AUTO_POSTURE  # 标准姿势注册表
 import web_model  # Import the new web_model module
+import pose_pool
+import pose_server
+import pose_session
+import quality_controller  # 实时分析的自适应质量
+import video_analysis
+import batch_analysis
+from video_jobs import video_jobs, load_job, job_status  # 异步视频分析任务
+from analysis_cache import analysis_cache, single_flight, stream_hash  # 分析结果缓存
 import forum_api  # Import the forum API module
 from payment_api import payment_api  # Import the payment API module
 from course_api import course_api  # Import the course API module
 from annotations_api import annotations_api  # Import the annotations API module
+from camera_stream import sock, client_id  # 实时摄像头WebSocket接口
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='frontend/build')
+
+# 部署在反向代理之后时设置为代理的层数，ProxyFix只信任这么多层代理添加的X-Forwarded-For，
+# 还原出的客户端地址用于摄像头会话的归属；默认不信任任何代理请求头
+TRUSTED_PROXIES = int(os.environ.get('WUDAO_TRUSTED_PROXIES', 0))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
 CORS(app, resources={r"/*": {"origins": ["http://localhost:3001", "https://wudao.250555.xyz", "https://api.wudao.250555.xyz"], "supports_credentials": True}})
 
 # Register blueprints
 app.register_blueprint(payment_api)
 app.register_blueprint(course_api)
 app.register_blueprint(annotations_api)
+sock.init_app(app)
 
 # 配置静态文件路径
 app.config['UPLOAD_FOLDER'] = 'uploads'
@@ -51,6 +68,11 @@ os.makedirs('uploads/images', exist_ok=True)
 os.makedirs('uploads/videos', exist_ok=True)
 os.makedirs('img', exist_ok=True)
 
+# 预热姿态估计器，首个请求不再承担模型初始化的开销；使用独立推理服务时由服务进程预热。
+# 视频任务和分段分析的spawn子进程会以__mp_main__重新导入本模块，它们不使用估计器池，不预热
+if not pose_server.SERVER_SOCKET and multiprocessing.parent_process() is None:
+    pose_pool.start_warm_up()
+
 # 允许的文件类型
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'mkv'}
@@ -245,20 +267,14 @@ def get_user():
 # Pose data routes
 @app.route('/api/poses', methods=['GET'])
 def get_poses():
-    poses = [
-        '弓步冲拳', '猛虎出洞', '五花坐山',
-        '滚身冲拳', '猿猴纳肘', '马步推掌',
-        '并步崩拳', '狮子张嘴', '马步扣床',
-        '罗汉张掌'
-    ]
-    return jsonify({'success': True, 'poses': poses}), 200
+    return jsonify({'success': True, 'poses': registry.names}), 200
 
 @app.route('/api/angles/<pose_name>', methods=['GET'])
 def get_angle_data(pose_name):
     """
     获取特定姿势的关节角度数据，用于可视化
     """
-    # 习武者关节角度数据
+    # 习武者关节角度示例数据
     practitioner_angles = {
         '弓步冲拳': [
             {'joint': '0-2 和 2-4夹角为', 'angle': 171.24},
@@ -298,54 +314,16 @@ def get_angle_data(pose_name):
         ]
     }
     
-    # 传承人关节角度数据
-    master_angles = {
-        '弓步冲拳': [
-            {'joint': '0-2 和 2-4夹角为', 'angle': 155.60},
-            {'joint': '1-3 和 3-5夹角为', 'angle': 159.79},
-            {'joint': '2-0 和 0-6夹角为', 'angle': 115.97},
-            {'joint': '3-1 和 1-7夹角为', 'angle': 68.88},
-            {'joint': '0-6 和 6-8夹角为', 'angle': 151.87},
-            {'joint': '1-7 和 7-9夹角为', 'angle': 176.27},
-            {'joint': '7-6 和 6-8夹角为', 'angle': 134.59},
-            {'joint': '6-7 和 7-9夹角为', 'angle': 135.88},
-            {'joint': '6-8 和 8-10夹角为', 'angle': 150.69},
-            {'joint': '7-9 和 9-11夹角为', 'angle': 162.30}
-        ],
-        '猛虎出洞': [
-            {'joint': '0-2 和 2-4夹角为', 'angle': 175.45},
-            {'joint': '1-3 和 3-5夹角为', 'angle': 174.67},
-            {'joint': '2-0 和 0-6夹角为', 'angle': 130.23},
-            {'joint': '3-1 和 1-7夹角为', 'angle': 131.45},
-            {'joint': '0-6 和 6-8夹角为', 'angle': 165.67},
-            {'joint': '1-7 和 7-9夹角为', 'angle': 166.89},
-            {'joint': '7-6 和 6-8夹角为', 'angle': 155.34},
-            {'joint': '6-7 和 7-9夹角为', 'angle': 154.56},
-            {'joint': '6-8 和 8-10夹角为', 'angle': 170.78},
-            {'joint': '7-9 和 9-11夹角为', 'angle': 169.90}
-        ],
-        '五花坐山': [
-            {'joint': '0-2 和 2-4夹角为', 'angle': 90.45},
-            {'joint': '1-3 和 3-5夹角为', 'angle': 92.67},
-            {'joint': '2-0 和 0-6夹角为', 'angle': 95.23},
-            {'joint': '3-1 和 1-7夹角为', 'angle': 96.45},
-            {'joint': '0-6 和 6-8夹角为', 'angle': 125.67},
-            {'joint': '1-7 和 7-9夹角为', 'angle': 124.89},
-            {'joint': '7-6 和 6-8夹角为', 'angle': 90.34},
-            {'joint': '6-7 和 7-9夹角为', 'angle': 89.56},
-            {'joint': '6-8 和 8-10夹角为', 'angle': 135.78},
-            {'joint': '7-9 和 9-11夹角为', 'angle': 136.90}
-        ]
-    }
-    
-    if pose_name in practitioner_angles and pose_name in master_angles:
-        return jsonify({
-            'success': True, 
-            'practitioner_angles': practitioner_angles[pose_name],
-            'master_angles': master_angles[pose_name]
-        }), 200
-    else:
+    # 传承人关节角度由姿势注册表从标准姿势关键点预先计算
+    master = registry.get(pose_name)
+    if master is None:
         return jsonify({'success': False, 'message': '未找到该姿势的角度数据'}), 404
+    
+    return jsonify({
+        'success': True, 
+        'practitioner_angles': practitioner_angles.get(pose_name, []),
+        'master_angles': web_model.angle_list(master.angles)
+    }), 200
 
 @app.route('/api/pose_keypoints/<pose_name>', methods=['GET'])
 def get_pose_keypoints(pose_name):
@@ -441,68 +419,114 @@ def get_pose_keypoints(pose_name):
 
 @app.route('/api/poses/<pose_name>', methods=['GET'])
 def get_pose_details(pose_name):
-    pose_details = {
-        '弓步冲拳': {
-            'name': '弓步冲拳',
-            'description': '弓步冲拳是武术中最基本的招式之一，要求前腿弯曲，后腿伸直，上身挺直，拳头有力向前冲出。',
-            'key_points': ['前腿膝盖应在脚尖上方', '拳头应与肩同高', '后腿需绷直', '重心应在前腿']
-        },
-        '猛虎出洞': {
-            'name': '猛虎出洞',
-            'description': '猛虎出洞是武术中的一种攻击招式，模仿猛虎出洞扑食的动作，要求双手成虎爪状，有力向前推出。',
-            'key_points': ['虎爪五指张开，指尖用力', '手臂伸展有力', '步伐稳健有力', '身体重心保持稳定']
-        },
-        '五花坐山': {
-            'name': '五花坐山',
-            'description': '五花坐山是一种稳定的坐姿招式，上身保持挺直，手臂做五花环绕动作，下肢稳固盘坐。',
-            'key_points': ['下肢稳固盘坐', '上身保持挺直', '手臂动作协调', '呼吸与动作结合']
-        },
-        # 添加其他招式的详细信息
-    }
-    
-    if pose_name in pose_details:
-        return jsonify({'success': True, 'pose': pose_details[pose_name]}), 200
+    master = registry.get(pose_name)
+    if master is not None and master.description:
+        return jsonify({'success': True, 'pose': master.details()}), 200
     else:
         return jsonify({'success': False, 'message': '未找到该招式信息'}), 404
 
 # Image analysis route
 @app.route('/api/analysis/image', methods=['POST'])
 def analyze_image():
-    if 'image' not in request.files or 'posture' not in request.form:
-        return jsonify({'success': False, 'message': '缺少图像或姿势类型'}), 400
+    if 'image' not in request.files:
+        return jsonify({'success': False, 'message': '缺少图像'}), 400
     
     file = request.files['image']
-    posture = request.form['posture']
+    # 未指定姿势时自动识别
+    posture = request.form.get('posture') or AUTO_POSTURE
     
     if file.filename == '':
         return jsonify({'success': False, 'message': '未选择文件'}), 400
     
     if file and allowed_image_file(file.filename):
         try:
-            # Save the uploaded file
-            filename = secure_filename(file.filename)
-            file_path = os.path.join('uploads/images', filename)
-            file.save(file_path)
-            
-            # Analyze the image
-            score, processed_img_path, feedback = web_model.analyze_martial_arts_image(file_path, posture)
+            # 同一内容、同一姿势的图像直接返回缓存结果
+            cache_key = analysis_cache.make_key('image', stream_hash(file.stream), posture)
+            cached = analysis_cache.get(cache_key)
+            if cached is not None and os.path.exists(cached['image_path']):
+                return jsonify(dict(cached, cached=True)), 200
             
-            # 获取角度数据
-            angle_data = web_model.get_angle_data_for_image(file_path, posture)
+            def run_analysis():
+                # Save the uploaded file
+                filename = secure_filename(file.filename)
+                file_path = os.path.join('uploads/images', filename)
+                file.save(file_path)
+                
+                # 只读取和推理一次，评分、角度数据和标注图像都来自同一个分析结果
+                img = model.cv_imread(file_path)
+                if img is None:
+                    return {'success': False, 'message': '无法读取图像，请检查文件格式'}, 400
+                analysis = web_model.analyze_frame(img, posture)
+                if analysis.error:
+                    return {'success': False, 'message': analysis.error, 'feedback': analysis.feedback}, 200
+                processed_img_path = analysis.save_overlay(file_path)
+                
+                # Return the analysis result
+                response = {
+                    'success': True,
+                    'score': round(analysis.score, 2),
+                    'posture': analysis.posture,
+                    'posture_matches': analysis.matches,
+                    'keypoints': analysis.keypoints_data,
+                    'image_path': processed_img_path.replace('\\', '/'),
+                    'feedback': analysis.feedback,
+                    'angle_data': analysis.angle_data()
+                }
+                analysis_cache.put(cache_key, response)
+                return response, 200
             
-            # Return the analysis result
-            return jsonify({
-                'success': True,
-                'score': round(score, 2),
-                'image_path': processed_img_path.replace('\\', '/'),
-                'feedback': feedback,
-                'angle_data': angle_data
-            }), 200
+            # 相同的请求正在分析时等待其结果，不重复推理
+            (response, status), shared = single_flight.do(cache_key, run_analysis)
+            return jsonify(dict(response, cached=False, coalesced=shared)), status
+        except pose_pool.PoolTimeoutError as e:
+            return jsonify({'success': False, 'message': str(e)}), 503
         except Exception as e:
             return jsonify({'success': False, 'message': f'分析出错: {str(e)}'}), 500
     
     return jsonify({'success': False, 'message': '不支持的文件类型'}), 400
 
+# 批量图像分析
+@app.route('/api/analysis/images/batch', methods=['POST'])
+def analyze_image_batch():
+    """
+    一次分析多张图像
+
+    - images: 多个图像文件，和/或 archive: 包含图像的zip压缩包
+    - posture: 可选，所有图像共用的姿势，省略时自动识别
+    - postures: 可选，JSON列表（与上传顺序对应）或{文件名: 姿势}
+    - include_images: 为真时结果中返回base64标注图像
+    """
+    try:
+        uploads = []
+        for file in request.files.getlist('images'):
+            if not file.filename:
+                continue
+            if allowed_image_file(file.filename):
+                uploads.append((file.filename, file.read(), None))
+            else:
+                uploads.append((file.filename, None, batch_analysis.UNSUPPORTED_FILE_ERROR))
+        archive = request.files.get('archive')
+        if archive is not None and archive.filename:
+            uploads += batch_analysis.read_zip_images(archive.stream, ALLOWED_IMAGE_EXTENSIONS,
+                                                      batch_analysis.MAX_BATCH_IMAGES - len(uploads))
+        if not uploads:
+            return jsonify({'success': False, 'message': '缺少图像'}), 400
+        if len(uploads) > batch_analysis.MAX_BATCH_IMAGES:
+            raise ValueError(batch_analysis.TOO_MANY_IMAGES_ERROR.format(batch_analysis.MAX_BATCH_IMAGES))
+        
+        postures = batch_analysis.assign_postures([name for name, _, _ in uploads],
+                                                  request.form.get('posture'), request.form.get('postures'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    include_images = request.form.get('include_images', '').lower() in ('1', 'true', 'yes')
+    items = [upload + (posture,) for upload, posture in zip(uploads, postures)]
+    try:
+        result = batch_analysis.analyze_batch(items, include_images=include_images)
+        return jsonify(dict(result, success=True)), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'分析出错: {str(e)}'}), 500
+
 # Video analysis route
 @app.route('/api/analysis/video', methods=['POST'])
 def analyze_video():
@@ -515,124 +539,235 @@ def analyze_video():
     if file.filename == '':
         return jsonify({'success': False, 'message': '未选择文件'}), 400
     
+    try:
+        policy, value = get_sampling_options()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
     if file and allowed_video_file(file.filename):
         try:
-            # Save the uploaded file
-            filename = secure_filename(file.filename)
-            file_path = os.path.join('uploads/videos', filename)
-            file.save(file_path)
+            # 同一内容、姿势和采样参数的视频直接返回缓存结果
+            cache_key = analysis_cache.make_key('video', stream_hash(file.stream), posture, policy=policy,
+                                                value=value, max_frames=video_analysis.MAX_VIDEO_FRAMES)
+            cached = analysis_cache.get(cache_key)
+            if cached is not None:
+                return jsonify(dict(cached, cached=True)), 200
             
-            # Process the video
-            result = process_video(file_path, posture)
+            def run_analysis():
+                # Save the uploaded file
+                filename = secure_filename(file.filename)
+                file_path = os.path.join('uploads/videos', filename)
+                file.save(file_path)
+                
+                # 同步接口占用请求线程，只分析前MAX_VIDEO_FRAMES帧；完整视频请使用异步任务接口
+                result = process_video(file_path, posture, policy, value, max_frames=video_analysis.MAX_VIDEO_FRAMES)
+                
+                # 获取角度数据
+                angle_data = result.get('angle_data', {})
+                
+                # Return the analysis result
+                response = {
+                    'success': True,
+                    'posture': result.get('posture', posture),
+                    'average_score': result.get('average_score', 0),
+                    'frame_scores': result.get('frame_scores', []),
+                    'key_frames': result.get('key_frames', []),
+                    'feedback': result.get('feedback', {}),
+                    'angle_data': angle_data,
+                    'truncated': result.get('truncated', False)
+                }
+                if 'error' not in result:
+                    analysis_cache.put(cache_key, response)
+                return response
             
-            # 获取角度数据
-            angle_data = result.get('angle_data', {})
+            # 相同的请求正在分析时等待其结果，不重复推理
+            response, shared = single_flight.do(cache_key, run_analysis)
+            return jsonify(dict(response, cached=False, coalesced=shared)), 200
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'分析出错: {str(e)}'}), 500
+    
+    return jsonify({'success': False, 'message': '不支持的文件类型'}), 400
+
+# 异步视频分析任务
+@app.route('/api/analysis/video/jobs', methods=['POST'])
+def submit_video_job():
+    if 'video' not in request.files or 'posture' not in request.form:
+        return jsonify({'success': False, 'message': '缺少视频或姿势类型'}), 400
+    
+    file = request.files['video']
+    posture = request.form['posture']
+    
+    if file.filename == '':
+        return jsonify({'success': False, 'message': '未选择文件'}), 400
+    
+    try:
+        policy, value = get_sampling_options()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if file and allowed_video_file(file.filename):
+        try:
+            import uuid
+            # 文件名加上唯一前缀，避免并发任务互相覆盖上传的视频
+            filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+            file_path = os.path.join('uploads/videos', filename)
+            file.save(file_path)
             
-            # Return the analysis result
+            job = video_jobs.submit(file_path, posture, policy, value)
             return jsonify({
                 'success': True,
-                'average_score': result.get('average_score', 0),
-                'frame_scores': result.get('frame_scores', []),
-                'key_frames': result.get('key_frames', []),
-                'feedback': result.get('feedback', {}),
-                'angle_data': angle_data
-            }), 200
+                'job_id': job['job_id'],
+                'status': job['status'],
+                'status_url': f"/api/analysis/video/jobs/{job['job_id']}",
+                'result_url': f"/api/analysis/video/jobs/{job['job_id']}/result"
+            }), 202
         except Exception as e:
-            return jsonify({'success': False, 'message': f'分析出错: {str(e)}'}), 500
+            return jsonify({'success': False, 'message': f'提交任务出错: {str(e)}'}), 500
     
     return jsonify({'success': False, 'message': '不支持的文件类型'}), 400
 
+@app.route('/api/analysis/video/jobs/<job_id>', methods=['GET'])
+def get_video_job(job_id):
+    job = load_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    return jsonify({'success': True, 'job': job_status(job)}), 200
+
+@app.route('/api/analysis/video/jobs/<job_id>/result', methods=['GET'])
+def get_video_job_result(job_id):
+    job = load_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    if job['status'] != 'done':
+        return jsonify({
+            'success': False,
+            'message': job.get('error') or '任务尚未完成',
+            'job': job_status(job)
+        }), 409 if job['status'] in ('queued', 'running') else 200
+    
+    result = job['result']
+    return jsonify({
+        'success': True,
+        'posture': result.get('posture', job['posture']),
+        'average_score': result.get('average_score', 0),
+        'frame_scores': result.get('frame_scores', []),
+        'key_frames': result.get('key_frames', []),
+        'feedback': result.get('feedback', {}),
+        'angle_data': result.get('angle_data', {}),
+        'truncated': result.get('truncated', False)
+    }), 200
+
+@app.route('/api/analysis/video/jobs/<job_id>', methods=['DELETE'])
+def cancel_video_job(job_id):
+    job = video_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    return jsonify({'success': True, 'job': job_status(load_job(job_id))}), 200
+
 # Camera frame analysis route
 @app.route('/api/analysis/camera', methods=['POST'])
 @app.route('/api/analysis/camera-frame', methods=['POST'])  # 添加兼容旧版本的路由
 def analyze_camera_frame():
-    print("收到摄像头分析请求:", request.content_type)
-    
+    """
+    分析一帧摄像头图像，全程在内存中完成
+
+    支持两种请求格式:
+    - JSON: {"image": base64图像, "posture": 可选, "session_id": 可选, "persist": 可选}
+    - 原始图像字节(Content-Type: image/jpeg等)，posture/session_id/persist放在查询参数中
+    未指定posture或为"auto"时自动识别姿势；persist为真时才把原始帧和标注图像保存到磁盘。
+    负载较高时自动降低输入分辨率和模型复杂度，响应中的quality为本帧实际使用的质量档位。
+    同一帧在不同档位下的结果不同，摄像头帧不进入analysis_cache
+    """
     try:
-        # 处理JSON格式请求
         if request.is_json:
-            if 'image' not in request.json or 'posture' not in request.json:
-                return jsonify({'success': False, 'message': '缺少图像数据或姿势类型'}), 400
+            if 'image' not in request.json:
+                return jsonify({'success': False, 'message': '缺少图像数据'}), 400
             
             # Get base64 image and posture type
             image_data = request.json['image']
-            posture = request.json['posture']
-            print(f"接收到姿势类型: {posture}")
+            posture = request.json.get('posture') or AUTO_POSTURE
+            session_id = request.json.get('session_id')
+            persist = bool(request.json.get('persist', False))
             
             # 确保image_data是base64格式
             if ',' in image_data:
                 image_data = image_data.split(',')[1]
-            
-            try:
-                import io
-                from PIL import Image, ImageDraw
-                import numpy as np
-                import base64
-                import os
-                import uuid
-                import web_model
-                
-                print("开始处理摄像头图像...")
-                
-                # 解码base64图像并保存为临时文件
-                image_bytes = base64.b64decode(image_data)
-                temp_filename = f"temp_camera_{uuid.uuid4().hex}.jpg"
-                temp_filepath = os.path.join('uploads/images', temp_filename)
-                
-                # 确保目录存在
-                os.makedirs('uploads/images', exist_ok=True)
-                print(f"保存临时文件到: {temp_filepath}")
-                
-                # 保存临时文件
-                with open(temp_filepath, 'wb') as f:
-                    f.write(image_bytes)
-                
-                print("调用 web_model.analyze_martial_arts_image 进行分析...")
-                # 使用图片分析功能分析图像
-                score, processed_img_path, feedback = web_model.analyze_martial_arts_image(temp_filepath, posture)
-                print(f"分析结果: 得分={score}, 处理后图像路径={processed_img_path}")
-                print(f"反馈: {feedback}")
-                
-                # 获取角度数据
-                print("获取角度数据...")
-                angle_data = web_model.get_angle_data_for_image(temp_filepath, posture)
-                
-                # 读取处理后的图像并转换为base64
-                print("转换处理后的图像为base64...")
-                with open(processed_img_path, 'rb') as img_file:
-                    processed_img_bytes = img_file.read()
-                    processed_img_base64 = base64.b64encode(processed_img_bytes).decode('utf-8')
-                    # 添加base64 URL前缀
-                    processed_img_base64 = f"data:image/jpeg;base64,{processed_img_base64}"
-                
-                # 清理临时文件
-                try:
-                    os.remove(temp_filepath)
-                    print(f"已删除临时文件: {temp_filepath}")
-                except Exception as e:
-                    print(f"删除临时文件失败: {e}")
+            image_bytes = base64.b64decode(image_data)
+        elif request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+            posture = request.args.get('posture') or AUTO_POSTURE
+            session_id = request.args.get('session_id')
+            persist = request.args.get('persist', '').lower() in ('1', 'true', 'yes')
+            image_bytes = request.get_data()
+        else:
+            return jsonify({'success': False, 'message': '不支持的请求格式，请使用JSON格式'}), 400
+        
+        # 同一用户的连续帧复用服务端会话，保留跟踪状态；会话ID由服务端生成，以响应中的session_id为准
+        try:
+            session = pose_session.camera_sessions.get(session_id, client_id())
+        except pose_session.SessionLimitError as e:
+            return jsonify({'success': False, 'message': str(e)}), 503
+        
+        try:
+            with quality_controller.controller.track() as tier:
+                # 直接从请求数据解码，不写临时文件
+                img = web_model.decode_image(image_bytes)
+                if img is None:
+                    return jsonify({'success': False, 'message': '无法解码图像数据', 'session_id': session.session_id}), 400
                 
-                # 返回分析结果
-                print("返回分析结果...")
+                # 按当前负载对应的档位缩小输入、切换模型复杂度
+                model_complexity = session.set_model_complexity(tier.model_complexity)
+                img = model.limit_image_size(img, tier.max_dimension)
+                # 只推理一次，评分、角度数据和标注图像都来自同一个分析结果
+                analysis = web_model.analyze_frame(img, posture, session=session)
+            quality = tier.info(model_complexity)
+            feedback = analysis.feedback
+            if analysis.error:
                 return jsonify({
-                    'success': True,
-                    'message': '姿态分析完成',
-                    'image': processed_img_base64,
-                    'angles': angle_data,
-                    'score': round(score, 1),
+                    'success': False,
+                    'message': analysis.error,
+                    'session_id': session.session_id,
+                    'quality': quality,
                     'level': feedback.get('level', ''),
                     'suggestions': feedback.get('suggestions', [])
                 })
-                
-            except Exception as e:
-                print(f"图像处理错误: {e}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({'success': False, 'message': f'图像处理错误: {str(e)}'}), 500
-        
-        # 处理表单数据请求
-        else:
-            return jsonify({'success': False, 'message': '不支持的请求格式，请使用JSON格式'}), 400
+            
+            # 标注图像直接编码到响应中
+            overlay_bytes = analysis.encode_overlay()
+            processed_img_base64 = f"data:image/jpeg;base64,{base64.b64encode(overlay_bytes).decode('utf-8')}"
+            
+            response = {
+                'success': True,
+                'message': '姿态分析完成',
+                'session_id': session.session_id,
+                'image': processed_img_base64,
+                'angles': analysis.angle_data(),
+                'score': round(analysis.score, 1),
+                'posture': analysis.posture,
+                'posture_matches': analysis.matches,
+                'keypoints': analysis.keypoints_data,
+                'quality': quality,
+                'level': feedback.get('level', ''),
+                'suggestions': feedback.get('suggestions', [])
+            }
+            
+            # 用户需要保存快照时才落盘
+            if persist:
+                import uuid
+                snapshot_filename = f"camera_{uuid.uuid4().hex}.jpg"
+                snapshot_path = os.path.join('uploads/images', snapshot_filename)
+                with open(snapshot_path, 'wb') as f:
+                    f.write(image_bytes)
+                response['image_path'] = analysis.save_overlay(snapshot_path).replace('\\', '/')
+            
+            return jsonify(response)
+            
+        except pose_pool.PoolTimeoutError as e:
+            return jsonify({'success': False, 'message': str(e), 'session_id': session.session_id}), 503
+        except Exception as e:
+            print(f"图像处理错误: {e}")
+            import traceback
+            traceback.print_exc()
+            return jsonify({'success': False, 'message': f'图像处理错误: {str(e)}'}), 500
     
     except Exception as e:
         print(f"请求处理错误: {e}")
@@ -640,107 +775,51 @@ def analyze_camera_frame():
         traceback.print_exc()
         return jsonify({'success': False, 'message': f'请求处理错误: {str(e)}'}), 500
 
+# 就绪检查：估计器预热完成前返回503，负载均衡只把请求转发给已预热的worker
+@app.route('/api/health/ready', methods=['GET'])
+def readiness():
+    client = pose_server.get_client()
+    if client is None:
+        status = pose_pool.warmup_status()
+        status['pools'] = pose_pool.pool_stats()
+    else:
+        try:
+            response = client.stats()
+            status = dict(response.get('warmup', {}), pools=response.get('pools', []), server=True)
+        except (OSError, ConnectionError) as e:
+            status = {'ready': False, 'state': 'unreachable', 'error': str(e), 'server': True}
+    return jsonify(status), 200 if status.get('ready') else 503
+
+# 分析结果缓存的命中统计
+@app.route('/api/analysis/cache', methods=['GET'])
+def get_analysis_cache_stats():
+    return jsonify({'success': True, 'cache': analysis_cache.stats(), 'in_flight': single_flight.stats()}), 200
+
+# 实时分析当前的质量档位、排队深度和p95推理耗时
+@app.route('/api/analysis/quality', methods=['GET'])
+def get_quality_stats():
+    return jsonify({'success': True, 'quality': quality_controller.controller.stats(),
+                    'sessions': pose_session.camera_sessions.stats()}), 200
+
+# 结束摄像头会话，释放服务端的跟踪估计器
+@app.route('/api/analysis/camera/session/<session_id>', methods=['DELETE'])
+def close_camera_session(session_id):
+    closed = pose_session.camera_sessions.close(session_id, client_id())
+    return jsonify({'success': True, 'closed': closed, 'sessions': pose_session.camera_sessions.stats()}), 200
+
 # Helper function to process video
-def process_video(video_path, posture):
+def process_video(video_path, posture, policy='fps', value=video_analysis.SAMPLE_FPS, max_frames=None):
     """处理视频并返回分析结果"""
-    results = {
-        'average_score': 0,
-        'frames': [],
-        'feedback': {}
-    }
-    
-    try:
-        # Open the video file
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            return {'error': '无法打开视频文件'}
-        
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        
-        # Process every 10th frame to reduce computation
-        frame_interval = max(1, int(fps / 2))  # Process 2 frames per second
-        processed_frames = 0
-        total_score = 0
-        frame_scores = []
-        key_frames = []
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Process only every frame_interval frames
-            if processed_frames % frame_interval == 0:
-                # Process the frame
-                processed_img, score, _ = web_model.process_video_frame_for_web(frame, posture)
-                
-                # Save key frames (frames with significant scores)
-                if score > 5:  # Save frames with score > 5
-                    frame_filename = f"frame_{processed_frames}.jpg"
-                    frame_path = os.path.join("img", frame_filename)
-                    cv2.imwrite(frame_path, processed_img)
-                    
-                    # Convert to base64
-                    with open(frame_path, 'rb') as img_file:
-                        frame_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-                    
-                    key_frames.append({
-                        'frame': processed_frames,
-                        'time': processed_frames / fps,
-                        'score': score,
-                        'image': frame_base64
-                    })
-                
-                frame_scores.append({
-                    'frame': processed_frames,
-                    'time': processed_frames / fps,
-                    'score': score
-                })
-                
-                total_score += score
-            
-            processed_frames += 1
-            
-            # Limit to 100 frames for performance
-            if processed_frames >= 300:
-                break
-        
-        cap.release()
-        
-        # Calculate average score
-        if len(frame_scores) > 0:
-            results['average_score'] = total_score / len(frame_scores)
-        
-        # Sort key frames by score (highest first)
-        key_frames.sort(key=lambda x: x['score'], reverse=True)
-        
-        # Limit to top 5 key frames
-        results['key_frames'] = key_frames[:5]
-        results['frame_scores'] = frame_scores
-        
-        # Generate overall feedback
-        position_score = angle_score = stability_score = results['average_score']  # 简化处理，使用平均分
-        results['feedback'] = web_model.generate_detailed_feedback(
-            posture, 
-            results['average_score'],
-            position_score,
-            angle_score,
-            stability_score,
-            [],  # 简化处理，不传入关键点数据
-            [],  # 简化处理，不传入标准姿势数据
-            []   # 简化处理，不传入角度数据
-        )
-        
-        # 获取角度数据
-        angle_data = web_model.get_angle_data_from_video(video_path, posture)
-        results['angle_data'] = angle_data
-        
-        return results
-    
-    except Exception as e:
-        print(f"处理视频时出错: {e}")
-        return {'error': str(e)}
+    return video_analysis.process_video(video_path, posture, policy=policy, value=value, max_frames=max_frames)
+
+def get_sampling_options():
+    """从表单读取视频采样策略(sample_policy, sample_value)，参数无效时抛出ValueError"""
+    policy = request.form.get('sample_policy', 'fps')
+    if policy not in video_analysis.FrameSampler.POLICIES:
+        raise ValueError(f'不支持的采样策略: {policy}')
+    # 未指定参数时使用该策略的默认值，见video_analysis.SAMPLE_DEFAULTS
+    value = request.form.get('sample_value') or video_analysis.SAMPLE_DEFAULTS[policy]
+    return policy, video_analysis.check_sample_value(policy, value)
 
 # Coaching appointment routes
 @app.route('/api/coaches', methods=['GET'])
@@ -0,0 +1,208 @@
+'''
+批量图像分析
+
+一次请求上传多张图像（多个文件或一个zip压缩包），在内存中解码后由线程池并行交给姿态估计器，
+并发数与估计器数量一致。返回每张图像的结果以及整批的汇总统计和吞吐量。
+'''
+import base64
+import json
+import os
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pose_pool
+import pose_server
+import web_model
+from analysis_cache import analysis_cache, content_hash
+from posture_registry import AUTO_POSTURE
+
+# 一次请求最多分析的图像数
+MAX_BATCH_IMAGES = int(os.environ.get('WUDAO_MAX_BATCH_IMAGES', 100))
+# zip中单个文件解压后的大小上限
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+TOO_MANY_IMAGES_ERROR = "图像数量超过上限 {}"
+UNSUPPORTED_FILE_ERROR = "不支持的文件类型"
+DECODE_ERROR = "无法解码图像数据"
+ENCRYPTED_ENTRY_ERROR = "压缩包中的文件已加密"
+CORRUPT_ENTRY_ERROR = "无法读取压缩包中的文件"
+
+
+def _has_extension(filename, extensions):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in extensions
+
+
+def read_zip_images(stream, extensions, limit=MAX_BATCH_IMAGES):
+    """
+    读取zip压缩包中的图像
+
+    Args:
+        stream: zip文件对象
+        extensions: 允许的图像扩展名
+        limit: 图像数量上限，超出时抛出ValueError
+
+    Returns:
+        list: [(文件名, 图像字节或None, 错误信息或None)]，按压缩包中的顺序
+    """
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise ValueError("无法读取zip压缩包")
+
+    entries = []
+    with archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+                continue
+            if len(entries) >= limit:
+                raise ValueError(TOO_MANY_IMAGES_ERROR.format(limit))
+            if not _has_extension(name, extensions):
+                entries.append((name, None, UNSUPPORTED_FILE_ERROR))
+            elif info.file_size > MAX_IMAGE_BYTES:
+                entries.append((name, None, f"图像超过{MAX_IMAGE_BYTES // (1024 * 1024)}MB"))
+            elif info.flag_bits & 0x1:
+                entries.append((name, None, ENCRYPTED_ENTRY_ERROR))
+            else:
+                entries.append(_read_entry(archive, info))
+    return entries
+
+
+def _read_entry(archive, info):
+    """读取压缩包中的一个文件，损坏（CRC错误、数据截断）或压缩方法不受支持时记为该文件失败，不影响整批"""
+    try:
+        return info.filename, archive.read(info), None
+    except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError, RuntimeError, OSError) as e:
+        print(f"读取压缩包中的文件 {info.filename} 出错: {e}")
+        return info.filename, None, CORRUPT_ENTRY_ERROR
+
+
+def assign_postures(filenames, posture=None, postures=None):
+    """
+    确定每张图像的姿势
+
+    Args:
+        filenames: 按上传顺序排列的文件名
+        posture: 所有图像共用的姿势，为空时自动识别
+        postures: 可选的JSON字符串，与文件顺序对应的列表，或{文件名: 姿势}，未列出的图像使用posture
+
+    Returns:
+        list: 与filenames对应的姿势
+    """
+    default = posture or AUTO_POSTURE
+    if not postures:
+        return [default] * len(filenames)
+    try:
+        parsed = json.loads(postures)
+    except ValueError:
+        raise ValueError("postures不是有效的JSON")
+    if isinstance(parsed, list):
+        if len(parsed) != len(filenames):
+            raise ValueError(f"postures列表长度({len(parsed)})与图像数量({len(filenames)})不一致")
+        return [item or default for item in parsed]
+    if isinstance(parsed, dict):
+        return [parsed.get(name) or parsed.get(os.path.basename(name)) or default for name in filenames]
+    raise ValueError("postures应为列表或以文件名为键的对象")
+
+
+def default_workers():
+    """并发数：使用推理服务时为共享内存槽位数，否则为本进程估计器池大小"""
+    return pose_server.RING_SLOTS if pose_server.SERVER_SOCKET else pose_pool.POOL_SIZE
+
+
+def analyze_image_bytes(data, posture, include_image=False):
+    """分析一张编码后的图像，返回接口使用的结果字典；结果按内容哈希缓存"""
+    cache_key = analysis_cache.make_key('batch', content_hash(data), posture, include_image=include_image)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached, cached=True)
+
+    img = web_model.decode_image(data)
+    if img is None:
+        return {'success': False, 'message': DECODE_ERROR, 'posture': posture}
+    analysis = web_model.analyze_frame(img, posture)
+    if analysis.error:
+        return {'success': False, 'message': analysis.error, 'posture': analysis.posture}
+
+    result = {
+        'success': True,
+        'posture': analysis.posture,
+        'posture_matches': analysis.matches,
+        'score': round(analysis.score, 2),
+        'keypoints': analysis.keypoints_data,
+        'feedback': analysis.feedback,
+        'angle_data': analysis.angle_data(),
+    }
+    if include_image:
+        # 只有请求返回标注图像时才绘制
+        overlay_bytes = analysis.encode_overlay()
+        result['image'] = f"data:image/jpeg;base64,{base64.b64encode(overlay_bytes).decode('utf-8')}"
+    analysis_cache.put(cache_key, result)
+    return dict(result, cached=False)
+
+
+def _analyze_item(item, include_image):
+    filename, data, error, posture = item
+    if error:
+        return {'filename': filename, 'success': False, 'message': error, 'posture': posture}
+    try:
+        result = analyze_image_bytes(data, posture, include_image)
+    except pose_pool.PoolTimeoutError as e:
+        result = {'success': False, 'message': str(e), 'posture': posture}
+    except Exception as e:
+        print(f"批量分析图像出错 {filename}: {e}")
+        result = {'success': False, 'message': f'分析出错: {str(e)}', 'posture': posture}
+    return dict(result, filename=filename)
+
+
+def summarize(results, elapsed, workers):
+    """整批结果的汇总统计"""
+    succeeded = [result for result in results if result.get('success')]
+    scores = [result['score'] for result in succeeded]
+
+    by_posture = {}
+    levels = {}
+    for result in succeeded:
+        entry = by_posture.setdefault(result['posture'], {'count': 0, 'total': 0.0})
+        entry['count'] += 1
+        entry['total'] += result['score']
+        level = result['feedback'].get('level', '')
+        levels[level] = levels.get(level, 0) + 1
+
+    return {
+        'total': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'cached': sum(1 for result in results if result.get('cached')),
+        'average_score': round(sum(scores) / len(scores), 2) if scores else 0,
+        'min_score': min(scores) if scores else 0,
+        'max_score': max(scores) if scores else 0,
+        'by_posture': {name: {'count': entry['count'], 'average_score': round(entry['total'] / entry['count'], 2)}
+                       for name, entry in by_posture.items()},
+        'levels': levels,
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 3),
+        'images_per_second': round(len(results) / elapsed, 2) if elapsed > 0 else 0,
+    }
+
+
+def analyze_batch(items, workers=None, include_images=False):
+    """
+    并行分析一批图像
+
+    Args:
+        items: [(文件名, 图像字节或None, 错误信息或None, 姿势)]
+        workers: 并发数，默认与估计器数量一致
+        include_images: 是否在结果中返回base64标注图像
+
+    Returns:
+        dict: {"results": 按上传顺序的逐张结果, "summary": 汇总统计}
+    """
+    workers = max(1, min(workers or default_workers(), len(items) or 1))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda item: _analyze_item(item, include_images), items))
+    elapsed = time.perf_counter() - start
+    return {'results': results, 'summary': summarize(results, elapsed, workers)}
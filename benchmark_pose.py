@@ -0,0 +1,327 @@
+'''
+姿态推理速度/精度基准测试
+
+把img/中的标准图像和uploads/videos中的示例视频，按输入分辨率、model_complexity、推理模式
+（静态图像/跟踪）和ROI裁剪开关的每一种组合各跑一遍。每种组合在独立的子进程中运行，
+记录推理耗时的分位数、进程峰值内存，以及关键点和评分相对最高质量基准的偏差，
+生成用于选择生产默认值的对比表。
+
+单张图像没有前后帧，跟踪模式和ROI裁剪只对视频测试。基准为成功运行的最高分辨率和最高
+model_complexity，静态图像模式、不裁剪。
+
+用法:
+    python benchmark_pose.py
+    python benchmark_pose.py --resolutions 1280,640 --complexities 1 --repeat 5 --output reports/benchmark
+'''
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DEFAULT_RESOLUTIONS = (1280, 960, 640, 480)
+DEFAULT_COMPLEXITIES = (0, 1, 2)
+MODES = ('static', 'tracking')
+DEFAULT_OUTPUT = 'benchmark_results'
+DEFAULT_POSTURE = '弓步冲拳'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+TABLE_HEADER = ['输入', '分辨率', '复杂度', '模式', 'ROI', 'p50 ms', 'p95 ms', 'p99 ms', '首帧 ms',
+                '峰值内存 MB', '检出率', '关键点偏差 %', '评分偏差']
+
+
+def find_inputs(image_dir, video_dir):
+    """标准图像（跳过processed_开头的标注结果）和第一个示例视频"""
+    images = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                    if name.lower().endswith(IMAGE_EXTENSIONS) and not name.startswith('processed_'))
+    videos = sorted(os.path.join(video_dir, name) for name in os.listdir(video_dir)
+                    if name.lower().endswith('.mp4')) if os.path.isdir(video_dir) else []
+    return images, videos[0] if videos else None
+
+
+def build_configs(resolutions, complexities, modes, roi_options, has_images, has_video):
+    """全部组合；图像只测试静态图像模式、不裁剪"""
+    configs = []
+    if has_images:
+        for resolution, complexity in itertools.product(resolutions, complexities):
+            configs.append({'source': 'images', 'resolution': resolution, 'complexity': complexity,
+                            'mode': 'static', 'roi': False})
+    if has_video:
+        for resolution, complexity, mode, roi in itertools.product(resolutions, complexities, modes, roi_options):
+            configs.append({'source': 'video', 'resolution': resolution, 'complexity': complexity,
+                            'mode': mode, 'roi': roi})
+    return configs
+
+
+class _Detector:
+    """按组合缩小输入并推理，提供web_model.analyze_frame所需的detect(img)"""
+
+    def __init__(self, estimator, resolution, roi):
+        import roi_tracker
+
+        self.estimator = estimator
+        self.resolution = resolution
+        self.tracker = roi_tracker.RoiTracker() if roi else None
+
+    def detect(self, img):
+        import model
+
+        img = model.limit_image_size(img, self.resolution)
+        if self.tracker is not None:
+            return self.tracker.detect(img, self.estimator)
+        return model.detect_pose(img, self.estimator)
+
+
+def _load_frames(config, images, video, max_frames):
+    import cv2
+
+    import model
+
+    if config['source'] == 'images':
+        return [model.cv_imread(path) for path in images]
+    frames = []
+    cap = cv2.VideoCapture(video)
+    while not max_frames or len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run_config(config, images, video, repeat, posture, max_frames):
+    """
+    在子进程中运行一种组合
+
+    Returns:
+        dict: 逐帧耗时、首帧耗时、首轮的关键点和评分、进程峰值内存；模型无法加载时为{'error': 原因}
+    """
+    # 子进程的逐帧日志（图像缩放等）不输出到对比表中
+    with contextlib.redirect_stdout(io.StringIO()):
+        import pose_pool
+        import web_model
+
+        frames = _load_frames(config, images, video, max_frames)
+        pool = pose_pool.get_pool(static_image_mode=config['mode'] == 'static',
+                                  model_complexity=config['complexity'])
+        try:
+            estimator = pool.acquire()
+        except Exception as e:
+            return {'error': f'无法加载模型: {e}'}
+
+        try:
+            # 首帧包含计算图初始化，单独记录
+            detector = _Detector(estimator, config['resolution'], config['roi'])
+            start = time.perf_counter()
+            web_model.analyze_frame(frames[0], posture, session=detector)
+            cold_ms = (time.perf_counter() - start) * 1000
+
+            latencies = []
+            keypoints = []
+            scores = []
+            roi_stats = None
+            for round_index in range(repeat):
+                # reset()会重建计算图，不在轮次之间调用；跟踪模式下回到第一帧相当于镜头切换，会重新检测
+                detector = _Detector(estimator, config['resolution'], config['roi'])
+                for frame in frames:
+                    start = time.perf_counter()
+                    analysis = web_model.analyze_frame(frame, posture, session=detector)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    if round_index == 0:
+                        keypoints.append([list(point[:2]) for point in analysis.keypoints_data] or None)
+                        scores.append(None if analysis.error else float(analysis.score))
+                if round_index == 0 and detector.tracker is not None:
+                    roi_stats = detector.tracker.stats()
+        finally:
+            pool.release(estimator, reset=True)
+
+    return {
+        'latencies': latencies,
+        'cold_ms': cold_ms,
+        'keypoints': keypoints,
+        'scores': scores,
+        'roi_stats': roi_stats,
+        # Linux上ru_maxrss的单位为KB
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _run_isolated(config, images, video, repeat, posture, max_frames):
+    """每种组合一个新的spawn进程，峰值内存互不影响"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_config, config, images, video, repeat, posture, max_frames).result()
+
+
+def _drift(result, baseline):
+    """检出率，以及相对基准的关键点平均偏差（占画面的百分比）和评分平均绝对偏差；没有基准时偏差为None"""
+    detected = sum(1 for points in result['keypoints'] if points)
+    detection_rate = detected / len(result['keypoints']) if result['keypoints'] else 0.0
+    if baseline is None:
+        return {'detection_rate': detection_rate, 'keypoint_drift_pct': None, 'score_drift': None}
+    pairs = [(a, b) for a, b in zip(result['keypoints'], baseline['keypoints']) if a and b]
+    keypoint_drift = (float(np.mean([np.abs(np.array(a) - np.array(b)).mean() for a, b in pairs])) * 100
+                      if pairs else None)
+    score_pairs = [(a, b) for a, b in zip(result['scores'], baseline['scores']) if a is not None and b is not None]
+    score_drift = float(np.mean([abs(a - b) for a, b in score_pairs])) if score_pairs else None
+    return {
+        'detection_rate': detection_rate,
+        'keypoint_drift_pct': keypoint_drift,
+        'score_drift': score_drift,
+    }
+
+
+def summarize(configs, results):
+    """
+    按组合汇总耗时分位数、内存和相对基准的偏差
+
+    某类输入没有成功的静态图像模式、无ROI组合时（例如只测跟踪模式、只测ROI开启，或基准组合出错）
+    没有偏差基准，这些行的偏差为None，no_baseline为True
+    """
+    rows = []
+    baselines = {}
+    for source in ('images', 'video'):
+        candidates = [(config, result) for config, result in zip(configs, results)
+                      if config['source'] == source and 'error' not in result
+                      and config['mode'] == 'static' and not config['roi']]
+        if candidates:
+            baselines[source] = max(candidates, key=lambda item: (item[0]['resolution'], item[0]['complexity']))
+
+    for config, result in zip(configs, results):
+        row = dict(config)
+        if 'error' in result:
+            row['error'] = result['error']
+            rows.append(row)
+            continue
+        latencies = np.array(result['latencies'])
+        row.update({
+            'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 1),
+            'cold_ms': round(result['cold_ms'], 1),
+            'peak_rss_mb': round(result['peak_rss_mb'], 1),
+            'samples': len(latencies),
+        })
+        baseline_config, baseline = baselines.get(config['source'], (None, None))
+        drift = _drift(result, baseline)
+        row.update({key: round(value, 3) if value is not None else None for key, value in drift.items()})
+        row['baseline'] = config is baseline_config
+        row['no_baseline'] = baseline is None
+        if result['roi_stats'] is not None:
+            row['roi_frames'] = result['roi_stats']['roi_frames']
+            row['roi_fallbacks'] = result['roi_stats']['fallbacks']
+        rows.append(row)
+    return rows
+
+
+def _cell(value, suffix=''):
+    return '-' if value is None else f"{value}{suffix}"
+
+
+def format_table(rows):
+    """Markdown表格，基准行的输入列标注*，没有基准的行偏差列为“无基准”"""
+    lines = ['| ' + ' | '.join(TABLE_HEADER) + ' |', '|' + '---|' * len(TABLE_HEADER)]
+    for row in rows:
+        source = ('图像' if row['source'] == 'images' else '视频') + ('*' if row.get('baseline') else '')
+        head = [source, str(row['resolution']), str(row['complexity']),
+                '静态' if row['mode'] == 'static' else '跟踪', '开' if row['roi'] else '关']
+        if 'error' in row:
+            cells = head + [row['error'].split(':')[0]] + [''] * (len(TABLE_HEADER) - len(head) - 1)
+        else:
+            rate = row['detection_rate']
+            drift = (['无基准'] * 2 if row.get('no_baseline')
+                     else [_cell(row['keypoint_drift_pct']), _cell(row['score_drift'])])
+            cells = head + [_cell(row['p50_ms']), _cell(row['p95_ms']), _cell(row['p99_ms']), _cell(row['cold_ms']),
+                            _cell(row['peak_rss_mb']), f"{rate * 100:.0f}%"] + drift
+        lines.append('| ' + ' | '.join(cells) + ' |')
+    if any(row.get('no_baseline') for row in rows):
+        lines.append('')
+        lines.append('无基准：该类输入没有成功的静态图像模式、ROI关闭的组合，无法计算偏差')
+    return '\n'.join(lines)
+
+
+def run(images, video, resolutions=DEFAULT_RESOLUTIONS, complexities=DEFAULT_COMPLEXITIES, modes=MODES,
+        roi_options=(False, True), repeat=3, posture=DEFAULT_POSTURE, max_frames=None):
+    """
+    运行全部组合
+
+    Returns:
+        list: 每种组合一行的汇总结果
+    """
+    configs = build_configs(resolutions, complexities, modes, roi_options, bool(images), bool(video))
+    results = []
+    unavailable = {}
+    for index, config in enumerate(configs, 1):
+        label = (f"{config['source']} {config['resolution']}px complexity={config['complexity']} "
+                 f"{config['mode']} roi={'on' if config['roi'] else 'off'}")
+        if config['complexity'] in unavailable:
+            # 模型无法加载时同一复杂度的其他组合不再启动进程
+            results.append({'error': unavailable[config['complexity']]})
+            print(f"[{index}/{len(configs)}] {label}: 跳过")
+            continue
+        start = time.perf_counter()
+        result = _run_isolated(config, images, video, repeat, posture, max_frames)
+        if 'error' in result:
+            unavailable[config['complexity']] = result['error']
+            print(f"[{index}/{len(configs)}] {label}: {result['error']}")
+        else:
+            print(f"[{index}/{len(configs)}] {label}: p50 {np.percentile(result['latencies'], 50):.1f} ms，"
+                  f"用时 {time.perf_counter() - start:.1f} 秒", flush=True)
+        results.append(result)
+    return summarize(configs, results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='姿态推理速度/精度基准测试')
+    parser.add_argument('--images', default='img', help='标准图像目录')
+    parser.add_argument('--videos', default=os.path.join('uploads', 'videos'), help='示例视频目录，使用其中第一个mp4')
+    parser.add_argument('--resolutions', default=','.join(map(str, DEFAULT_RESOLUTIONS)),
+                        help='输入图像最长边，逗号分隔')
+    parser.add_argument('--complexities', default=','.join(map(str, DEFAULT_COMPLEXITIES)),
+                        help='MediaPipe model_complexity，逗号分隔')
+    parser.add_argument('--modes', default=','.join(MODES), help='推理模式: static,tracking')
+    parser.add_argument('--roi', default='off,on', help='ROI裁剪: off,on')
+    parser.add_argument('--repeat', type=int, default=3, help='每种组合重复的轮数')
+    parser.add_argument('--posture', default=DEFAULT_POSTURE, help='评分使用的姿势')
+    parser.add_argument('--max-frames', type=int, default=None, help='视频最多使用的帧数')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='结果路径前缀，生成<output>.json和<output>.md')
+    args = parser.parse_args(argv)
+
+    images, video = find_inputs(args.images, args.videos)
+    if not images and not video:
+        parser.error('没有找到图像或视频')
+    modes = [mode for mode in args.modes.split(',') if mode]
+    if any(mode not in MODES for mode in modes):
+        parser.error(f"未知的推理模式: {args.modes}")
+
+    print(f"图像 {len(images)} 张，视频 {video or '无'}")
+    rows = run(images, video,
+               resolutions=[int(value) for value in args.resolutions.split(',') if value],
+               complexities=[int(value) for value in args.complexities.split(',') if value],
+               modes=modes,
+               roi_options=[value == 'on' for value in args.roi.split(',') if value],
+               repeat=args.repeat, posture=args.posture, max_frames=args.max_frames)
+
+    table = format_table(rows)
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(f"{args.output}.json", 'w', encoding='utf-8') as f:
+        json.dump({'images': images, 'video': video, 'repeat': args.repeat, 'results': rows}, f,
+                  ensure_ascii=False, indent=2)
+    with open(f"{args.output}.md", 'w', encoding='utf-8') as f:
+        f.write(table + '\n')
+    print()
+    print(table)
+    print(f"\n*为偏差基准。结果已写入 {args.output}.json 和 {args.output}.md")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+'''
+实时摄像头WebSocket分析接口
+
+客户端通过 /api/analysis/camera/stream 发送二进制JPEG帧，服务端返回精简的JSON结果
+（评分、等级、关键点），不返回标注图像。接收线程只保留每个连接最新的一帧，推理期间
+到达的旧帧直接丢弃，推理速度跟不上发送频率时请求不会堆积。与HTTP摄像头接口共用自适应质量控制，
+结果中的quality为本帧实际使用的质量档位。
+
+客户端消息:
+- 二进制: 一帧JPEG/PNG图像
+- 文本JSON: {"posture": "弓步冲拳"} 切换姿势，"auto"为自动识别；{"ts": 客户端毫秒时间戳} 附加到下一帧，
+  结果中原样返回为client_ts，客户端据此计算端到端延迟
+'''
+import json
+import threading
+import time
+
+from flask import request
+from flask_sock import Sock
+
+import model
+import pose_pool
+import pose_session
+import quality_controller
+import web_model
+
+sock = Sock()
+
+
+class LatestFrame:
+    """只保存最新一帧的单槽缓冲区，新帧覆盖未处理的旧帧"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frame):
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self.received += 1
+            self._frame = frame
+            self._cond.notify()
+
+    def take(self):
+        """阻塞直到有新帧，连接关闭后返回None"""
+        with self._cond:
+            while self._frame is None and not self.closed:
+                self._cond.wait()
+            frame, self._frame = self._frame, None
+            return frame
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+def _receive_loop(ws, latest, state):
+    """接收线程：持续读取客户端消息，二进制帧写入最新帧缓冲区"""
+    pending_ts = None
+    try:
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+            if isinstance(message, (bytes, bytearray)):
+                latest.put({
+                    'seq': latest.received + 1,
+                    'data': bytes(message),
+                    'received_at': time.perf_counter(),
+                    'client_ts': pending_ts,
+                })
+                pending_ts = None
+                continue
+            try:
+                control = json.loads(message)
+            except ValueError:
+                continue
+            if 'posture' in control:
+                state['posture'] = control['posture']
+            if 'ts' in control:
+                pending_ts = control['ts']
+    except Exception as e:
+        print(f"摄像头流接收结束: {e}")
+    finally:
+        latest.close()
+
+
+def _keypoint_list(keypoints_data):
+    return [[round(point[0], 4), round(point[1], 4), round(point[2], 4)] for point in keypoints_data]
+
+
+def client_id():
+    """
+    摄像头会话所属的客户端，即连接地址
+
+    不直接读取X-Forwarded-For：该请求头由客户端控制，每次换一个值就能绕过单客户端的会话上限。
+    部署在反向代理之后时设置WUDAO_TRUSTED_PROXIES，由ProxyFix按可信的代理层数还原remote_addr
+    """
+    return request.remote_addr
+
+
+@sock.route('/api/analysis/camera/stream')
+def camera_stream(ws):
+    state = {'posture': request.args.get('posture', '弓步冲拳')}
+    owner = client_id()
+    try:
+        session = pose_session.camera_sessions.get(request.args.get('session_id'), owner)
+    except pose_session.SessionLimitError as e:
+        ws.send(json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False))
+        return
+    latest = LatestFrame()
+
+    receiver = threading.Thread(target=_receive_loop, args=(ws, latest, state), daemon=True)
+    receiver.start()
+    ws.send(json.dumps({'type': 'ready', 'session_id': session.session_id}))
+
+    try:
+        while True:
+            frame = latest.take()
+            if frame is None:
+                break
+
+            result = {'type': 'result', 'seq': frame['seq'], 'session_id': session.session_id}
+            img = web_model.decode_image(frame['data'])
+            if img is None:
+                result.update({'success': False, 'message': '无法解码图像数据'})
+            else:
+                # 会话可能已因空闲被回收，每帧重新取一次并刷新LRU位置；回收后新会话的ID不同
+                session = pose_session.camera_sessions.get(session.session_id, owner)
+                result['session_id'] = session.session_id
+                inference_start = time.perf_counter()
+                with quality_controller.controller.track() as tier:
+                    model_complexity = session.set_model_complexity(tier.model_complexity)
+                    img = model.limit_image_size(img, tier.max_dimension)
+                    try:
+                        analysis = web_model.analyze_frame(img, state['posture'], session=session)
+                    except pose_pool.PoolTimeoutError as e:
+                        analysis = web_model.PoseAnalysis(state['posture'], error=str(e))
+                result['inference_ms'] = round((time.perf_counter() - inference_start) * 1000, 1)
+                result['quality'] = tier.info(model_complexity)
+                if analysis.error:
+                    result.update({'success': False, 'message': analysis.error})
+                else:
+                    result.update({
+                        'success': True,
+                        'score': round(analysis.score, 1),
+                        'posture': analysis.posture,
+                        'level': analysis.feedback.get('level', ''),
+                        'keypoints': _keypoint_list(analysis.keypoints_data),
+                    })
+                    if analysis.matches:
+                        result['posture_matches'] = analysis.matches
+
+            result['dropped'] = latest.dropped
+            result['client_ts'] = frame['client_ts']
+            result['server_ms'] = round((time.perf_counter() - frame['received_at']) * 1000, 1)
+            ws.send(json.dumps(result, ensure_ascii=False))
+    except Exception as e:
+        print(f"摄像头流处理结束: {e}")
+    finally:
+        latest.close()
+        pose_session.camera_sessions.close(session.session_id, owner)
@@ -28,6 +28,8 @@ const CameraAnalysis = () => {
   const [processedImage, setProcessedImage] = useState(null);
   const [analysisInterval, setAnalysisInterval] = useState(null);
   const [snapshotResult, setSnapshotResult] = useState(null);
+  // 服务端摄像头会话ID，连续帧复用同一个跟踪估计器
+  const sessionIdRef = useRef(null);
 
   useEffect(() => {
     // Fetch available poses
@@ -61,6 +63,16 @@ const CameraAnalysis = () => {
     setCameraActive(true);
   };
 
+  const closeSession = () => {
+    const sessionId = sessionIdRef.current;
+    if (!sessionId) {
+      return;
+    }
+    sessionIdRef.current = null;
+    axios.delete(`${config.API_BASE_URL}/api/analysis/camera/session/${sessionId}`)
+      .catch((error) => console.error('Close camera session error:', error));
+  };
+
   const stopCamera = () => {
     setCameraActive(false);
     if (analysisInterval) {
@@ -69,6 +81,7 @@ const CameraAnalysis = () => {
     }
     setAnalyzing(false);
     setProcessedImage(null);
+    closeSession();
   };
 
   const captureFrame = async () => {
@@ -93,7 +106,8 @@ const CameraAnalysis = () => {
       // 发送base64图像数据到后端
       const response = await axios.post(`${config.API_BASE_URL}/api/analysis/camera`, {
         image: imageSrc,
-        posture: posture
+        posture: posture,
+        session_id: sessionIdRef.current
       }, {
         headers: {
           'Content-Type': 'application/json'
@@ -105,6 +119,7 @@ const CameraAnalysis = () => {
       console.log('收到摄像头分析响应:', response.data);
 
       if (response.data.success) {
+        sessionIdRef.current = response.data.session_id || null;
         setCurrentScore(response.data.score);
         setProcessedImage(response.data.image);
         
@@ -152,6 +167,7 @@ const CameraAnalysis = () => {
       setAnalysisInterval(null);
     }
     setAnalyzing(false);
+    closeSession();
   };
 
   const getScoreColor = (score) => {
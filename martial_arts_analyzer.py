@@ -3,6 +3,7 @@ from tkinter import filedialog, ttk, messagebox
 import shutil
 import cv2
 import model
+import model_gui
 import os
 import threading
 import time
@@ -939,7 +940,7 @@ class MartialArtsAnalyzer:
             done_label.pack(pady=10)
             
             show_btn = tk.Button(analysis_done, text="查看详细分析", 
-                               command=lambda: model.main(move_code),
+                               command=lambda: model_gui.main(move_code),
                                bg='#4285F4', fg='white', font=('Arial', 11), height=1, width=15)
             show_btn.pack(pady=10)
         
@@ -1079,7 +1080,7 @@ class MartialArtsAnalyzer:
             print(f"已保存截图到: {img_path}")
             
             # 调用模型分析
-            model.main(move_code)
+            model_gui.main(move_code)
 
 # 添加到model.py的函数，用于仅返回分数而不显示UI
 def add_analyze_frame_function():
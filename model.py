@@ -1,30 +1,17 @@
-'''导入一些基本的库'''
+'''
+姿态分析核心：关键点检测、关节夹角和评分
+
+本模块不依赖图形界面，MediaPipe在第一次推理时才导入，Web服务和各gunicorn worker导入时
+不加载tkinter、matplotlib等库。桌面程序的可视化窗口在model_gui中。
+'''
 import cv2
-import mediapipe as mp
 import time
-from tqdm import tqdm
 import numpy as np
-import matplotlib.pyplot as plt
-import random
 import math
-from PIL import Image, ImageFont, ImageDraw
-import coordinate_master
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import tkinter as tk
-from tkinter import ttk
-from matplotlib.figure import Figure
-from PIL import Image, ImageTk
-from tkinter import PhotoImage
+import pose_pool
 import os
 
-plt.rcParams['font.sans-serif'] = ['Microsoft YaHei']  # '微软雅黑'
-plt.rcParams['axes.unicode_minus'] = False  # 解决负号问题（例如在坐标轴上）
-
 # 定义常量
-KEY_POINTS_LABEL = "动作要点:"
-DESCRIPTION_LABEL = "动作要领:"
-TITLE_LABEL = "总分:"
-SCORE_LABEL = "分"
 NO_PERSON_LABEL = "NO PERSON"
 FPS_LABEL = "FPS-{}"
 IMAGE_NOT_FOUND_ERROR = "错误: 无法找到图片 {}"
@@ -34,9 +21,30 @@ UNKNOWN_POSTURE_ERROR = "未知姿态类型: {}"
 VIDEO_FRAME_INVALID_ERROR = "无效的图像格式"
 VIDEO_FRAME_NO_PERSON_ERROR = "未检测到人体"
 
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
-pose = mp_pose.Pose(static_image_mode=True)
+# 推理前图像的最大边长
+MAX_DIMENSION = 1280
+
+# 已移到model_gui的桌面界面函数，保留model.<名称>的旧用法
+GUI_FUNCTIONS = ("view_bar", "show_master", "show_score_and_description", "main")
+
+# MediaPipe Pose的33个关键点之间的骨架连线，与mp.solutions.pose.POSE_CONNECTIONS相同；
+# 写成常量后绘制标注不需要导入MediaPipe
+POSE_CONNECTIONS = (
+    (0, 1), (0, 4), (1, 2), (2, 3), (3, 7), (4, 5), (5, 6), (6, 8), (9, 10), (11, 12),
+    (11, 13), (11, 23), (12, 14), (12, 24), (13, 15), (14, 16), (15, 17), (15, 19), (15, 21), (16, 18),
+    (16, 20), (16, 22), (17, 19), (18, 20), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28), (27, 29),
+    (27, 31), (28, 30), (28, 32), (29, 31), (30, 32),
+)
+
+def __getattr__(name):
+    """按需提供旧的模块属性：桌面界面函数从model_gui导入，mp_pose/mp_drawing导入MediaPipe"""
+    if name in GUI_FUNCTIONS:
+        import model_gui
+        return getattr(model_gui, name)
+    if name in ("mp_pose", "mp_drawing"):
+        import mediapipe as mp
+        return mp.solutions.pose if name == "mp_pose" else mp.solutions.drawing_utils
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 ## 读取图像，解决imread不能读取中文路径的问题
 def cv_imread(file_path):
@@ -63,77 +71,118 @@ def cv_imread(file_path):
         print(f"读取图片出错: {e}")
         return None
 
-def process_frame(img):
+def limit_image_size(img, max_dimension=None):
+    """将图像等比缩小到最长边不超过max_dimension"""
+    max_dimension = max_dimension or MAX_DIMENSION
+    h, w = img.shape[0], img.shape[1]
+    if h > max_dimension or w > max_dimension:
+        scale = max_dimension / max(h, w)
+        new_h, new_w = int(h * scale), int(w * scale)
+        img = cv2.resize(img, (new_w, new_h))
+        print(f"图像已调整大小: {w}x{h} -> {new_w}x{new_h}")
+    return img
+
+# 输出的12个关键点在MediaPipe 33个关键点中的索引
+KEYPOINT_INDICES = [11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28]
+# 绘制骨架时关键点可见度的下限，与MediaPipe的draw_landmarks一致
+VISIBILITY_THRESHOLD = 0.5
+
+def detect_pose(img, estimator=None):
+    """
+    只做关键点检测，不绘制任何标注
+
+    estimator为空时从静态图像估计器池借用实例；视频会话会传入独占的跟踪模式估计器
+
+    Returns:
+        tuple: (缩放后的图像, 12个关键点的(x, y, z)列表, 33个关键点的(33,4)数组[x, y, z, 可见度])，
+               未检测到人体时关键点为空列表、数组为None；图像无效时图像也为None
+    """
     try:
-        start_time = time.time()
-        
         # 确保图像是有效的BGR格式
         if img is None or len(img.shape) != 3:
             print(VIDEO_FRAME_INVALID_ERROR)
-            return None, []
-            
-        h, w = img.shape[0], img.shape[1]  # 高和宽
+            return None, [], None
         
         # 检查图像大小，如果太大则调整大小
-        max_dimension = 1280  # 设置最大尺寸
-        if h > max_dimension or w > max_dimension:
-            scale = max_dimension / max(h, w)
-            new_h, new_w = int(h * scale), int(w * scale)
-            img = cv2.resize(img, (new_w, new_h))
-            print(f"图像已调整大小: {w}x{h} -> {new_w}x{new_h}")
-            # 更新图像尺寸
-            h, w = new_h, new_w
+        img = limit_image_size(img)
         
         # 转换为RGB格式并确保是连续数组
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img_rgb = np.ascontiguousarray(img_rgb)
-
-        # 将RGB图像输入模型，获取关键点预测结果
-        results = pose.process(img_rgb)
+        img_rgb = np.ascontiguousarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
         
-        keypoints_indices = [11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28]  # 定义要输出的关键点索引
-        keypoints = [None] * 33
-        keypoints_data = []  # 创建一个空列表来存储关键点数据
-
-        if results.pose_landmarks:
-            mp_drawing.draw_landmarks(img, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
-            
-            # 输出目标关键点坐标
-            for index in keypoints_indices:
-                x = results.pose_landmarks.landmark[index].x
-                y = results.pose_landmarks.landmark[index].y
-                z = results.pose_landmarks.landmark[index].z
-                keypoints_data.append((x, y, z))  # 将每个关键点的坐标加入列表
-
-            for i in keypoints_indices:
-                cx = int(results.pose_landmarks.landmark[i].x * w)
-                cy = int(results.pose_landmarks.landmark[i].y * h)
-                keypoints[i] = (cx, cy)                              
-
+        # 将RGB图像输入模型，获取关键点预测结果
+        if estimator is not None:
+            results = estimator.process(img_rgb)
         else:
-            print(NO_PERSON_LABEL)
-            struction = NO_PERSON_LABEL
-            img = cv2.putText(img, struction, (25, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.25, (255, 255, 0), 6)
-            
-        end_time = time.time()
-        process_time = end_time - start_time            # 图片关键点预测时间
-        fps = 1 / process_time                          # 帧率
-        colors = [[random.randint(0,255) for _ in range(3)] for _ in range(33)]
-        radius = [random.randint(8,15) for _ in range(33)]
+            results = pose_pool.get_pool().process(img_rgb)
         
-        for index in keypoints_indices:
-            if keypoints[index] is not None:
-                cx, cy = keypoints[index]
-                img = cv2.circle(img, (cx, cy), radius[index], colors[index], -1)
-                
-        cv2.putText(img, FPS_LABEL.format(str(int(fps))), (12, 100), cv2.FONT_HERSHEY_SIMPLEX,
-                    3, (255, 255, 0), thickness=2)
-                    
-        return img, keypoints_data
+        if not results.pose_landmarks:
+            return img, [], None
         
+        landmarks = np.array([(point.x, point.y, point.z, point.visibility)
+                              for point in results.pose_landmarks.landmark], dtype=np.float32)
+        keypoints_data = [(float(x), float(y), float(z)) for x, y, z in landmarks[KEYPOINT_INDICES, :3]]
+        return img, keypoints_data, landmarks
+    
+    except pose_pool.PoolTimeoutError:
+        # 估计器繁忙时交给调用方处理，避免被误报为未检测到人体
+        raise
     except Exception as e:
         print(f"处理图像时出错: {e}")
+        return None, [], None
+
+def draw_pose(img, landmarks, label=None):
+    """
+    在图像副本上绘制骨架连线和关键点，只在需要返回标注图像时调用
+
+    Args:
+        img: detect_pose返回的BGR图像
+        landmarks: detect_pose返回的(33,4)关键点数组，为None时标注未检测到人体
+        label: 可选，写在左上角的文字，例如评分
+
+    Returns:
+        np.ndarray: 标注后的图像
+    """
+    img = img.copy()
+    h, w = img.shape[0], img.shape[1]
+    if landmarks is None:
+        cv2.putText(img, NO_PERSON_LABEL, (25, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.25, (255, 255, 0), 6)
+    else:
+        points = np.round(landmarks[:, :2] * (w, h)).astype(np.int32)
+        visible = landmarks[:, 3] >= VISIBILITY_THRESHOLD
+        for start, end in POSE_CONNECTIONS:
+            if visible[start] and visible[end]:
+                cv2.line(img, tuple(points[start]), tuple(points[end]), (224, 224, 224), 2)
+        for index in np.flatnonzero(visible):
+            cv2.circle(img, tuple(points[index]), 2, (0, 0, 255), 2)
+        # 参与评分的12个关键点画得更醒目
+        for index in KEYPOINT_INDICES:
+            cv2.circle(img, tuple(points[index]), 8, (0, 255, 0), -1)
+    if label:
+        cv2.putText(img, label, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    return img
+
+def process_frame(img, estimator=None, tracker=None):
+    """
+    检测图像中的人体关键点并绘制标注，供桌面程序使用；Web接口使用detect_pose，按需再调用draw_pose
+
+    estimator为空时从静态图像估计器池借用实例；视频会话会传入独占的跟踪模式估计器，
+    以及按上一帧关键点裁剪画面的roi_tracker.RoiTracker
+    """
+    start_time = time.time()
+    if tracker is not None:
+        img, keypoints_data, landmarks = tracker.detect(img, estimator)
+    else:
+        img, keypoints_data, landmarks = detect_pose(img, estimator)
+    if img is None:
         return None, []
+    if landmarks is None:
+        print(NO_PERSON_LABEL)
+    
+    fps = 1 / max(time.time() - start_time, 1e-6)  # 帧率
+    img = draw_pose(img, landmarks)
+    cv2.putText(img, FPS_LABEL.format(str(int(fps))), (12, 100), cv2.FONT_HERSHEY_SIMPLEX,
+                3, (255, 255, 0), thickness=2)
+    return img, keypoints_data
 
 def angle_between_points_3d(p1, p2, p3):
     """计算由三维点p1到p2和p2到p3形成的夹角"""
@@ -163,441 +212,78 @@ def angle_between_points_3d(p1, p2, p3):
     return angle_degrees
 
 
-def calculate_angles(keypoints_data):
-    # 定义关节点对，用于计算夹角
-    #这里虽然代号是11-16，23-28，但是keypoints_data里是从1-12的，所以这里要进行映射，11-16相当于0-5，23-28相当于6-11
-    joints_pairs = [
-        (2, 0, 4),  # 13-11 与 13-15
-        (3, 1, 5),  # 14-12 与 14-16
-        (0, 2, 6),  # 11-13 与 11-23
-        (1, 3, 7),  # 12-14 与 12-24
-        (6, 0, 8),  # 23-11 与 23-25
-        (7, 1, 9),  # 24-12 与 24-26
-        (6, 7, 8),  # 23-24 与 23-25
-        (7, 6, 9),  # 24-23 与 24-26
-        (8, 6, 10),  # 25-23 与 25-27
-        (9, 7, 11),  # 26-24 与 26-28
-    ]
-
-
-    # 存储计算结果的列表
-    angles = []
-    # 遍历所有关节点对，计算夹角
-    for joints in joints_pairs:
-        p1, p2, p3 = keypoints_data[joints[0]], keypoints_data[joints[1]], keypoints_data[joints[2]]
-        angle = angle_between_points_3d(p1, p2, p3)
-        angles.append(f" {joints[1]}-{joints[0]} 和 {joints[0]}-{joints[2]}夹角为: {angle:.2f} 度")
-    return angles
-
-
-def view_bar(angles, name):
-    try:
-        print(f"显示角度数据: {name}")
-        # 解析角度数据
-        labels = [angle.split(':')[0] for angle in angles]
-        values = [float(angle.split(': ')[1].split(' ')[0]) for angle in angles]
-        
-        # 创建Tkinter窗口
-        window = tk.Toplevel()
-        window.title(f"{name}角度数据可视化")
-        window.geometry("800x600")  # 设置窗口大小
-        
-        # 标题
-        title_label = tk.Label(window, text=f"{name}关节角度数据", font=('Arial', 14, 'bold'))
-        title_label.pack(pady=10)
-        
-        # 创建主框架
-        main_frame = tk.Frame(window)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-        
-        # 创建画布
-        canvas_width = 650
-        canvas_height = 400
-        canvas = tk.Canvas(main_frame, width=canvas_width, height=canvas_height, bg='white')
-        canvas.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
-        
-        # 计算参数
-        max_value = max(values) if values else 0
-        if max_value == 0:  # 防止除零错误
-            max_value = 1
-        bar_height = 25
-        bar_spacing = 15
-        margin_left = 250  # 左侧留出空间显示标签
-        margin_top = 50
-        margin_bottom = 50
-        
-        # 画水平线和刻度
-        for i in range(5):
-            tick_value = max_value * i / 4
-            x_pos = margin_left + (canvas_width - margin_left) * tick_value / max_value
-            canvas.create_line(x_pos, margin_top, x_pos, canvas_height - margin_bottom, fill='lightgray')
-            canvas.create_text(x_pos, canvas_height - margin_bottom + 10, text=f"{tick_value:.0f}")
-            
-        # X轴标签
-        canvas.create_text(margin_left + (canvas_width - margin_left) / 2, 
-                           canvas_height - margin_bottom + 30, 
-                           text="度数")
-        
-        # 绘制柱状图
-        for i, (label, value) in enumerate(zip(labels, values)):
-            y_pos = margin_top + i * (bar_height + bar_spacing)
-            bar_width = (canvas_width - margin_left) * value / max_value
-            
-            # 绘制标签
-            canvas.create_text(margin_left - 10, y_pos + bar_height/2, 
-                               text=label, anchor=tk.E, width=240, font=('Arial', 9))
-            
-            # 绘制条形
-            canvas.create_rectangle(margin_left, y_pos, margin_left + bar_width, y_pos + bar_height, 
-                                   fill='skyblue', outline='')
-            
-            # 显示数值
-            canvas.create_text(margin_left + bar_width + 10, y_pos + bar_height/2, 
-                               text=f"{value:.2f}", anchor=tk.W)
-        
-        print(f"{name}角度数据可视化完成")
-        
-    except Exception as e:
-        import traceback
-        print(f"显示角度数据时出错: {e}")
-        print(traceback.format_exc())
-
-
-def show_master(master_posture):
-    try:
-        print("显示传承人姿态模型")
-        # 确保master_posture是列表类型并且有数据
-        if not isinstance(master_posture, list) or len(master_posture) == 0:
-            print("错误: 传承人姿态数据无效")
-            return
-        
-        # 创建Tkinter窗口
-        window = tk.Toplevel()
-        window.title("传承人姿态图解")
-        window.geometry("600x500")  # 设置窗口大小
-        
-        # 创建画布
-        canvas_width, canvas_height = 500, 400
-        canvas = tk.Canvas(window, width=canvas_width, height=canvas_height, bg='white')
-        canvas.pack(padx=10, pady=10)
-        
-        # 设置坐标系和边距
-        margin = 50
-        x_min = min([point[0] for point in master_posture])
-        x_max = max([point[0] for point in master_posture])
-        z_min = min([point[2] for point in master_posture])
-        z_max = max([point[2] for point in master_posture])
-        
-        # 计算缩放比例
-        x_scale = (canvas_width - 2 * margin) / (x_max - x_min) if x_max != x_min else 1
-        z_scale = (canvas_height - 2 * margin) / (z_max - z_min) if z_max != z_min else 1
-        scale = min(x_scale, z_scale) * 0.8  # 使用80%的可用空间来确保有足够的边距
-        
-        # 计算居中偏移
-        x_center = (x_max + x_min) / 2
-        z_center = (z_max + z_min) / 2
-        canvas_center_x = canvas_width / 2
-        canvas_center_y = canvas_height / 2
-        
-        # 将3D坐标转换为Canvas坐标
-        coords = []
-        for point in master_posture:
-            # 计算相对于中心点的偏移，然后缩放，最后加上画布中心点
-            canvas_x = canvas_center_x + (point[0] - x_center) * scale
-            # 翻转y轴（Canvas坐标系中y轴向下增长）
-            canvas_y = canvas_center_y - (point[2] - z_center) * scale
-            coords.append((canvas_x, canvas_y))
-        
-        # 定义连接关系
-        connections = [
-            (0, 1), (0, 2), (1, 3), (2, 4), (3, 5),  # Shoulders to elbows to wrists
-            (6, 7), (6, 8), (7, 9), (8, 10), (9, 11)  # Hips to knees to ankles
-        ]
-        
-        # 绘制连接线
-        for start, end in connections:
-            if start < len(coords) and end < len(coords):
-                canvas.create_line(coords[start][0], coords[start][1], 
-                                  coords[end][0], coords[end][1], 
-                                  fill='blue', width=2)
-        
-        # 绘制关键点
-        for x, y in coords:
-            canvas.create_oval(x-5, y-5, x+5, y+5, fill='red', outline='')
-        
-        # 添加标题和轴标签
-        title_label = tk.Label(window, text="传承人姿态二维映射图解", font=('Arial', 14, 'bold'))
-        title_label.pack(pady=(5, 0))
-        
-        x_axis_label = tk.Label(window, text="X 轴")
-        x_axis_label.pack()
-        
-        z_axis_label = tk.Label(window, text="Z 轴")
-        z_axis_label.place(x=10, y=canvas_height/2)
-        
-        print("传承人姿态模型显示成功")
-        
-    except Exception as e:
-        import traceback
-        print(f"显示传承人姿态时出错: {e}")
-        print(traceback.format_exc())
-
-def show_goal(angle1,angle2):
-    # Function to extract angle values from the strings
-    def extract_angle(angle_string):
-        return float(angle_string.split(': ')[1].replace(' 度', ''))
-
-    # Calculate the score based on the error difference
-    def calculate_score(angle1, angle2):
-        score = 10.0  # start with a full score of 10
-        error = abs(angle1 - angle2)
-
-        if error > 5:
-            score -= (error - 5) / 5 * 0.5
+# 定义关节点对，用于计算夹角
+#这里虽然代号是11-16，23-28，但是keypoints_data里是从1-12的，所以这里要进行映射，11-16相当于0-5，23-28相当于6-11
+JOINT_PAIRS = np.array([
+    (2, 0, 4),  # 13-11 与 13-15
+    (3, 1, 5),  # 14-12 与 14-16
+    (0, 2, 6),  # 11-13 与 11-23
+    (1, 3, 7),  # 12-14 与 12-24
+    (6, 0, 8),  # 23-11 与 23-25
+    (7, 1, 9),  # 24-12 与 24-26
+    (6, 7, 8),  # 23-24 与 23-25
+    (7, 6, 9),  # 24-23 与 24-26
+    (8, 6, 10),  # 25-23 与 25-27
+    (9, 7, 11),  # 26-24 与 26-28
+], dtype=np.intp)
+_PAIR_A, _PAIR_B, _PAIR_C = JOINT_PAIRS.T
+# 每个夹角的显示名称，与calculate_angles字符串中冒号前的部分一致
+ANGLE_LABELS = [f"{b}-{a} 和 {a}-{c}夹角为" for a, b, c in JOINT_PAIRS]
+
+
+def compute_angles(keypoints):
+    """
+    批量计算关节夹角
+
+    Args:
+        keypoints: (12,3)或(N,12,3)的关键点坐标
+        
+    Returns:
+        np.ndarray: (N,10)的夹角（度），顺序与JOINT_PAIRS一致
+    """
+    points = np.asarray(keypoints, dtype=np.float32)
+    if points.ndim == 2:
+        points = points[np.newaxis]
+    # 与angle_between_points_3d相同：向量p1->p2与p2->p3的夹角
+    vector1 = points[:, _PAIR_B] - points[:, _PAIR_A]
+    vector2 = points[:, _PAIR_C] - points[:, _PAIR_B]
+    dot_product = np.einsum('nij,nij->ni', vector1, vector2)
+    magnitude = np.linalg.norm(vector1, axis=2) * np.linalg.norm(vector2, axis=2)
+    # 向量长度为0时夹角记为0
+    cos_angle = np.divide(dot_product, magnitude, out=np.ones_like(dot_product), where=magnitude > 0)
+    return np.degrees(np.arccos(np.clip(cos_angle, -1.0, 1.0)))
+
+
+def format_angles(angles):
+    """把一组夹角格式化为显示用的字符串列表"""
+    return [f" {label}: {angle:.2f} 度" for label, angle in zip(ANGLE_LABELS, angles)]
 
-        return max(score, 0)  # ensure score doesn't go below 0
 
-    # Extract angles from the strings
-    angles1 = [extract_angle(a) for a in angle1]
-    angles2 = [extract_angle(a) for a in angle2]
-
-    # Calculate scores for each joint
-    scores = [calculate_score(a1, a2) for a1, a2 in zip(angles1, angles2)]
-
-    # Calculate the average score
-    average_score = sum(scores) / len(scores)
-
-    return average_score
-
-def show_score_and_description(score, description):
-    try:
-        # 创建评分窗口
-        top = tk.Toplevel()
-        top.title("评分与描述")
-        top.geometry("600x400")  # 设置窗口大小
-        
-        # 尝试加载背景图片
-        try:
-            bg_image = PhotoImage(file="background2.png")
-            bg_label = tk.Label(top, image=bg_image)
-            bg_label.place(x=0, y=0, relwidth=1, relheight=1)
-            # 保持对图片的引用，防止图片被垃圾回收
-            top.bg_image = bg_image
-        except Exception as e:
-            print(f"无法加载背景图片: {e}")
-            # 使用纯色背景作为备选
-            top.configure(bg='#f0f0f0')  # 浅灰色背景
-    
-        # 创建一个Frame来放置内容
-        content_frame = tk.Frame(top, bg='white')
-        content_frame.pack(padx=20, pady=20)
-    
-        # 评分标签
-        score_label = tk.Label(content_frame, text=f"{TITLE_LABEL} {score:.1f} {SCORE_LABEL}", 
-                              fg='red', font=('Arial', 20, 'bold'), bg='white')
-        score_label.pack(pady=20)
-    
-        # 动作要领标签
-        lbl_title = tk.Label(content_frame, text=DESCRIPTION_LABEL, 
-                            font=('Arial', 12, 'bold'), bg='white', anchor='w')
-        lbl_title.pack(fill='x', pady=(10, 5))
-        
-        description_label = tk.Label(content_frame, text=description, 
-                                    wraplength=500, bg='white', justify='left',
-                                    anchor='w')
-        description_label.pack(fill='x', pady=5)
-        
-        # 动作要点标签（可以根据不同姿势添加特定要点）
-        if "弓步冲拳" in description:
-            lbl_points = tk.Label(content_frame, text=KEY_POINTS_LABEL, 
-                                font=('Arial', 12, 'bold'), bg='white', anchor='w')
-            lbl_points.pack(fill='x', pady=(10, 5))
-            
-            points_text = "后拳贴身向下冲出"
-            points_label = tk.Label(content_frame, text=points_text, 
-                                   wraplength=500, bg='white', justify='left', 
-                                   anchor='w')
-            points_label.pack(fill='x', pady=5)
-            
-        elif "猛虎出洞" in description:
-            lbl_points = tk.Label(content_frame, text=KEY_POINTS_LABEL, 
-                                font=('Arial', 12, 'bold'), bg='white', anchor='w')
-            lbl_points.pack(fill='x', pady=(10, 5))
-            
-            points_text = "两拳同时击出，保持高低错位"
-            points_label = tk.Label(content_frame, text=points_text, 
-                                   wraplength=500, bg='white', justify='left', 
-                                   anchor='w')
-            points_label.pack(fill='x', pady=5)
-            
-        elif "五花坐山" in description:
-            lbl_points = tk.Label(content_frame, text=KEY_POINTS_LABEL, 
-                                font=('Arial', 12, 'bold'), bg='white', anchor='w')
-            lbl_points.pack(fill='x', pady=(10, 5))
-            
-            points_text = "注意右拳的摆动轨迹，左拳收紧贴于腰间"
-            points_label = tk.Label(content_frame, text=points_text, 
-                                   wraplength=500, bg='white', justify='left', 
-                                   anchor='w')
-            points_label.pack(fill='x', pady=5)
-            
-    except Exception as e:
-        import traceback
-        print(f"显示评分和描述时出错: {e}")
-        print(traceback.format_exc())
-
-
-def main(posture):
-    try:
-        print(f"正在处理姿态: {posture}")
-        
-        # 检查图片是否存在
-        img_path = f"img/{posture}.jpg"
-        if not os.path.exists(img_path):
-            print(IMAGE_NOT_FOUND_ERROR.format(img_path))
-            return
-        
-        print(f"读取图片: {img_path}")
-        # 直接使用OpenCV标准方法读取图片
-        img0 = cv2.imread(img_path)
-        if img0 is None:
-            print("标准方法读取失败，尝试使用自定义方法")
-            img0 = cv_imread(img_path)
-        
-        if img0 is None:
-            print(INVALID_IMAGE_ERROR.format(img_path))
-            return
-            
-        print(f"图片读取成功，尺寸: {img0.shape}")
-        image = img0.copy()
-        img = image.copy()
-
-        # 检测关键点，得到的image是检测过后的图片
-        image, keypoints_data = process_frame(img)
-        
-        if keypoints_data is None or len(keypoints_data) == 0:
-            print(INVALID_KEYPOINTS_ERROR)
-            return
-            
-        angles = calculate_angles(keypoints_data)
-        
-        # 根据姿态选择不同的对照数据
-        if "gongbuchongquan" in posture:
-            angles2 = calculate_angles(coordinate_master.master_gong_bu_chong_quan)
-            show_master(coordinate_master.master_gong_bu_chong_quan)
-            yaoling = "右脚向前落步，成右弓步：左拳向前冲出，拳心朝下：右拳向后斜下方冲出，拳心朝后：目视左拳"
-        elif "menghuchudong" in posture:
-            angles2 = calculate_angles(coordinate_master.master_meng_hu_chu_dong)
-            show_master(coordinate_master.master_meng_hu_chu_dong)
-            yaoling = "左脚向前上步成左弓步；两拳向前方击出；右拳高于头；左拳与胸平，两拳拳心上下相对；目视前方"
-        elif "wuhuazuoshan" in posture:
-            angles2 = calculate_angles(coordinate_master.master_wu_hua_zuo_shan)
-            show_master(coordinate_master.master_wu_hua_zuo_shan)
-            yaoling = "左脚向左上步：右拳由下向右、向上摆至面前，拳心朝后：左掌变拳回收抱于腰间，拳心朝上：目视右拳"
-        else:
-            print(UNKNOWN_POSTURE_ERROR.format(posture))
-            return
-            
-        score = show_goal(angles, angles2)
-
-        print("非遗武术传承人")
-        print(angles2)
-        view_bar(angles2, "传承人")
+def calculate_angles(keypoints_data):
+    """计算关节夹角并返回显示用的字符串列表；需要数值时请使用compute_angles"""
+    return format_angles(compute_angles(keypoints_data)[0])
 
-        print("习武者")
-        print(angles)
-        view_bar(angles, "习武者")
 
-        print(keypoints_data)
-        
-        # 显示评分和要领
-        show_score_and_description(score*10, yaoling)
+def show_goal(angle1, angle2):
+    """
+    比较两组夹角，返回0-10的平均分
 
-        # 使用tkinter创建自定义窗口显示图像对比
-        image_window = tk.Toplevel()
-        image_window.title("习武者姿态展示")
-        image_window.geometry("800x450")  # 设置窗口大小
-        
-        # 创建左右两个框架，增加留白和边框效果
-        left_frame = tk.Frame(image_window, bd=2, relief=tk.GROOVE, padx=5, pady=5)
-        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        right_frame = tk.Frame(image_window, bd=2, relief=tk.GROOVE, padx=5, pady=5)
-        right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        # 创建标题标签，使用更大更粗的字体
-        img0_label = tk.Label(left_frame, text="原图", font=("Arial", 12, "bold"))
-        img0_label.pack(pady=5)
-        
-        # 根据图片大小调整尺寸
-        max_width = 350
-        max_height = 350
-        img_width, img_height = img0.shape[1], img0.shape[0]
-        
-        # 计算调整后的尺寸，保持纵横比
-        if img_width > max_width or img_height > max_height:
-            scale = min(max_width / img_width, max_height / img_height)
-            new_width = int(img_width * scale)
-            new_height = int(img_height * scale)
-            img0_resized = cv2.resize(img0, (new_width, new_height))
-            image_resized = cv2.resize(image, (new_width, new_height))
-        else:
-            img0_resized = img0
-            image_resized = image
-            
-        # 将OpenCV图像转换为Tkinter格式
-        img0_rgb = cv2.cvtColor(img0_resized, cv2.COLOR_BGR2RGB)
-        img0_pil = Image.fromarray(img0_rgb)
-        img0_tk = ImageTk.PhotoImage(image=img0_pil)
-        
-        image_rgb = cv2.cvtColor(image_resized, cv2.COLOR_BGR2RGB)
-        image_pil = Image.fromarray(image_rgb)
-        image_tk = ImageTk.PhotoImage(image=image_pil)
-        
-        # 显示原图
-        img0_canvas = tk.Label(left_frame, image=img0_tk, bd=1, relief=tk.SUNKEN)
-        img0_canvas.image = img0_tk  # 保持引用
-        img0_canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        # 显示处理后的图片
-        image_label = tk.Label(right_frame, text="检测并可视化后的图片", font=("Arial", 12, "bold"))
-        image_label.pack(pady=5)
-        
-        image_canvas = tk.Label(right_frame, image=image_tk, bd=1, relief=tk.SUNKEN)
-        image_canvas.image = image_tk  # 保持引用
-        image_canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        # 使窗口保持在前台
-        image_window.lift()
-        image_window.attributes('-topmost', True)
-        image_window.after_idle(image_window.attributes, '-topmost', False)
-    
-    except Exception as e:
-        import traceback
-        print(f"处理过程中出现错误: {e}")
-        print(traceback.format_exc())
+    每个关节满分10分，误差超过5度后每多5度扣0.5分。angle1和angle2为compute_angles
+    得到的(10,)数组，也可以是(N,10)，此时返回每行的平均分。
+    """
+    error = np.abs(np.asarray(angle1, dtype=np.float32) - np.asarray(angle2, dtype=np.float32))
+    scores = np.maximum(10.0 - np.maximum(error - 5, 0) / 5 * 0.5, 0)
+    average_score = scores.mean(axis=-1)
+    return float(average_score) if average_score.ndim == 0 else average_score
 
 def get_posture_angles(posture):
-    """根据姿势类型获取标准角度数据"""
-    posture_map = {
-        "gongbuchongquan": coordinate_master.master_gong_bu_chong_quan,
-        "menghuchudong": coordinate_master.master_meng_hu_chu_dong,
-        "wuhuazuoshan": coordinate_master.master_wu_hua_zuo_shan,
-        "gunshenchongquan": coordinate_master.master_gun_shen_chong_quan,
-        "yuanhounazhou": coordinate_master.master_yuan_hou_na_zhou,
-        "mabutuizhang": coordinate_master.master_ma_bu_tui_zhang,
-        "bingbubengquan": coordinate_master.master_bing_bu_beng_quan,
-        "shizizhangzui": coordinate_master.master_shi_zi_zhang_zui,
-        "mabukouchuang": coordinate_master.master_ma_bu_kou_chuang,
-        "luohanzhangzhang": coordinate_master.master_luo_han_zhang_zhang
-    }
-    
-    for key, value in posture_map.items():
-        if key in posture:
-            return calculate_angles(value)
-    
-    print(UNKNOWN_POSTURE_ERROR.format(posture))
-    return None
+    """根据姿势类型获取预先计算的标准角度数据"""
+    from posture_registry import registry
+    master = registry.find(posture)
+    if master is None:
+        print(UNKNOWN_POSTURE_ERROR.format(posture))
+        return None
+    return master.angles
 
 def analyze_frame(img_path, posture):
     """分析单帧图像并返回评分，不显示UI"""
@@ -627,7 +313,7 @@ def analyze_frame(img_path, posture):
             return 0
             
         # 计算当前姿势的角度
-        angles = calculate_angles(keypoints_data)
+        angles = compute_angles(keypoints_data)[0]
         
         # 获取标准姿势的角度
         angles2 = get_posture_angles(posture)
@@ -656,7 +342,7 @@ def process_video_frame(img, draw=True, keypoint_size=10):
         img_rgb = np.ascontiguousarray(img_rgb)
         
         # 将RGB图像输入模型，获取关键点预测结果
-        results = pose.process(img_rgb)
+        results = pose_pool.get_pool().process(img_rgb)
         
         keypoints_indices = [11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28]  # 定义要输出的关键点索引
         keypoints = [None] * 33
@@ -665,7 +351,9 @@ def process_video_frame(img, draw=True, keypoint_size=10):
         if results.pose_landmarks:
             # 只在需要绘制时绘制关键点
             if draw:
-                mp_drawing.draw_landmarks(img, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+                # 推理时已加载MediaPipe，这里导入不再有额外开销
+                import mediapipe as mp
+                mp.solutions.drawing_utils.draw_landmarks(img, results.pose_landmarks, POSE_CONNECTIONS)
                 
             # 收集关键点数据
             for index in keypoints_indices:
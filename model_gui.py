@@ -0,0 +1,378 @@
+'''
+桌面程序的可视化界面
+
+Tk窗口、matplotlib和PIL.ImageTk只在桌面程序（GUI.py、martial_arts_analyzer.py）中需要，
+从model中拆分出来，Web服务导入model时不再加载这些库。
+'''
+import os
+
+import cv2
+import matplotlib.pyplot as plt
+import tkinter as tk
+from PIL import Image, ImageTk
+from tkinter import PhotoImage
+
+from model import (ANGLE_LABELS, IMAGE_NOT_FOUND_ERROR, INVALID_IMAGE_ERROR, INVALID_KEYPOINTS_ERROR,
+                   UNKNOWN_POSTURE_ERROR, compute_angles, cv_imread, format_angles, process_frame, show_goal)
+
+plt.rcParams['font.sans-serif'] = ['Microsoft YaHei']  # '微软雅黑'
+plt.rcParams['axes.unicode_minus'] = False  # 解决负号问题（例如在坐标轴上）
+
+# 定义常量
+KEY_POINTS_LABEL = "动作要点:"
+DESCRIPTION_LABEL = "动作要领:"
+TITLE_LABEL = "总分:"
+SCORE_LABEL = "分"
+
+
+def view_bar(angles, name):
+    try:
+        print(f"显示角度数据: {name}")
+        labels = ANGLE_LABELS
+        values = [float(angle) for angle in angles]
+        
+        # 创建Tkinter窗口
+        window = tk.Toplevel()
+        window.title(f"{name}角度数据可视化")
+        window.geometry("800x600")  # 设置窗口大小
+        
+        # 标题
+        title_label = tk.Label(window, text=f"{name}关节角度数据", font=('Arial', 14, 'bold'))
+        title_label.pack(pady=10)
+        
+        # 创建主框架
+        main_frame = tk.Frame(window)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        # 创建画布
+        canvas_width = 650
+        canvas_height = 400
+        canvas = tk.Canvas(main_frame, width=canvas_width, height=canvas_height, bg='white')
+        canvas.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        
+        # 计算参数
+        max_value = max(values) if values else 0
+        if max_value == 0:  # 防止除零错误
+            max_value = 1
+        bar_height = 25
+        bar_spacing = 15
+        margin_left = 250  # 左侧留出空间显示标签
+        margin_top = 50
+        margin_bottom = 50
+        
+        # 画水平线和刻度
+        for i in range(5):
+            tick_value = max_value * i / 4
+            x_pos = margin_left + (canvas_width - margin_left) * tick_value / max_value
+            canvas.create_line(x_pos, margin_top, x_pos, canvas_height - margin_bottom, fill='lightgray')
+            canvas.create_text(x_pos, canvas_height - margin_bottom + 10, text=f"{tick_value:.0f}")
+            
+        # X轴标签
+        canvas.create_text(margin_left + (canvas_width - margin_left) / 2, 
+                           canvas_height - margin_bottom + 30, 
+                           text="度数")
+        
+        # 绘制柱状图
+        for i, (label, value) in enumerate(zip(labels, values)):
+            y_pos = margin_top + i * (bar_height + bar_spacing)
+            bar_width = (canvas_width - margin_left) * value / max_value
+            
+            # 绘制标签
+            canvas.create_text(margin_left - 10, y_pos + bar_height/2, 
+                               text=label, anchor=tk.E, width=240, font=('Arial', 9))
+            
+            # 绘制条形
+            canvas.create_rectangle(margin_left, y_pos, margin_left + bar_width, y_pos + bar_height, 
+                                   fill='skyblue', outline='')
+            
+            # 显示数值
+            canvas.create_text(margin_left + bar_width + 10, y_pos + bar_height/2, 
+                               text=f"{value:.2f}", anchor=tk.W)
+        
+        print(f"{name}角度数据可视化完成")
+        
+    except Exception as e:
+        import traceback
+        print(f"显示角度数据时出错: {e}")
+        print(traceback.format_exc())
+
+
+def show_master(master_posture):
+    try:
+        print("显示传承人姿态模型")
+        # 确保master_posture是列表类型并且有数据
+        if not isinstance(master_posture, list) or len(master_posture) == 0:
+            print("错误: 传承人姿态数据无效")
+            return
+        
+        # 创建Tkinter窗口
+        window = tk.Toplevel()
+        window.title("传承人姿态图解")
+        window.geometry("600x500")  # 设置窗口大小
+        
+        # 创建画布
+        canvas_width, canvas_height = 500, 400
+        canvas = tk.Canvas(window, width=canvas_width, height=canvas_height, bg='white')
+        canvas.pack(padx=10, pady=10)
+        
+        # 设置坐标系和边距
+        margin = 50
+        x_min = min([point[0] for point in master_posture])
+        x_max = max([point[0] for point in master_posture])
+        z_min = min([point[2] for point in master_posture])
+        z_max = max([point[2] for point in master_posture])
+        
+        # 计算缩放比例
+        x_scale = (canvas_width - 2 * margin) / (x_max - x_min) if x_max != x_min else 1
+        z_scale = (canvas_height - 2 * margin) / (z_max - z_min) if z_max != z_min else 1
+        scale = min(x_scale, z_scale) * 0.8  # 使用80%的可用空间来确保有足够的边距
+        
+        # 计算居中偏移
+        x_center = (x_max + x_min) / 2
+        z_center = (z_max + z_min) / 2
+        canvas_center_x = canvas_width / 2
+        canvas_center_y = canvas_height / 2
+        
+        # 将3D坐标转换为Canvas坐标
+        coords = []
+        for point in master_posture:
+            # 计算相对于中心点的偏移，然后缩放，最后加上画布中心点
+            canvas_x = canvas_center_x + (point[0] - x_center) * scale
+            # 翻转y轴（Canvas坐标系中y轴向下增长）
+            canvas_y = canvas_center_y - (point[2] - z_center) * scale
+            coords.append((canvas_x, canvas_y))
+        
+        # 定义连接关系
+        connections = [
+            (0, 1), (0, 2), (1, 3), (2, 4), (3, 5),  # Shoulders to elbows to wrists
+            (6, 7), (6, 8), (7, 9), (8, 10), (9, 11)  # Hips to knees to ankles
+        ]
+        
+        # 绘制连接线
+        for start, end in connections:
+            if start < len(coords) and end < len(coords):
+                canvas.create_line(coords[start][0], coords[start][1], 
+                                  coords[end][0], coords[end][1], 
+                                  fill='blue', width=2)
+        
+        # 绘制关键点
+        for x, y in coords:
+            canvas.create_oval(x-5, y-5, x+5, y+5, fill='red', outline='')
+        
+        # 添加标题和轴标签
+        title_label = tk.Label(window, text="传承人姿态二维映射图解", font=('Arial', 14, 'bold'))
+        title_label.pack(pady=(5, 0))
+        
+        x_axis_label = tk.Label(window, text="X 轴")
+        x_axis_label.pack()
+        
+        z_axis_label = tk.Label(window, text="Z 轴")
+        z_axis_label.place(x=10, y=canvas_height/2)
+        
+        print("传承人姿态模型显示成功")
+        
+    except Exception as e:
+        import traceback
+        print(f"显示传承人姿态时出错: {e}")
+        print(traceback.format_exc())
+
+def show_score_and_description(score, description):
+    try:
+        # 创建评分窗口
+        top = tk.Toplevel()
+        top.title("评分与描述")
+        top.geometry("600x400")  # 设置窗口大小
+        
+        # 尝试加载背景图片
+        try:
+            bg_image = PhotoImage(file="background2.png")
+            bg_label = tk.Label(top, image=bg_image)
+            bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+            # 保持对图片的引用，防止图片被垃圾回收
+            top.bg_image = bg_image
+        except Exception as e:
+            print(f"无法加载背景图片: {e}")
+            # 使用纯色背景作为备选
+            top.configure(bg='#f0f0f0')  # 浅灰色背景
+    
+        # 创建一个Frame来放置内容
+        content_frame = tk.Frame(top, bg='white')
+        content_frame.pack(padx=20, pady=20)
+    
+        # 评分标签
+        score_label = tk.Label(content_frame, text=f"{TITLE_LABEL} {score:.1f} {SCORE_LABEL}", 
+                              fg='red', font=('Arial', 20, 'bold'), bg='white')
+        score_label.pack(pady=20)
+    
+        # 动作要领标签
+        lbl_title = tk.Label(content_frame, text=DESCRIPTION_LABEL, 
+                            font=('Arial', 12, 'bold'), bg='white', anchor='w')
+        lbl_title.pack(fill='x', pady=(10, 5))
+        
+        description_label = tk.Label(content_frame, text=description, 
+                                    wraplength=500, bg='white', justify='left',
+                                    anchor='w')
+        description_label.pack(fill='x', pady=5)
+        
+        # 动作要点标签（可以根据不同姿势添加特定要点）
+        if "弓步冲拳" in description:
+            lbl_points = tk.Label(content_frame, text=KEY_POINTS_LABEL, 
+                                font=('Arial', 12, 'bold'), bg='white', anchor='w')
+            lbl_points.pack(fill='x', pady=(10, 5))
+            
+            points_text = "后拳贴身向下冲出"
+            points_label = tk.Label(content_frame, text=points_text, 
+                                   wraplength=500, bg='white', justify='left', 
+                                   anchor='w')
+            points_label.pack(fill='x', pady=5)
+            
+        elif "猛虎出洞" in description:
+            lbl_points = tk.Label(content_frame, text=KEY_POINTS_LABEL, 
+                                font=('Arial', 12, 'bold'), bg='white', anchor='w')
+            lbl_points.pack(fill='x', pady=(10, 5))
+            
+            points_text = "两拳同时击出，保持高低错位"
+            points_label = tk.Label(content_frame, text=points_text, 
+                                   wraplength=500, bg='white', justify='left', 
+                                   anchor='w')
+            points_label.pack(fill='x', pady=5)
+            
+        elif "五花坐山" in description:
+            lbl_points = tk.Label(content_frame, text=KEY_POINTS_LABEL, 
+                                font=('Arial', 12, 'bold'), bg='white', anchor='w')
+            lbl_points.pack(fill='x', pady=(10, 5))
+            
+            points_text = "注意右拳的摆动轨迹，左拳收紧贴于腰间"
+            points_label = tk.Label(content_frame, text=points_text, 
+                                   wraplength=500, bg='white', justify='left', 
+                                   anchor='w')
+            points_label.pack(fill='x', pady=5)
+            
+    except Exception as e:
+        import traceback
+        print(f"显示评分和描述时出错: {e}")
+        print(traceback.format_exc())
+
+
+def main(posture):
+    try:
+        print(f"正在处理姿态: {posture}")
+        
+        # 检查图片是否存在
+        img_path = f"img/{posture}.jpg"
+        if not os.path.exists(img_path):
+            print(IMAGE_NOT_FOUND_ERROR.format(img_path))
+            return
+        
+        print(f"读取图片: {img_path}")
+        # 直接使用OpenCV标准方法读取图片
+        img0 = cv2.imread(img_path)
+        if img0 is None:
+            print("标准方法读取失败，尝试使用自定义方法")
+            img0 = cv_imread(img_path)
+        
+        if img0 is None:
+            print(INVALID_IMAGE_ERROR.format(img_path))
+            return
+            
+        print(f"图片读取成功，尺寸: {img0.shape}")
+        image = img0.copy()
+        img = image.copy()
+
+        # 检测关键点，得到的image是检测过后的图片
+        image, keypoints_data = process_frame(img)
+        
+        if keypoints_data is None or len(keypoints_data) == 0:
+            print(INVALID_KEYPOINTS_ERROR)
+            return
+            
+        angles = compute_angles(keypoints_data)[0]
+        
+        # 根据姿态选择不同的对照数据
+        from posture_registry import registry
+        master = registry.find(posture)
+        if master is None:
+            print(UNKNOWN_POSTURE_ERROR.format(posture))
+            return
+        angles2 = master.angles
+        show_master(master.coordinates)
+        yaoling = master.essentials
+            
+        score = show_goal(angles, angles2)
+
+        print("非遗武术传承人")
+        print(format_angles(angles2))
+        view_bar(angles2, "传承人")
+
+        print("习武者")
+        print(format_angles(angles))
+        view_bar(angles, "习武者")
+
+        print(keypoints_data)
+        
+        # 显示评分和要领
+        show_score_and_description(score*10, yaoling)
+
+        # 使用tkinter创建自定义窗口显示图像对比
+        image_window = tk.Toplevel()
+        image_window.title("习武者姿态展示")
+        image_window.geometry("800x450")  # 设置窗口大小
+        
+        # 创建左右两个框架，增加留白和边框效果
+        left_frame = tk.Frame(image_window, bd=2, relief=tk.GROOVE, padx=5, pady=5)
+        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        right_frame = tk.Frame(image_window, bd=2, relief=tk.GROOVE, padx=5, pady=5)
+        right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # 创建标题标签，使用更大更粗的字体
+        img0_label = tk.Label(left_frame, text="原图", font=("Arial", 12, "bold"))
+        img0_label.pack(pady=5)
+        
+        # 根据图片大小调整尺寸
+        max_width = 350
+        max_height = 350
+        img_width, img_height = img0.shape[1], img0.shape[0]
+        
+        # 计算调整后的尺寸，保持纵横比
+        if img_width > max_width or img_height > max_height:
+            scale = min(max_width / img_width, max_height / img_height)
+            new_width = int(img_width * scale)
+            new_height = int(img_height * scale)
+            img0_resized = cv2.resize(img0, (new_width, new_height))
+            image_resized = cv2.resize(image, (new_width, new_height))
+        else:
+            img0_resized = img0
+            image_resized = image
+            
+        # 将OpenCV图像转换为Tkinter格式
+        img0_rgb = cv2.cvtColor(img0_resized, cv2.COLOR_BGR2RGB)
+        img0_pil = Image.fromarray(img0_rgb)
+        img0_tk = ImageTk.PhotoImage(image=img0_pil)
+        
+        image_rgb = cv2.cvtColor(image_resized, cv2.COLOR_BGR2RGB)
+        image_pil = Image.fromarray(image_rgb)
+        image_tk = ImageTk.PhotoImage(image=image_pil)
+        
+        # 显示原图
+        img0_canvas = tk.Label(left_frame, image=img0_tk, bd=1, relief=tk.SUNKEN)
+        img0_canvas.image = img0_tk  # 保持引用
+        img0_canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        # 显示处理后的图片
+        image_label = tk.Label(right_frame, text="检测并可视化后的图片", font=("Arial", 12, "bold"))
+        image_label.pack(pady=5)
+        
+        image_canvas = tk.Label(right_frame, image=image_tk, bd=1, relief=tk.SUNKEN)
+        image_canvas.image = image_tk  # 保持引用
+        image_canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        # 使窗口保持在前台
+        image_window.lift()
+        image_window.attributes('-topmost', True)
+        image_window.after_idle(image_window.attributes, '-topmost', False)
+    
+    except Exception as e:
+        import traceback
+        print(f"处理过程中出现错误: {e}")
+        print(traceback.format_exc())
@@ -0,0 +1,315 @@
+'''
+姿态估计器池：为并发的Web请求提供线程安全的MediaPipe Pose实例
+
+MediaPipe在第一次创建估计器时才导入，导入本模块不加载模型相关代码。
+'''
+import glob
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# 池大小默认等于CPU核数，可通过环境变量覆盖
+POOL_SIZE = int(os.environ.get('WUDAO_POSE_POOL_SIZE', 0)) or (os.cpu_count() or 1)
+# 等待空闲估计器的最长时间（秒）
+ACQUIRE_TIMEOUT = float(os.environ.get('WUDAO_POSE_POOL_TIMEOUT', 10))
+# 每个推理线程内OpenCV可使用的线程数，池中实例并行运行时设为1避免CPU超额订阅
+OPENCV_THREADS = int(os.environ.get('WUDAO_OPENCV_THREADS', 1))
+
+# 预热方式：background在后台线程预热，sync在启动时同步预热，off不预热
+WARMUP_MODE = os.environ.get('WUDAO_WARMUP', 'background')
+# 预热使用的示例图像目录，目录中processed_开头的标注结果图不使用
+WARMUP_IMAGE_DIR = os.environ.get('WUDAO_WARMUP_IMAGES', 'img')
+# 每个估计器预热时处理的图像数
+WARMUP_IMAGE_COUNT = 2
+# 预热的估计器池：(static_image_mode, model_complexity)，分别用于图像/摄像头请求和视频
+WARMUP_POOLS = ((True, 1), (False, 1))
+
+POOL_TIMEOUT_ERROR = "姿态估计器繁忙，请稍后重试"
+
+# 清除跟踪状态时送入的空白帧
+_BLANK_FRAME = np.zeros((64, 64, 3), dtype=np.uint8)
+
+_mp_pose = None
+
+
+def load_mp_pose():
+    """导入并返回mediapipe.solutions.pose"""
+    global _mp_pose
+    if _mp_pose is None:
+        import mediapipe as mp
+        _mp_pose = mp.solutions.pose
+    return _mp_pose
+
+
+def __getattr__(name):
+    # 兼容旧的pose_pool.mp_pose用法
+    if name == 'mp_pose':
+        return load_mp_pose()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class PoolTimeoutError(RuntimeError):
+    """在等待时间内没有可用的姿态估计器"""
+
+
+def clear_tracking(estimator):
+    """
+    清除跟踪模式估计器的状态，不重启模型图
+
+    Pose.reset()会关闭并重新启动MediaPipe图，之后的第一帧要多花约200ms。空白帧上检测不到人体，
+    估计器不再沿用上一帧的ROI，关键点平滑滤波也随之重置，下一帧的结果与新建的估计器相同。
+    """
+    estimator.process(_BLANK_FRAME)
+
+
+class PosePool:
+    """
+    有界的MediaPipe Pose估计器池
+
+    估计器按需创建，最多创建size个；借出后必须归还。池满时调用方最多等待timeout秒，
+    超时抛出PoolTimeoutError。
+    """
+
+    def __init__(self, size=None, timeout=None, static_image_mode=True, model_complexity=1, **pose_options):
+        self.size = max(1, size or POOL_SIZE)
+        self.timeout = ACQUIRE_TIMEOUT if timeout is None else timeout
+        self.static_image_mode = static_image_mode
+        self.model_complexity = model_complexity
+        self.pose_options = pose_options
+
+        # 后进先出，优先复用刚归还、缓存仍然热的实例
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._timeouts = 0
+        self._closed = False
+
+        # MediaPipe的Python接口不暴露TFLite线程数，因此在这里限制OpenCV线程，
+        # 由池大小控制并行推理数量
+        if self.size > 1:
+            cv2.setNumThreads(OPENCV_THREADS)
+
+    def _create_estimator(self):
+        return load_mp_pose().Pose(static_image_mode=self.static_image_mode,
+                                   model_complexity=self.model_complexity,
+                                   **self.pose_options)
+
+    def acquire(self, timeout=None):
+        """借出一个估计器，池满时阻塞等待"""
+        if self._closed:
+            raise RuntimeError("姿态估计器池已关闭")
+
+        try:
+            estimator = self._idle.get_nowait()
+        except queue.Empty:
+            estimator = None
+
+        if estimator is None:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    estimator = self._create_estimator()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                wait = self.timeout if timeout is None else timeout
+                with self._lock:
+                    self._waiting += 1
+                try:
+                    estimator = self._idle.get(timeout=wait)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeoutError(POOL_TIMEOUT_ERROR)
+                finally:
+                    with self._lock:
+                        self._waiting -= 1
+
+        with self._lock:
+            self._in_use += 1
+        return estimator
+
+    def release(self, estimator, reset=False):
+        """归还估计器；跟踪模式的实例在交给下一个调用方前应清除跟踪状态，见clear_tracking"""
+        if reset:
+            try:
+                clear_tracking(estimator)
+            except Exception as e:
+                print(f"重置姿态估计器出错: {e}")
+        with self._lock:
+            self._in_use -= 1
+        if self._closed:
+            estimator.close()
+        else:
+            self._idle.put(estimator)
+
+    @contextmanager
+    def estimator(self, timeout=None):
+        """以上下文管理器形式借出估计器，退出时自动归还"""
+        estimator = self.acquire(timeout)
+        try:
+            yield estimator
+        finally:
+            self.release(estimator, reset=not self.static_image_mode)
+
+    def warm_up(self, images):
+        """
+        创建池中全部估计器，每个估计器都处理一遍images，使模型图初始化发生在接收请求之前
+
+        跟踪模式的估计器归还时只清除跟踪状态，模型图保持已初始化
+
+        Returns:
+            int: 预热的估计器数
+        """
+        estimators = []
+        try:
+            # 同时借出size个，保证每个估计器都被预热
+            while len(estimators) < self.size:
+                estimators.append(self.acquire())
+            for estimator in estimators:
+                for img_rgb in images:
+                    estimator.process(img_rgb)
+        finally:
+            for estimator in estimators:
+                self.release(estimator, reset=not self.static_image_mode)
+        return len(estimators)
+
+    def process(self, img_rgb, timeout=None):
+        """借出估计器处理一张RGB图像并立即归还"""
+        with self.estimator(timeout) as estimator:
+            return estimator.process(img_rgb)
+
+    def stats(self):
+        """返回池的当前状态"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'waiting': self._waiting,
+                'timeouts': self._timeouts,
+                'static_image_mode': self.static_image_mode,
+                'model_complexity': self.model_complexity,
+            }
+
+    def close(self):
+        """关闭池中所有空闲的估计器，借出中的估计器在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(static_image_mode=True, model_complexity=1):
+    """按推理模式获取共享的估计器池，不同模式的实例互不混用"""
+    key = (static_image_mode, model_complexity)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = PosePool(static_image_mode=static_image_mode, model_complexity=model_complexity)
+                _pools[key] = pool
+    return pool
+
+
+def pool_stats():
+    """返回所有已创建估计器池的状态"""
+    return [pool.stats() for pool in list(_pools.values())]
+
+
+_warmup = {'state': 'cold', 'mode': WARMUP_MODE, 'seconds': None, 'images': 0, 'estimators': 0, 'error': None}
+_warmup_lock = threading.Lock()
+
+
+def warmup_images(image_dir=None, count=WARMUP_IMAGE_COUNT):
+    """读取预热用的示例图像，返回RGB图像列表"""
+    paths = sorted(path for path in glob.glob(os.path.join(image_dir or WARMUP_IMAGE_DIR, '*.jpg'))
+                   if not os.path.basename(path).startswith('processed_'))
+    images = []
+    for path in paths[:count]:
+        img = cv2.imread(path)
+        if img is not None:
+            images.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    return images
+
+
+def warm_up(image_dir=None):
+    """
+    同步预热WARMUP_POOLS中的全部估计器，返回预热状态
+
+    没有可用的示例图像时使用一张空白图像，至少完成模型图的初始化。
+    """
+    with _warmup_lock:
+        if _warmup['state'] in ('warming', 'warm'):
+            return warmup_status()
+        _warmup.update({'state': 'warming', 'error': None})
+
+    start = time.perf_counter()
+    try:
+        images = warmup_images(image_dir) or [np.zeros((256, 256, 3), dtype=np.uint8)]
+        estimators = sum(get_pool(static_image_mode, model_complexity).warm_up(images)
+                         for static_image_mode, model_complexity in WARMUP_POOLS)
+        _warmup.update({'state': 'warm', 'images': len(images), 'estimators': estimators})
+    except Exception as e:
+        print(f"姿态估计器预热失败: {e}")
+        _warmup.update({'state': 'failed', 'error': str(e)})
+    _warmup['seconds'] = round(time.perf_counter() - start, 3)
+    print(f"姿态估计器预热: {warmup_status()}")
+    return warmup_status()
+
+
+def start_warm_up(mode=None):
+    """按WUDAO_WARMUP配置预热：sync阻塞到预热完成，background在后台线程进行"""
+    mode = mode or WARMUP_MODE
+    _warmup['mode'] = mode
+    if mode == 'sync':
+        warm_up()
+    elif mode == 'background':
+        threading.Thread(target=warm_up, name='pose-warmup', daemon=True).start()
+
+
+def warmup_status():
+    """预热状态；未启用预热时ready也为True，保持原来的按需初始化行为"""
+    status = dict(_warmup)
+    status['ready'] = status['state'] == 'warm' or status['mode'] == 'off'
+    status['pool_size'] = POOL_SIZE
+    return status
+
+
+if __name__ == '__main__':
+    # 简单的并发吞吐量测试: python pose_pool.py img/menghuchudong.jpg
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    img = cv2.imread(sys.argv[1] if len(sys.argv) > 1 else 'img/menghuchudong.jpg')
+    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    pool = get_pool()
+    requests_count = pool.size * 8
+
+    for workers in (1, pool.size):
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda _: pool.process(img_rgb), range(requests_count)))
+        elapsed = time.time() - start
+        print(f"并发数 {workers}: {requests_count} 次推理耗时 {elapsed:.2f}s，{requests_count / elapsed:.1f} 次/秒")
+    print(pool.stats())
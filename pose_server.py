@@ -0,0 +1,354 @@
+'''
+姿态推理服务进程
+
+独立进程持有全部MediaPipe Pose估计器，各Web worker通过共享内存环形缓冲区传递解码后的帧，
+通过Unix socket发送控制消息。帧数据不经过socket，也不重新编码；服务进程直接在共享内存上
+推理并绘制标注，Web worker再从同一块内存读回结果。detect操作只返回关键点，
+标注图像由Web worker在需要返回给客户端时再绘制。
+
+启动: python pose_server.py --socket /tmp/wudao_pose.sock
+Web端启用: 设置环境变量 WUDAO_POSE_SERVER=/tmp/wudao_pose.sock
+'''
+import argparse
+import atexit
+import json
+import os
+import queue
+import re
+import socket
+import struct
+import threading
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import model
+import pose_pool
+
+# 推理服务的Unix socket路径，为空时在本进程内推理
+SERVER_SOCKET = os.environ.get('WUDAO_POSE_SERVER', '')
+DEFAULT_SOCKET = '/tmp/wudao_pose.sock'
+# 每个Web worker的环形缓冲区槽位数，即该worker可同时发出的推理请求数
+RING_SLOTS = int(os.environ.get('WUDAO_POSE_RING_SLOTS', 4))
+# 每个槽位可容纳一帧缩放后的最大BGR图像
+SLOT_BYTES = model.MAX_DIMENSION * model.MAX_DIMENSION * 3
+# 服务进程接受的槽位数上限，限制单块共享内存的大小
+MAX_RING_SLOTS = 64
+# Web worker创建的共享内存名称: 前缀 + 进程号 + 随机后缀；服务进程只附加符合该格式的共享内存
+SHM_PREFIX = 'wudao_pose_'
+_SHM_NAME = re.compile(re.escape(SHM_PREFIX) + r'\d+_[0-9a-f]{8}')
+
+_HEADER = struct.Struct('!I')
+
+
+def _send_message(sock, message):
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("推理服务连接已断开")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv_message(sock):
+    (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, length).decode('utf-8'))
+
+
+def _slot_view(shm, slot, shape):
+    """共享内存中某个槽位上的图像视图，不复制数据"""
+    return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * SLOT_BYTES)
+
+
+class PoseServer:
+    """推理服务：每个连接一个线程，推理使用本进程的估计器池"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.socket_path = socket_path
+        self._segments = {}
+        self._segments_lock = threading.Lock()
+
+    def _attach(self, name):
+        with self._segments_lock:
+            entry = self._segments.get(name)
+            if entry is None:
+                shm = shared_memory.SharedMemory(name=name)
+                # 共享内存由Web worker创建和释放，服务进程只附加，不应在退出时unlink
+                resource_tracker.unregister(shm._name, 'shared_memory')
+                entry = [shm, 0]
+                self._segments[name] = entry
+            entry[1] += 1
+            return entry[0]
+
+    def _detach(self, name):
+        with self._segments_lock:
+            entry = self._segments.get(name)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._segments[name]
+                entry[0].close()
+
+    def _handle_process(self, shm, slot, request):
+        shape = tuple(request['shape'])
+        if len(shape) != 3 or shape[2] != 3 or shape[0] * shape[1] * 3 > SLOT_BYTES:
+            return {'ok': False, 'error': model.VIDEO_FRAME_INVALID_ERROR}
+
+        frame = _slot_view(shm, slot, shape)
+        try:
+            processed_img, keypoints_data = model.process_frame(frame)
+        except pose_pool.PoolTimeoutError:
+            return {'ok': False, 'busy': True, 'error': pose_pool.POOL_TIMEOUT_ERROR}
+
+        if processed_img is None:
+            return {'ok': True, 'keypoints': [], 'image': False}
+        if processed_img is not frame:
+            # 绘制结果不在共享内存中时写回槽位
+            frame[...] = processed_img
+        return {'ok': True, 'keypoints': keypoints_data, 'image': True}
+
+    def _handle_detect(self, shm, slot, request):
+        """只检测关键点，不绘制标注也不写回图像"""
+        shape = tuple(request['shape'])
+        if len(shape) != 3 or shape[2] != 3 or shape[0] * shape[1] * 3 > SLOT_BYTES:
+            return {'ok': False, 'error': model.VIDEO_FRAME_INVALID_ERROR}
+
+        try:
+            _, keypoints_data, landmarks = model.detect_pose(_slot_view(shm, slot, shape))
+        except pose_pool.PoolTimeoutError:
+            return {'ok': False, 'busy': True, 'error': pose_pool.POOL_TIMEOUT_ERROR}
+        return {'ok': True, 'keypoints': keypoints_data,
+                'landmarks': landmarks.tolist() if landmarks is not None else None}
+
+    @staticmethod
+    def _check_hello(hello):
+        """检查握手消息中的共享内存名称、大小和槽位，附加前调用；有效时返回None，否则返回错误信息"""
+        name, size, slot = hello.get('shm'), hello.get('size'), hello.get('slot')
+        if not isinstance(name, str) or not _SHM_NAME.fullmatch(name):
+            return f"无效的共享内存名称: {name!r}"
+        if not isinstance(size, int) or not SLOT_BYTES <= size <= MAX_RING_SLOTS * SLOT_BYTES:
+            return f"共享内存大小超出范围: {size!r}"
+        if not isinstance(slot, int) or not 0 <= slot < size // SLOT_BYTES:
+            return f"无效的槽位: {slot!r}"
+        return None
+
+    def _serve_connection(self, conn):
+        name = None
+        try:
+            hello = _recv_message(conn)
+            error = self._check_hello(hello)
+            if error is not None:
+                print(f"推理服务拒绝连接: {error}")
+                _send_message(conn, {'ok': False, 'error': error})
+                return
+            name, slot = hello['shm'], hello['slot']
+            shm = self._attach(name)
+            if shm.size < hello['size']:
+                # 实际大小小于声明的大小时，按声明访问槽位会越界
+                _send_message(conn, {'ok': False, 'error': f"共享内存大小与声明不符: {shm.size}"})
+                return
+            _send_message(conn, {'ok': True, 'pid': os.getpid()})
+
+            while True:
+                request = _recv_message(conn)
+                if request.get('op') == 'process':
+                    response = self._handle_process(shm, slot, request)
+                elif request.get('op') == 'detect':
+                    response = self._handle_detect(shm, slot, request)
+                elif request.get('op') == 'stats':
+                    response = {'ok': True, 'pools': pose_pool.pool_stats(), 'warmup': pose_pool.warmup_status()}
+                else:
+                    response = {'ok': False, 'error': f"未知操作: {request.get('op')}"}
+                _send_message(conn, response)
+        except ConnectionError:
+            pass
+        except Exception as e:
+            print(f"推理服务处理连接出错: {e}")
+        finally:
+            conn.close()
+            if name is not None:
+                self._detach(name)
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(128)
+        print(f"姿态推理服务已启动: {self.socket_path} (pid {os.getpid()})")
+        try:
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+class PoseClient:
+    """
+    Web worker端的推理客户端
+
+    客户端创建一块共享内存作为环形缓冲区，每个槽位对应一条到推理服务的连接，
+    借出槽位即获得一个并发推理通道。
+    """
+
+    def __init__(self, socket_path, slots=RING_SLOTS):
+        self.socket_path = socket_path
+        self.slots = slots
+        self._shm = shared_memory.SharedMemory(name=f"{SHM_PREFIX}{os.getpid()}_{uuid.uuid4().hex[:8]}",
+                                               create=True, size=slots * SLOT_BYTES)
+        self._free = queue.Queue()
+        self._connections = [None] * slots
+        for slot in range(slots):
+            self._free.put(slot)
+        atexit.register(self.close)
+
+    def _connect(self, slot):
+        conn = self._connections[slot]
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                conn.connect(self.socket_path)
+                _send_message(conn, {'shm': self._shm.name, 'size': self.slots * SLOT_BYTES, 'slot': slot})
+                response = _recv_message(conn)
+            except (OSError, ConnectionError):
+                conn.close()
+                raise
+            if not response.get('ok'):
+                conn.close()
+                raise ConnectionError(f"推理服务拒绝连接: {response.get('error')}")
+            self._connections[slot] = conn
+        return conn
+
+    def _request(self, slot, message):
+        try:
+            conn = self._connect(slot)
+            _send_message(conn, message)
+            return _recv_message(conn)
+        except (OSError, ConnectionError):
+            # 连接失效时丢弃，下次请求重新连接
+            if self._connections[slot] is not None:
+                self._connections[slot].close()
+                self._connections[slot] = None
+            raise
+
+    def process_frame(self, img):
+        """与model.process_frame相同的接口：返回(标注后的图像, 关键点数据)"""
+        if img is None or len(img.shape) != 3 or img.shape[2] != 3 or img.dtype != np.uint8:
+            return model.process_frame(img)
+
+        img = model.limit_image_size(img)
+        slot = self._free.get()
+        try:
+            view = _slot_view(self._shm, slot, img.shape)
+            view[...] = img
+            response = self._request(slot, {'op': 'process', 'shape': list(img.shape)})
+            if not response.get('ok'):
+                if response.get('busy'):
+                    raise pose_pool.PoolTimeoutError(response['error'])
+                print(f"推理服务返回错误: {response.get('error')}")
+                return None, []
+            keypoints_data = [tuple(point) for point in response['keypoints']]
+            processed_img = view.copy() if response.get('image') else None
+            return processed_img, keypoints_data
+        finally:
+            self._free.put(slot)
+
+    def detect(self, img):
+        """与model.detect_pose相同的接口：返回(图像, 关键点数据, 33个关键点数组)"""
+        if img is None or len(img.shape) != 3 or img.shape[2] != 3 or img.dtype != np.uint8:
+            return model.detect_pose(img)
+
+        img = model.limit_image_size(img)
+        slot = self._free.get()
+        try:
+            _slot_view(self._shm, slot, img.shape)[...] = img
+            response = self._request(slot, {'op': 'detect', 'shape': list(img.shape)})
+            if not response.get('ok'):
+                if response.get('busy'):
+                    raise pose_pool.PoolTimeoutError(response['error'])
+                print(f"推理服务返回错误: {response.get('error')}")
+                return img, [], None
+            keypoints_data = [tuple(point) for point in response['keypoints']]
+            landmarks = response.get('landmarks')
+            return img, keypoints_data, np.asarray(landmarks, dtype=np.float32) if landmarks is not None else None
+        finally:
+            self._free.put(slot)
+
+    def stats(self):
+        slot = self._free.get()
+        try:
+            return self._request(slot, {'op': 'stats'})
+        finally:
+            self._free.put(slot)
+
+    def close(self):
+        for conn in self._connections:
+            if conn is not None:
+                conn.close()
+        self._connections = [None] * self.slots
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """返回本进程的推理客户端；未配置WUDAO_POSE_SERVER时返回None"""
+    global _client, _client_pid
+    if not SERVER_SOCKET:
+        return None
+    # gunicorn在fork后每个worker需要自己的共享内存和连接
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = PoseClient(SERVER_SOCKET)
+                _client_pid = os.getpid()
+    return _client
+
+
+def process_frame(img):
+    """优先交给推理服务处理，服务不可用时退回本进程推理"""
+    client = get_client()
+    if client is not None:
+        try:
+            return client.process_frame(img)
+        except (OSError, ConnectionError) as e:
+            print(f"推理服务不可用，改为本地推理: {e}")
+    return model.process_frame(img)
+
+
+def detect(img):
+    """只检测关键点，优先交给推理服务，服务不可用时退回本进程推理"""
+    client = get_client()
+    if client is not None:
+        try:
+            return client.detect(img)
+        except (OSError, ConnectionError) as e:
+            print(f"推理服务不可用，改为本地推理: {e}")
+    return model.detect_pose(img)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='武道智评姿态推理服务')
+    parser.add_argument('--socket', default=SERVER_SOCKET or DEFAULT_SOCKET, help='Unix socket路径')
+    args = parser.parse_args()
+    # 预热完成后才开始监听，Web worker连上时估计器已经就绪
+    if pose_pool.WARMUP_MODE != 'off':
+        pose_pool.warm_up()
+    PoseServer(args.socket).serve_forever()
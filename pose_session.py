@@ -0,0 +1,368 @@
+'''姿态推理会话：在连续帧之间保持跟踪模式估计器的状态'''
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import model
+import pose_pool
+import roi_tracker
+
+# 同时存活的摄像头会话上限，每个会话独占一个MediaPipe图
+MAX_CAMERA_SESSIONS = int(os.environ.get('WUDAO_MAX_CAMERA_SESSIONS', 16))
+# 摄像头会话空闲多少秒后回收
+CAMERA_SESSION_IDLE_TIMEOUT = float(os.environ.get('WUDAO_CAMERA_SESSION_IDLE_TIMEOUT', 60))
+# 同一客户端同时存活的会话上限，超出时回收该客户端自己最久未使用的会话
+MAX_SESSIONS_PER_CLIENT = int(os.environ.get('WUDAO_MAX_CAMERA_SESSIONS_PER_CLIENT', 4))
+# 会话数达到上限时，只回收空闲超过这么多秒的会话，正在发送帧的会话不会被其他客户端挤掉
+CAMERA_SESSION_MIN_IDLE = 5.0
+
+# 模型文件无法下载或加载的model_complexity，本进程内不再尝试
+_unavailable_complexities = set()
+# 切换模型复杂度时在此线程中构建和关闭估计器，不占用请求线程；单线程避免负载高时多个会话同时建图
+_estimator_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='camera-estimator')
+
+
+class SessionLimitError(RuntimeError):
+    """摄像头会话数已达上限，且没有可以回收的空闲会话"""
+
+
+class VideoSession:
+    """
+    一段视频的推理会话
+
+    会话期间独占一个跟踪模式(static_image_mode=False)的估计器，关键点在帧间传递，
+    只有跟丢时才重新做人体检测。结束时清除跟踪状态（不重启模型图）并归还到池中。
+    roi_tracking为True时每帧只推理上一帧人物所在的区域，见roi_tracker。
+
+    用法:
+        with VideoSession() as session:
+            processed_img, keypoints_data = session.process_frame(frame)
+    """
+
+    def __init__(self, model_complexity=1, timeout=None, roi_tracking=False):
+        self.pool = pose_pool.get_pool(static_image_mode=False, model_complexity=model_complexity)
+        self.timeout = timeout
+        self.estimator = None
+        self.frames = 0
+        self.tracker = roi_tracker.RoiTracker() if roi_tracking else None
+
+    def __enter__(self):
+        self.estimator = self.pool.acquire(self.timeout)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def process_frame(self, img):
+        """与model.process_frame相同的返回值：(标注后的图像, 关键点数据)"""
+        if self.estimator is None:
+            raise RuntimeError("视频会话尚未开始")
+        self.frames += 1
+        return model.process_frame(img, estimator=self.estimator, tracker=self.tracker)
+
+    def detect(self, img):
+        """与model.detect_pose相同的返回值：(图像, 关键点数据, 33个关键点数组)，不绘制标注"""
+        if self.estimator is None:
+            raise RuntimeError("视频会话尚未开始")
+        self.frames += 1
+        if self.tracker is not None:
+            return self.tracker.detect(img, self.estimator)
+        return model.detect_pose(img, estimator=self.estimator)
+
+    def close(self):
+        if self.estimator is not None:
+            self.pool.release(self.estimator, reset=True)
+            self.estimator = None
+        if self.tracker is not None:
+            self.tracker.reset()
+
+
+class CameraSession:
+    """
+    一个用户的实时摄像头推理会话
+
+    会话独占一个跟踪模式估计器，MediaPipe在估计器内部保存上一帧的ROI和关键点平滑滤波状态；
+    roi_tracking为True时会话按上一帧关键点的包围框裁剪当前帧，见roi_tracker。同一会话的帧按顺序处理。
+    会话ID由服务端生成，owner为创建会话的客户端，其他客户端不能使用该会话。
+    """
+
+    def __init__(self, owner=None, model_complexity=1, roi_tracking=False):
+        self.session_id = uuid.uuid4().hex
+        self.owner = owner
+        self.model_complexity = model_complexity
+        self.estimator = self._create_estimator(model_complexity)
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+        self.frames = 0
+        self.tracker = roi_tracker.RoiTracker() if roi_tracking else None
+        # 后台构建中的估计器: (model_complexity, Future)
+        self._pending = None
+
+    @staticmethod
+    def _create_estimator(model_complexity):
+        return pose_pool.load_mp_pose().Pose(static_image_mode=False,
+                                             model_complexity=model_complexity,
+                                             smooth_landmarks=True)
+
+    def set_model_complexity(self, model_complexity):
+        """
+        请求切换估计器的模型复杂度，返回本帧实际使用的复杂度
+
+        新估计器在后台线程中构建，构建完成前沿用当前估计器，完成后的下一帧换入，换入后跟踪状态从头开始。
+        切换发生在负载较高时，建图（轻量(0)和高精度(2)模型首次使用时还要下载）不占用请求线程，
+        也不计入帧耗时。模型无法加载时保留当前估计器，本进程内不再尝试该复杂度。
+
+        Returns:
+            int: 实际使用的模型复杂度
+        """
+        with self.lock:
+            if self.estimator is None:
+                return self.model_complexity
+            if self._pending is not None and self._pending[1].done():
+                complexity, future = self._pending
+                self._pending = None
+                estimator = _built_estimator(complexity, future)
+                if estimator is not None and complexity == model_complexity:
+                    estimator, self.estimator = self.estimator, estimator
+                    self.model_complexity = complexity
+                    if self.tracker is not None:
+                        self.tracker.reset()
+                if estimator is not None:
+                    # 换下的估计器或已不需要的新估计器
+                    _estimator_builder.submit(estimator.close)
+            if (model_complexity != self.model_complexity and model_complexity not in _unavailable_complexities
+                    and self._pending is None):
+                self._pending = (model_complexity,
+                                 _estimator_builder.submit(self._create_estimator, model_complexity))
+            return self.model_complexity
+
+    def process_frame(self, img):
+        """与model.process_frame相同的返回值：(标注后的图像, 关键点数据)"""
+        with self.lock:
+            self.last_seen = time.time()
+            self.frames += 1
+            return model.process_frame(img, estimator=self.estimator, tracker=self.tracker)
+
+    def detect(self, img):
+        """与model.detect_pose相同的返回值：(图像, 关键点数据, 33个关键点数组)，不绘制标注"""
+        with self.lock:
+            self.last_seen = time.time()
+            self.frames += 1
+            if self.tracker is not None:
+                return self.tracker.detect(img, self.estimator)
+            return model.detect_pose(img, estimator=self.estimator)
+
+    def close(self):
+        with self.lock:
+            if self.estimator is not None:
+                self.estimator.close()
+                self.estimator = None
+            if self._pending is not None:
+                self._pending[1].add_done_callback(_close_built)
+                self._pending = None
+
+    def info(self):
+        return {
+            'session_id': self.session_id,
+            'frames': self.frames,
+            'model_complexity': self.model_complexity,
+            'idle_seconds': round(time.time() - self.last_seen, 1),
+            'roi_tracking': self.tracker.stats() if self.tracker is not None else None,
+        }
+
+
+def _built_estimator(model_complexity, future):
+    """后台构建的结果，构建失败时记录该复杂度不可用并返回None"""
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"无法加载model_complexity={model_complexity}的姿态模型: {e}")
+        _unavailable_complexities.add(model_complexity)
+        return None
+
+
+def _close_built(future):
+    """会话关闭时仍在构建的估计器，构建完成后直接关闭"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class CameraSessionManager:
+    """
+    摄像头会话表
+
+    按最近使用顺序保存会话：空闲超过idle_timeout的会话被回收。同一客户端的会话数达到
+    max_per_client时回收该客户端最久未使用的会话；总数达到上限时只回收空闲超过
+    CAMERA_SESSION_MIN_IDLE秒的会话，没有可回收的会话时抛出SessionLimitError。
+    """
+
+    def __init__(self, max_sessions=MAX_CAMERA_SESSIONS, idle_timeout=CAMERA_SESSION_IDLE_TIMEOUT,
+                 max_per_client=MAX_SESSIONS_PER_CLIENT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_per_client = max_per_client
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+        self.rejected = 0
+
+    def _evict_idle(self, now):
+        expired = [sid for sid, session in self._sessions.items()
+                   if now - session.last_seen > self.idle_timeout]
+        return [self._sessions.pop(sid) for sid in expired]
+
+    def _find(self, session_id, owner):
+        session = self._sessions.get(session_id) if session_id else None
+        return session if session is not None and session.owner == owner else None
+
+    def _make_room(self, owner, now):
+        """为owner的新会话腾出位置，返回被回收的会话"""
+        owned = [session for session in self._sessions.values() if session.owner == owner]
+        evicted = owned[:max(0, len(owned) - self.max_per_client + 1)]
+        if len(self._sessions) - len(evicted) >= self.max_sessions:
+            oldest = next(session for session in self._sessions.values() if session not in evicted)
+            if now - oldest.last_seen < CAMERA_SESSION_MIN_IDLE:
+                self.rejected += 1
+                raise SessionLimitError('实时分析人数已满，请稍后再试')
+            evicted.append(oldest)
+        for session in evicted:
+            del self._sessions[session.session_id]
+        return evicted
+
+    def get(self, session_id=None, owner=None):
+        """
+        取出owner的已有会话；会话不存在、已过期或属于其他客户端时新建，新会话使用服务端生成的ID
+
+        Args:
+            session_id: 客户端带回的会话ID，调用方应以返回会话的session_id为准
+            owner: 客户端标识，例如IP地址
+
+        Returns:
+            CameraSession: 已移到最近使用位置的会话
+        """
+        with self._lock:
+            evicted = self._evict_idle(time.time())
+            self.evicted += len(evicted)
+            session = self._find(session_id, owner)
+            if session is not None:
+                self._sessions.move_to_end(session.session_id)
+
+        try:
+            if session is None:
+                # 先腾出位置再建图，会话已满时不必构建MediaPipe图
+                evicted += self._reserve(owner)
+                # 构建MediaPipe图较慢，在锁外完成
+                session = CameraSession(owner)
+                try:
+                    # 建图期间可能有其他请求创建了会话，插入前再检查一次上限
+                    evicted += self._reserve(owner, session)
+                except SessionLimitError:
+                    session.close()
+                    raise
+        finally:
+            # 在锁外关闭MediaPipe图，避免阻塞其他请求
+            for old in evicted:
+                old.close()
+        return session
+
+    def _reserve(self, owner, session=None):
+        """为owner回收会话腾出位置，给出session时同时插入；返回被回收的会话"""
+        with self._lock:
+            evicted = self._make_room(owner, time.time())
+            self.evicted += len(evicted)
+            if session is not None:
+                self._sessions[session.session_id] = session
+                self.created += 1
+        return evicted
+
+    def close(self, session_id, owner=None):
+        """关闭owner的会话，会话不存在或属于其他客户端时返回False"""
+        with self._lock:
+            session = self._find(session_id, owner)
+            if session is not None:
+                del self._sessions[session_id]
+        if session is not None:
+            session.close()
+            return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'live': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'max_per_client': self.max_per_client,
+                'idle_timeout': self.idle_timeout,
+                'created': self.created,
+                'evicted': self.evicted,
+                'rejected': self.rejected,
+            }
+
+
+camera_sessions = CameraSessionManager()
+
+
+def compare_video_modes(video_path, frame_interval=1):
+    """对比静态图像模式与跟踪模式处理同一视频的耗时"""
+    import cv2
+
+    def run(process):
+        cap = cv2.VideoCapture(video_path)
+        index = 0
+        processed = 0
+        detected = 0
+        elapsed = 0.0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % frame_interval == 0:
+                start = time.perf_counter()
+                _, keypoints_data = process(frame)
+                elapsed += time.perf_counter() - start
+                processed += 1
+                detected += 1 if keypoints_data else 0
+            index += 1
+        cap.release()
+        return processed, detected, elapsed
+
+    # 先各处理一帧完成图初始化，避免把模型加载时间算进对比
+    cap = cv2.VideoCapture(video_path)
+    _, first_frame = cap.read()
+    cap.release()
+    model.process_frame(first_frame.copy())
+
+    static = run(model.process_frame)
+    with VideoSession() as session:
+        # 预热后只清除跟踪状态；reset()会重启模型图，重启的开销会落在计时的第一帧
+        session.process_frame(first_frame.copy())
+        pose_pool.clear_tracking(session.estimator)
+        tracking = run(session.process_frame)
+
+    return {
+        'frames': static[0],
+        'static_detected': static[1],
+        'tracking_detected': tracking[1],
+        'static_ms_per_frame': static[2] / max(static[0], 1) * 1000,
+        'tracking_ms_per_frame': tracking[2] / max(tracking[0], 1) * 1000,
+        'speedup': static[2] / tracking[2] if tracking[2] > 0 else 0,
+    }
+
+
+if __name__ == '__main__':
+    # python pose_session.py uploads/videos/<视频文件> [帧间隔]
+    import glob
+    import sys
+
+    video_path = sys.argv[1] if len(sys.argv) > 1 else sorted(glob.glob('uploads/videos/*.mp4'))[0]
+    interval = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    result = compare_video_modes(video_path, interval)
+    print(f"视频: {video_path}，处理帧数: {result['frames']}")
+    print(f"静态图像模式: {result['static_ms_per_frame']:.1f} ms/帧，检测到人体 {result['static_detected']} 帧")
+    print(f"跟踪模式: {result['tracking_ms_per_frame']:.1f} ms/帧，检测到人体 {result['tracking_detected']} 帧")
+    print(f"加速比: {result['speedup']:.2f}x")
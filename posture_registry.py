@@ -0,0 +1,192 @@
+'''
+姿势注册表
+
+启动时从coordinate_master加载全部传承人标准姿势（变量名以master_开头），预先计算每个姿势的
+关节夹角和归一化骨架，并以连续数组保存。可按中文名称或拼音代号以O(1)查找。
+coordinate_master中新增的master_*姿势会自动注册，未在POSTURE_NAMES中登记中文名时以拼音代号作为名称。
+'''
+import numpy as np
+
+import coordinate_master
+import model
+
+# 拼音代号到中文名称，顺序即/api/poses返回的顺序
+POSTURE_NAMES = {
+    "gongbuchongquan": "弓步冲拳",
+    "menghuchudong": "猛虎出洞",
+    "wuhuazuoshan": "五花坐山",
+    "gunshenchongquan": "滚身冲拳",
+    "yuanhounazhou": "猿猴纳肘",
+    "mabutuizhang": "马步推掌",
+    "bingbubengquan": "并步崩拳",
+    "shizizhangzui": "狮子张嘴",
+    "mabukouchuang": "马步扣床",
+    "luohanzhangzhang": "罗汉张掌",
+}
+
+# 招式说明与动作要点
+POSTURE_DETAILS = {
+    "弓步冲拳": {
+        "description": "弓步冲拳是武术中最基本的招式之一，要求前腿弯曲，后腿伸直，上身挺直，拳头有力向前冲出。",
+        "key_points": ["前腿膝盖应在脚尖上方", "拳头应与肩同高", "后腿需绷直", "重心应在前腿"],
+        "essentials": "右脚向前落步，成右弓步：左拳向前冲出，拳心朝下：右拳向后斜下方冲出，拳心朝后：目视左拳",
+    },
+    "猛虎出洞": {
+        "description": "猛虎出洞是武术中的一种攻击招式，模仿猛虎出洞扑食的动作，要求双手成虎爪状，有力向前推出。",
+        "key_points": ["虎爪五指张开，指尖用力", "手臂伸展有力", "步伐稳健有力", "身体重心保持稳定"],
+        "essentials": "左脚向前上步成左弓步；两拳向前方击出；右拳高于头；左拳与胸平，两拳拳心上下相对；目视前方",
+    },
+    "五花坐山": {
+        "description": "五花坐山是一种稳定的坐姿招式，上身保持挺直，手臂做五花环绕动作，下肢稳固盘坐。",
+        "key_points": ["下肢稳固盘坐", "上身保持挺直", "手臂动作协调", "呼吸与动作结合"],
+        "essentials": "左脚向左上步：右拳由下向右、向上摆至面前，拳心朝后：左掌变拳回收抱于腰间，拳心朝上：目视右拳",
+    },
+}
+
+# 请求中表示自动识别姿势的名称
+AUTO_POSTURE = "auto"
+# 自动识别返回的候选姿势数
+CLASSIFY_TOP_K = 3
+# 与最相近姿势的距离相差不超过此值（度）的候选视为并列
+CLASSIFY_TIE_TOLERANCE = 0.1
+
+# keypoints_data中左右肩、左右髋的位置
+SHOULDERS = [0, 1]
+HIPS = [6, 7]
+
+
+def normalize_skeleton(keypoints):
+    """
+    把(12,3)或(N,12,3)的关键点平移到髋部中点、按躯干长度缩放，消除位置和体型差异
+
+    Returns:
+        np.ndarray: 与输入形状相同的float32数组
+    """
+    points = np.asarray(keypoints, dtype=np.float32)
+    hip_center = points[..., HIPS, :].mean(axis=-2, keepdims=True)
+    shoulder_center = points[..., SHOULDERS, :].mean(axis=-2, keepdims=True)
+    torso = np.linalg.norm(shoulder_center - hip_center, axis=-1, keepdims=True)
+    return (points - hip_center) / np.maximum(torso, 1e-6)
+
+
+class Posture:
+    """注册表中的一个标准姿势，数组字段是注册表连续数组中的一行"""
+
+    def __init__(self, index, code, name, coordinates, keypoints, angles, skeleton, details):
+        self.index = index
+        self.code = code
+        self.name = name
+        # coordinate_master中的原始坐标列表
+        self.coordinates = coordinates
+        self.keypoints = keypoints
+        self.angles = angles
+        self.skeleton = skeleton
+        self.description = details.get("description", "")
+        self.key_points = details.get("key_points", [])
+        self.essentials = details.get("essentials", "")
+
+    def details(self):
+        return {"name": self.name, "description": self.description, "key_points": self.key_points}
+
+
+class PostureRegistry:
+    """全部标准姿势及其预先计算的参考特征"""
+
+    def __init__(self, source=coordinate_master):
+        entries = []
+        for attr in dir(source):
+            if attr.startswith("master_"):
+                code = attr[len("master_"):].replace("_", "")
+                entries.append((code, getattr(source, attr)))
+        order = list(POSTURE_NAMES)
+        entries.sort(key=lambda entry: (order.index(entry[0]) if entry[0] in order else len(order), entry[0]))
+
+        self.codes = [code for code, _ in entries]
+        self.names = [POSTURE_NAMES.get(code, code) for code in self.codes]
+        # (P,12,3)关键点、(P,10)夹角、(P,12,3)归一化骨架
+        self.keypoints = np.ascontiguousarray([coordinates for _, coordinates in entries], dtype=np.float32)
+        self.angles = np.ascontiguousarray(model.compute_angles(self.keypoints)) if entries else np.zeros((0, 10), np.float32)
+        self.skeletons = np.ascontiguousarray(normalize_skeleton(self.keypoints))
+        # 夹角向量的平方和，分类时用|q|^2+|a|^2-2q·a一次矩阵乘法求出全部距离
+        self._angles_sq = (self.angles.astype(np.float64) ** 2).sum(axis=1)
+
+        self._postures = [
+            Posture(i, code, name, coordinates, self.keypoints[i], self.angles[i], self.skeletons[i],
+                    POSTURE_DETAILS.get(name, {}))
+            for i, (name, (code, coordinates)) in enumerate(zip(self.names, entries))
+        ]
+        self._index = {}
+        for posture in self._postures:
+            self._index[posture.name] = posture
+            self._index[posture.code] = posture
+
+    def get(self, key):
+        """按中文名称或拼音代号查找，未知姿势返回None"""
+        return self._index.get(key)
+
+    def find(self, text):
+        """查找名称或代号出现在text中的姿势，兼容传入文件名等旧调用方式"""
+        posture = self.get(text)
+        if posture is not None or not text:
+            return posture
+        for posture in self._postures:
+            if posture.code in text or posture.name in text:
+                return posture
+        return None
+
+    def classify(self, angles, top_k=CLASSIFY_TOP_K):
+        """
+        把检测到的关节夹角与全部标准姿势比较，返回最相近的姿势
+
+        标准姿势坐标与MediaPipe坐标系不同，因此按与坐标系无关的夹角向量比较。
+        全部距离由一次矩阵乘法得到。coordinate_master中有些姿势的夹角完全相同，距离并列时
+        按注册表顺序排列，结果不随运行变化；与最相近姿势并列的候选全部返回（可能多于top_k），
+        并以tied标记，调用方据此知道识别结果有歧义。
+        
+        Args:
+            angles: model.compute_angles得到的(10,)或(N,10)夹角
+            top_k: 返回的候选数
+            
+        Returns:
+            list: 输入为(10,)时为按相似度排序的[{"posture", "code", "score", "distance", "tied"}]，
+                  score为0-10的夹角相似度，与分析结果的评分同一尺度；输入为(N,10)时为每行一个这样的列表
+        """
+        query = np.asarray(angles, dtype=np.float64)
+        single = query.ndim == 1
+        query = np.atleast_2d(query)
+        if len(self) == 0 or query.shape[1] == 0:
+            return [] if single else [[] for _ in query]
+
+        sq_dist = (query ** 2).sum(axis=1)[:, None] + self._angles_sq[None, :] - 2 * query @ self.angles.T.astype(np.float64)
+        # 每个关节的均方根角度差（度）
+        distances = np.sqrt(np.maximum(sq_dist, 0) / query.shape[1])
+
+        k = min(top_k, len(self))
+        tied = distances <= distances.min(axis=1, keepdims=True) + CLASSIFY_TIE_TOLERANCE
+        tie_counts = tied.sum(axis=1)
+        # 并列的候选排在最前并保持注册表顺序（稳定排序），其余按距离排列
+        order = np.argsort(np.where(tied, -1.0, distances), axis=1, kind='stable')
+
+        results = []
+        for i in range(len(query)):
+            candidates = order[i, :max(k, tie_counts[i])]
+            scores = model.show_goal(query[i], self.angles[candidates])
+            results.append([
+                {"posture": self.names[j], "code": self.codes[j],
+                 "score": round(float(scores[rank]), 2), "distance": round(float(distances[i, j]), 2),
+                 "tied": bool(tie_counts[i] > 1 and tied[i, j])}
+                for rank, j in enumerate(candidates)
+            ])
+        return results[0] if single else results
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._postures)
+
+    def __len__(self):
+        return len(self._postures)
+
+
+registry = PostureRegistry()
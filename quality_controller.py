@@ -0,0 +1,160 @@
+'''
+实时分析的自适应质量控制
+
+摄像头接口的延迟随同时在线的用户数增长。控制器统计本进程正在处理的摄像头帧数（排队深度）
+和最近若干帧推理耗时的p95：负载过高时逐级降低输入分辨率和MediaPipe的model_complexity，
+负载回落后再逐级恢复。切换后重新统计耗时；降档至少间隔STEP_INTERVAL秒，升档至少间隔RECOVER_INTERVAL秒，
+低档位的耗时比高档位低，升档等待更久可以避免在两档之间来回切换。
+每个响应都带上实际使用的质量档位，客户端据此知道得到的是哪一档结果。
+
+用法:
+    with quality_controller.controller.track() as tier:
+        session.set_model_complexity(tier.model_complexity)
+        img = model.limit_image_size(img, tier.max_dimension)
+        analysis = web_model.analyze_frame(img, posture, session=session)
+'''
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import model
+
+# 是否启用自适应质量，关闭时始终使用最高档
+ADAPTIVE_QUALITY = os.environ.get('WUDAO_ADAPTIVE_QUALITY', '1').lower() not in ('0', 'off', 'false')
+# p95推理耗时的目标（毫秒），超过时降一档
+LATENCY_TARGET_MS = float(os.environ.get('WUDAO_QUALITY_TARGET_MS', 200))
+# 同时处理的摄像头帧数上限，超过时降一档，默认为CPU核数
+MAX_IN_FLIGHT = int(os.environ.get('WUDAO_QUALITY_MAX_IN_FLIGHT', 0)) or (os.cpu_count() or 1)
+# 统计p95使用的最近帧数
+LATENCY_WINDOW = 50
+# 至少统计这么多帧后才按耗时调整
+MIN_SAMPLES = 10
+# 切换档位后至少间隔多少秒才能再降档、升档
+STEP_INTERVAL = 2.0
+RECOVER_INTERVAL = 10.0
+# p95低于目标的此比例且排队不超过上限的一半时升一档
+RECOVER_RATIO = 0.5
+
+
+class QualityTier:
+    """一个质量档位：输入图像的最长边和MediaPipe模型复杂度"""
+
+    def __init__(self, name, max_dimension, model_complexity):
+        self.name = name
+        self.max_dimension = max_dimension
+        self.model_complexity = model_complexity
+
+    def info(self, model_complexity=None):
+        """
+        响应中的质量信息
+
+        Args:
+            model_complexity: 实际使用的模型复杂度，轻量模型无法加载时与档位不同
+        """
+        return {
+            'tier': self.name,
+            'max_dimension': self.max_dimension,
+            'model_complexity': self.model_complexity if model_complexity is None else model_complexity,
+        }
+
+
+# 从高到低的质量档位，最高档与静态图像接口一致
+QUALITY_TIERS = (
+    QualityTier('high', model.MAX_DIMENSION, 1),
+    QualityTier('medium', 960, 1),
+    QualityTier('low', 640, 0),
+    QualityTier('minimum', 480, 0),
+)
+
+
+class QualityController:
+    """按排队深度和p95推理耗时在QUALITY_TIERS之间切换，本进程内所有摄像头请求共用"""
+
+    def __init__(self, tiers=QUALITY_TIERS, target_ms=LATENCY_TARGET_MS, max_in_flight=MAX_IN_FLIGHT,
+                 enabled=ADAPTIVE_QUALITY):
+        self.tiers = tiers
+        self.target_ms = target_ms
+        self.max_in_flight = max_in_flight
+        self.enabled = enabled
+        self.level = 0
+        self.in_flight = 0
+        self.steps_down = 0
+        self.steps_up = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._last_change = time.monotonic()
+        self._lock = threading.Lock()
+
+    def current(self):
+        return self.tiers[self.level]
+
+    @contextmanager
+    def track(self):
+        """
+        处理一帧：进入时计入排队深度并返回当前档位，退出时记录耗时并按需调整档位
+
+        抛出异常的帧不计入耗时统计
+        """
+        with self._lock:
+            self.in_flight += 1
+            self._adjust(time.monotonic())
+            tier = self.tiers[self.level]
+        start = time.perf_counter()
+        try:
+            yield tier
+        except BaseException:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.in_flight -= 1
+            # 切换档位前开始的帧不代表新档位的耗时
+            if tier is self.tiers[self.level]:
+                self._latencies.append(elapsed_ms)
+            self._adjust(time.monotonic())
+
+    def _p95(self):
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def _adjust(self, now):
+        since_change = now - self._last_change
+        if not self.enabled or since_change < STEP_INTERVAL:
+            return
+        measured = len(self._latencies) >= MIN_SAMPLES
+        p95 = self._p95()
+        overloaded = self.in_flight > self.max_in_flight or (measured and p95 > self.target_ms)
+        relaxed = (since_change >= RECOVER_INTERVAL and measured and p95 < self.target_ms * RECOVER_RATIO
+                   and self.in_flight <= max(1, self.max_in_flight // 2))
+
+        if overloaded and self.level < len(self.tiers) - 1:
+            self.level += 1
+            self.steps_down += 1
+        elif relaxed and self.level > 0:
+            self.level -= 1
+            self.steps_up += 1
+        else:
+            return
+        print(f"实时分析质量切换为 {self.tiers[self.level].name}: p95 {p95:.0f} ms，处理中 {self.in_flight} 帧")
+        self._latencies.clear()
+        self._last_change = now
+
+    def stats(self):
+        with self._lock:
+            return dict(self.tiers[self.level].info(),
+                        enabled=self.enabled,
+                        level=self.level,
+                        in_flight=self.in_flight,
+                        p95_ms=round(self._p95(), 1),
+                        samples=len(self._latencies),
+                        target_ms=self.target_ms,
+                        max_in_flight=self.max_in_flight,
+                        steps_down=self.steps_down,
+                        steps_up=self.steps_up)
+
+
+controller = QualityController()
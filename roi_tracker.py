@@ -0,0 +1,290 @@
+'''
+ROI跟踪：按上一帧关键点裁剪当前帧
+
+视频和摄像头画面中人物只占一小块区域且移动缓慢。跟踪器由上一帧的关键点计算外扩后的包围框，
+当前帧只把框内的区域交给MediaPipe，再把关键点换算回整帧坐标。裁剪区域在人物仍处于框内时保持不变，
+跟踪模式估计器看到的画面就不会逐帧平移。跟踪模式估计器内部的ROI和平滑滤波状态以输入画面的坐标保存，
+因此送入的区域改变时先清空估计器的跟踪状态。以下情况退回整帧推理:
+- 裁剪区域内没有检测到人体，或12个关键点的平均可见度低于ROI_MIN_VISIBILITY
+- 关键点贴近裁剪区域边缘，说明人物正在离开裁剪区域
+- 包围框已占整帧的大部分，裁剪没有收益
+裁剪推理失败后的ROI_RETRY_FRAMES帧使用整帧，再按整帧结果重新计算裁剪区域。
+
+静态图像模式的估计器每帧都重新做人体检测，裁剪后人物在检测器输入中更大，小目标更容易检出。
+视频流水线的多个推理线程共享一个跟踪器，帧的完成顺序不定，detect传入帧序号时只用比已采用的帧更新的帧更新裁剪区域，
+裁剪区域来自已完成的最新一帧，最多落后推理线程数帧，乱序完成的旧帧不会把区域改回去。
+跟踪模式估计器内部已按上一帧关键点裁剪，区域改变时清空跟踪状态反而会触发重新检测，
+因此VideoSession和CameraSession默认不启用，可通过roi_tracking参数开启。
+'''
+import os
+import threading
+
+import numpy as np
+
+import model
+import pose_pool
+import pose_server
+
+# 视频流水线的静态图像模式推理线程是否启用ROI裁剪
+ROI_TRACKING = os.environ.get('WUDAO_ROI_TRACKING', '1').lower() not in ('0', 'off', 'false')
+# 包围框每边外扩的比例，相对包围框的长边
+ROI_PADDING = 0.25
+# 裁剪区域内12个关键点平均可见度的下限，低于此值退回整帧
+ROI_MIN_VISIBILITY = 0.5
+# 关键点距裁剪区域边缘小于此比例时认为人物正在离开裁剪区域
+ROI_EDGE_MARGIN = 0.02
+# 裁剪区域面积超过整帧的此比例时直接使用整帧
+ROI_MAX_AREA = 0.6
+# 裁剪区域的最小边长（像素）
+ROI_MIN_PIXELS = 32
+# 裁剪推理失败后连续使用整帧的帧数，避免在裁剪与整帧之间反复切换
+ROI_RETRY_FRAMES = 10
+
+
+def _detect(img, estimator):
+    if estimator is None:
+        return pose_server.detect(img)
+    return model.detect_pose(img, estimator)
+
+
+class RoiTracker:
+    """
+    按上一帧关键点裁剪当前帧的跟踪器，每个视频或摄像头会话一个
+
+    用法:
+        tracker = RoiTracker()
+        img, keypoints_data, landmarks = tracker.detect(frame, estimator)
+
+        # 多个推理线程共享时按帧序号绑定，可作为web_model.analyze_frame的session
+        img, keypoints_data, landmarks = tracker.frame(seq).detect(frame)
+    """
+
+    def __init__(self, padding=ROI_PADDING, min_visibility=ROI_MIN_VISIBILITY):
+        self.padding = padding
+        self.min_visibility = min_visibility
+        # 归一化的整帧坐标(x0, y0, x1, y1)，为None时下一帧使用整帧
+        self.roi = None
+        # 上一次送入估计器的区域，None表示整帧
+        self._input_region = None
+        # 剩余的整帧推理帧数
+        self._cooldown = 0
+        # 最近一次更新裁剪区域的帧序号
+        self._seq = -1
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.roi_frames = 0
+        self.fallbacks = 0
+        self.resets = 0
+
+    def detect(self, img, estimator=None, seq=None):
+        """
+        与model.detect_pose相同的接口和返回值，关键点为整帧坐标
+
+        estimator为空时与web_model相同，优先交给推理服务，未配置时使用本进程的静态图像估计器池。
+        seq为帧序号，多个线程共享跟踪器时传入，只有比已采用的帧更新的帧才更新裁剪区域；
+        传入的estimator必须属于调用线程，共享时应使用静态图像模式的估计器或留空。
+        """
+        if img is None or len(img.shape) != 3:
+            return model.detect_pose(img, estimator)
+
+        with self._lock:
+            self.frames += 1
+            roi = self.roi if self._cooldown == 0 else None
+        if roi is not None:
+            landmarks = self._detect_roi(img, estimator, roi)
+            with self._lock:
+                if landmarks is not None:
+                    self.roi_frames += 1
+                    self._update(landmarks, seq)
+                else:
+                    self.fallbacks += 1
+                    # 已有更新的帧采用了裁剪区域时不撤销
+                    if seq is None or seq > self._seq:
+                        self._cooldown = ROI_RETRY_FRAMES
+                        self.roi = None
+            if landmarks is not None:
+                keypoints_data = [(float(x), float(y), float(z)) for x, y, z in landmarks[model.KEYPOINT_INDICES, :3]]
+                return model.limit_image_size(img), keypoints_data, landmarks
+
+        with self._lock:
+            self._cooldown = max(0, self._cooldown - 1)
+        self._switch_region(estimator, None)
+        img, keypoints_data, landmarks = _detect(img, estimator)
+        with self._lock:
+            self._update(landmarks, seq)
+        return img, keypoints_data, landmarks
+
+    def frame(self, seq):
+        """绑定帧序号的detect接口，供多个推理线程共享跟踪器时作为会话传给web_model"""
+        return _OrderedFrame(self, seq)
+
+    def _newer(self, seq):
+        """seq为空（单线程按顺序处理）或比已采用的帧更新时记录并返回True，调用时持有self._lock"""
+        if seq is None:
+            return True
+        if seq <= self._seq:
+            return False
+        self._seq = seq
+        return True
+
+    def _switch_region(self, estimator, region):
+        """送入估计器的区域改变时清空跟踪模式估计器的跟踪状态，旧坐标系下的跟踪状态不再有效"""
+        if region == self._input_region:
+            return
+        self._input_region = region
+        if estimator is not None:
+            pose_pool.clear_tracking(estimator)
+            self.resets += 1
+
+    def _detect_roi(self, img, estimator, roi):
+        """在裁剪区域roi内推理，返回整帧坐标的(33,4)关键点；跟踪置信度不足时返回None"""
+        h, w = img.shape[:2]
+        x0, y0, x1, y1 = roi
+        left, top = int(x0 * w), int(y0 * h)
+        right, bottom = int(np.ceil(x1 * w)), int(np.ceil(y1 * h))
+        if right - left < ROI_MIN_PIXELS or bottom - top < ROI_MIN_PIXELS:
+            return None
+
+        self._switch_region(estimator, roi)
+        _, _, landmarks = _detect(img[top:bottom, left:right], estimator)
+        if landmarks is None or landmarks[model.KEYPOINT_INDICES, 3].mean() < self.min_visibility:
+            return None
+        keypoints = landmarks[model.KEYPOINT_INDICES, :2]
+        if (keypoints < ROI_EDGE_MARGIN).any() or (keypoints > 1 - ROI_EDGE_MARGIN).any():
+            return None
+
+        crop_w, crop_h = right - left, bottom - top
+        landmarks = landmarks.copy()
+        landmarks[:, 0] = (left + landmarks[:, 0] * crop_w) / w
+        landmarks[:, 1] = (top + landmarks[:, 1] * crop_h) / h
+        # z与x使用相同的尺度
+        landmarks[:, 2] *= crop_w / w
+        return landmarks
+
+    def _update(self, landmarks, seq=None):
+        """
+        由本帧关键点更新下一帧的裁剪区域；人物仍在当前区域的内侧时保持区域不变，单帧抖动不会缩小区域
+
+        seq不比已采用的帧更新时忽略本帧，调用时持有self._lock
+        """
+        if not self._newer(seq):
+            return
+        if landmarks is None:
+            self.roi = None
+            return
+
+        # 可见度低的关键点也参与评分，包围框包含全部33个关键点
+        points = landmarks[:, :2]
+        (bx0, by0), (bx1, by1) = np.clip(points.min(axis=0), 0, 1), np.clip(points.max(axis=0), 0, 1)
+        pad = max(bx1 - bx0, by1 - by0) * self.padding
+
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            inner = pad / 2
+            if bx0 - x0 >= inner and by0 - y0 >= inner and x1 - bx1 >= inner and y1 - by1 >= inner:
+                return
+
+        roi = (max(0.0, float(bx0 - pad)), max(0.0, float(by0 - pad)),
+               min(1.0, float(bx1 + pad)), min(1.0, float(by1 + pad)))
+        area = (roi[2] - roi[0]) * (roi[3] - roi[1])
+        self.roi = roi if area <= ROI_MAX_AREA else None
+
+    def reset(self):
+        """估计器被重置或归还时调用"""
+        with self._lock:
+            self.roi = None
+            self._input_region = None
+            self._cooldown = 0
+            self._seq = -1
+
+    def stats(self):
+        return {
+            'roi': self.roi,
+            'frames': self.frames,
+            'roi_frames': self.roi_frames,
+            'fallbacks': self.fallbacks,
+            'resets': self.resets,
+        }
+
+
+class _OrderedFrame:
+    """RoiTracker.frame的返回值，按绑定的帧序号调用共享跟踪器的detect"""
+
+    def __init__(self, tracker, seq):
+        self.tracker = tracker
+        self.seq = seq
+
+    def detect(self, img, estimator=None):
+        return self.tracker.detect(img, estimator, seq=self.seq)
+
+
+def compare_roi(video_path, frame_interval=1):
+    """对比整帧推理与ROI裁剪推理处理同一视频的耗时和关键点偏差"""
+    import time
+
+    import cv2
+
+    def run(detect):
+        cap = cv2.VideoCapture(video_path)
+        index = 0
+        elapsed = 0.0
+        keypoints = []
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % frame_interval == 0:
+                start = time.perf_counter()
+                _, keypoints_data, _ = detect(frame)
+                elapsed += time.perf_counter() - start
+                keypoints.append(np.array(keypoints_data, dtype=np.float32) if keypoints_data else None)
+            index += 1
+        cap.release()
+        return elapsed, keypoints
+
+    pool = pose_pool.get_pool(static_image_mode=False)
+    estimator = pool.acquire()
+    try:
+        # 先处理一帧完成图初始化，避免把模型加载时间算进对比
+        cap = cv2.VideoCapture(video_path)
+        _, first_frame = cap.read()
+        cap.release()
+        model.detect_pose(first_frame, estimator)
+
+        pose_pool.clear_tracking(estimator)
+        full_seconds, full_keypoints = run(lambda frame: model.detect_pose(frame, estimator))
+        pose_pool.clear_tracking(estimator)
+        tracker = RoiTracker()
+        roi_seconds, roi_keypoints = run(lambda frame: tracker.detect(frame, estimator))
+    finally:
+        pool.release(estimator, reset=True)
+
+    # 两种方式都检测到人体的帧上，12个关键点的平均偏差（归一化坐标）
+    deviations = [float(np.abs(a[:, :2] - b[:, :2]).mean())
+                  for a, b in zip(full_keypoints, roi_keypoints) if a is not None and b is not None]
+    frames = len(full_keypoints)
+    return {
+        'frames': frames,
+        'full_detected': sum(1 for k in full_keypoints if k is not None),
+        'roi_detected': sum(1 for k in roi_keypoints if k is not None),
+        'full_ms_per_frame': full_seconds / max(frames, 1) * 1000,
+        'roi_ms_per_frame': roi_seconds / max(frames, 1) * 1000,
+        'speedup': full_seconds / roi_seconds if roi_seconds > 0 else 0,
+        'mean_deviation': float(np.mean(deviations)) if deviations else 0.0,
+        'tracker': tracker.stats(),
+    }
+
+
+if __name__ == '__main__':
+    # python roi_tracker.py uploads/videos/<视频文件> [帧间隔]
+    import glob
+    import sys
+
+    video_path = sys.argv[1] if len(sys.argv) > 1 else sorted(glob.glob('uploads/videos/*.mp4'))[0]
+    interval = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    result = compare_roi(video_path, interval)
+    print(f"视频: {video_path}，处理帧数: {result['frames']}")
+    print(f"整帧: {result['full_ms_per_frame']:.1f} ms/帧，检测到人体 {result['full_detected']} 帧")
+    print(f"ROI裁剪: {result['roi_ms_per_frame']:.1f} ms/帧，检测到人体 {result['roi_detected']} 帧，"
+          f"裁剪推理 {result['tracker']['roi_frames']} 帧，退回整帧 {result['tracker']['fallbacks']} 次")
+    print(f"加速比: {result['speedup']:.2f}x，关键点平均偏差: {result['mean_deviation']:.4f}")
@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# 测试不需要预热姿态估计器
+os.environ.setdefault('WUDAO_WARMUP', 'off')
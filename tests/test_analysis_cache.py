@@ -0,0 +1,42 @@
+'''分析结果缓存的内存上限'''
+import json
+
+from analysis_cache import AnalysisCache
+
+
+def _result(image_bytes):
+    return {'success': True, 'key_frames': [{'image': 'x' * image_bytes}]}
+
+
+def _size(value):
+    return len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+
+def test_evicts_by_bytes():
+    size = _size(_result(1000))
+    cache = AnalysisCache(max_entries=100, directory='', max_bytes=size * 2)
+    for key in 'abc':
+        cache.put(key, _result(1000))
+    assert cache.get('a') is None
+    assert cache.get('b') is not None and cache.get('c') is not None
+    assert cache.stats()['bytes'] == size * 2
+
+
+def test_oversized_result_not_kept_in_memory():
+    cache = AnalysisCache(max_entries=100, directory='', max_bytes=500)
+    cache.put('small', _result(10))
+    cache.put('large', _result(1000))
+    assert cache.get('large') is None
+    assert cache.get('small') is not None
+
+
+def test_replacing_key_keeps_byte_count(tmp_path):
+    cache = AnalysisCache(max_entries=100, directory=str(tmp_path), max_bytes=10000)
+    cache.put('a', _result(100))
+    cache.put('a', _result(200))
+    assert cache.stats()['bytes'] == _size(_result(200))
+
+    # 内存中淘汰后仍可从磁盘取回，并按文件大小计入
+    cache.clear()
+    assert cache.get('a') == _result(200)
+    assert cache.stats()['bytes'] == _size(_result(200))
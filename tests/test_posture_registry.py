@@ -0,0 +1,50 @@
+'''自动识别姿势'''
+from types import SimpleNamespace
+
+import coordinate_master
+import model
+from posture_registry import CLASSIFY_TOP_K, PostureRegistry, registry
+
+
+def _tied_group(index):
+    """与第index个标准姿势夹角相同（在容差内）的全部姿势，按注册表顺序"""
+    return [match['posture'] for match in registry.classify(registry.angles[index]) if match['tied']]
+
+
+def test_tied_postures_are_all_reported_in_registry_order():
+    # coordinate_master中猛虎出洞、猿猴纳肘、狮子张嘴、罗汉张掌的夹角相同
+    index = registry.names.index('猛虎出洞')
+    matches = registry.classify(registry.angles[index])
+    tied = [match['posture'] for match in matches if match['tied']]
+    assert len(tied) > CLASSIFY_TOP_K
+    assert tied == [name for name in registry.names if name in tied]
+    assert matches[0]['posture'] == tied[0]
+
+
+def test_tie_break_is_deterministic():
+    for index in range(len(registry)):
+        group = _tied_group(index)
+        for other in group:
+            # 同一并列组内任一姿势作为输入，识别结果相同
+            assert _tied_group(registry.names.index(other)) == group
+
+
+def test_unique_match_is_not_tied():
+    # 夹角各不相同的两个姿势之间没有并列
+    source = SimpleNamespace(master_gong_bu_chong_quan=coordinate_master.master_gong_bu_chong_quan,
+                             master_wu_hua_zuo_shan=coordinate_master.master_wu_hua_zuo_shan)
+    two = PostureRegistry(source)
+    matches = two.classify(two.angles[1])
+    assert [match['posture'] for match in matches] == ['五花坐山', '弓步冲拳']
+    assert not any(match['tied'] for match in matches)
+
+
+def test_match_scores_use_analysis_scale():
+    matches = registry.classify(registry.angles[0])
+    assert all(0 <= match['score'] <= 10 for match in matches)
+    assert matches[0]['score'] == round(model.show_goal(registry.angles[0], registry.angles[0]), 2)
+
+
+def test_batch_classify_matches_single():
+    batch = registry.classify(registry.angles)
+    assert batch == [registry.classify(angles) for angles in registry.angles]
@@ -0,0 +1,32 @@
+'''多个推理线程共享ROI跟踪器时的帧顺序'''
+import numpy as np
+
+import roi_tracker
+
+
+def _landmarks(cx, cy, half=0.05):
+    landmarks = np.zeros((33, 4), dtype=np.float32)
+    landmarks[:, 0] = np.linspace(cx - half, cx + half, 33)
+    landmarks[:, 1] = np.linspace(cy - half, cy + half, 33)
+    landmarks[:, 3] = 1.0
+    return landmarks
+
+
+def _fake_detect(results):
+    def detect(img, estimator):
+        return img, [], results.pop(0)
+    return detect
+
+
+def test_older_frame_does_not_replace_roi(monkeypatch):
+    img = np.zeros((200, 200, 3), dtype=np.uint8)
+    monkeypatch.setattr(roi_tracker, '_detect', _fake_detect([_landmarks(0.2, 0.2), _landmarks(0.8, 0.8)]))
+    tracker = roi_tracker.RoiTracker()
+
+    # 第5帧先完成，第3帧后完成，裁剪区域仍来自第5帧
+    tracker.frame(5).detect(img)
+    roi = tracker.roi
+    tracker.frame(3).detect(img)
+    assert tracker.roi == roi
+    assert roi[0] < 0.2 < roi[2]
+
@@ -0,0 +1,68 @@
+'''视频采样参数的检查'''
+import glob
+import io
+import os
+
+import pytest
+
+import video_analysis
+from conftest import ROOT
+
+
+@pytest.mark.parametrize('policy, value, expected', [
+    ('fps', '2', 2.0),
+    ('fps', 0.5, 0.5),
+    ('interval', '30', 30),
+    ('count', 1, 1),
+    ('count', '12.0', 12),
+])
+def test_valid_sample_values(policy, value, expected):
+    assert video_analysis.check_sample_value(policy, value) == expected
+
+
+@pytest.mark.parametrize('policy, value', [
+    ('fps', 0),
+    ('fps', 'x'),
+    ('interval', 0.5),
+    ('interval', 2.5),
+    ('count', 0.5),
+    ('count', 0),
+    ('count', -3),
+    ('every', 1),
+])
+def test_invalid_sample_values(policy, value):
+    with pytest.raises(ValueError):
+        video_analysis.check_sample_value(policy, value)
+
+
+def test_sampler_rejects_fractional_count():
+    video_path = sorted(glob.glob(os.path.join(ROOT, 'uploads', 'videos', '*.mp4')))[0]
+    with pytest.raises(ValueError):
+        video_analysis.FrameSampler(video_path, 'count', 0.5)
+    with video_analysis.FrameSampler(video_path, 'count', 1) as sampler:
+        assert sampler.planned == 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    import app
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('policy, value', [('count', '0.5'), ('interval', '0.5'), ('count', 'abc')])
+def test_video_route_rejects_invalid_sample_value(client, policy, value):
+    response = client.post('/api/analysis/video', content_type='multipart/form-data', data={
+        'posture': '弓步冲拳',
+        'sample_policy': policy,
+        'sample_value': value,
+        'video': (io.BytesIO(b'not a video'), 'clip.mp4'),
+    })
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_video_route_defaults_sample_value(client):
+    import app
+    with app.app.test_request_context('/', method='POST', data={'sample_policy': 'count'}):
+        assert app.get_sampling_options() == ('count', video_analysis.SAMPLE_COUNT)
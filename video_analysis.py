@@ -0,0 +1,439 @@
+'''视频分析：逐帧姿态评分、关键帧提取和整体反馈'''
+import base64
+import heapq
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+
+import video_pipeline
+import web_model
+from posture_registry import AUTO_POSTURE
+
+# 同步接口单个视频最多读取的帧数，异步任务不受此限制
+MAX_VIDEO_FRAMES = 300
+# 返回的关键帧数量
+KEY_FRAME_COUNT = 5
+# 评分高于此值的帧才可能成为关键帧
+KEY_FRAME_MIN_SCORE = 5
+# 默认每秒分析的帧数
+SAMPLE_FPS = 2
+# interval策略未指定参数时每隔多少帧分析一帧，约为常见30fps视频的1秒
+SAMPLE_INTERVAL = 30
+# count策略未指定参数时在整段视频上均匀分析的帧数
+SAMPLE_COUNT = 60
+# 各采样策略未指定参数时使用的默认值
+SAMPLE_DEFAULTS = {'fps': SAMPLE_FPS, 'interval': SAMPLE_INTERVAL, 'count': SAMPLE_COUNT}
+# 两个采样帧相隔超过这么多帧时改用定位(seek)，否则逐帧grab跳过
+SEEK_MIN_GAP = 90
+# 单个视频切分的时间段数，每段在独立进程中分析
+VIDEO_SEGMENTS = int(os.environ.get('WUDAO_VIDEO_SEGMENTS', 1))
+# 每段至少包含的采样帧数，过短的视频不值得启动多个进程
+MIN_SEGMENT_SAMPLES = 8
+# 自动识别视频姿势时均匀采样的帧数
+POSTURE_SAMPLE_FRAMES = 5
+
+
+def check_sample_value(policy, value):
+    """
+    检查采样参数，返回规范化后的值：fps为正数，interval和count为不小于1的整数
+
+    Raises:
+        ValueError: 策略未知或参数无效
+    """
+    if policy not in FrameSampler.POLICIES:
+        raise ValueError(f"未知的采样策略: {policy}")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的采样参数: {value}")
+    if policy == 'fps':
+        if not value > 0:
+            raise ValueError("采样参数必须大于0")
+        return value
+    # interval为帧间隔、count为帧数，小数会被截断，小于1时没有可采样的帧
+    if value < 1 or value != int(value):
+        raise ValueError(f"{policy}策略的采样参数必须是不小于1的整数")
+    return int(value)
+
+
+class VideoAnalysisCancelled(Exception):
+    """视频分析被调用方中止"""
+
+
+class FrameSampler:
+    """
+    按采样策略读取视频帧，只有被采样的帧才解码为BGR图像
+
+    跳过的帧只调用grab()而不retrieve()，省去像素格式转换和拷贝；相邻采样帧相隔较远时
+    直接定位到目标帧。支持的策略:
+    - 'fps': 每秒视频时间采样value帧
+    - 'interval': 每隔value帧采样一帧
+    - 'count': 在整段视频上均匀采样value帧
+
+    用法:
+        with FrameSampler(video_path, 'fps', 2) as sampler:
+            for frame_index, frame in sampler:
+                ...
+    """
+
+    POLICIES = ('fps', 'interval', 'count')
+
+    def __init__(self, video_path, policy='fps', value=SAMPLE_FPS, max_frames=None, seek_min_gap=SEEK_MIN_GAP,
+                 start_frame=0, end_frame=None):
+        value = check_sample_value(policy, value)
+        self.cap = cv2.VideoCapture(video_path)
+        self.opened = self.cap.isOpened()
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.policy = policy
+        self.value = value
+        self.seek_min_gap = seek_min_gap
+        # 只输出[start_frame, end_frame)内的采样帧，采样位置与从头读取时一致，用于分段并行分析
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        # 可读取的帧数范围；容器未给出总帧数时只能按间隔顺序读取
+        self.frame_limit = self.total_frames if self.total_frames > 0 else None
+        if max_frames is not None:
+            self.frame_limit = min(self.frame_limit, max_frames) if self.frame_limit else max_frames
+        self.decoded = 0
+        self.grabbed = 0
+        self.seeks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def release(self):
+        self.cap.release()
+
+    @property
+    def interval(self):
+        """fps/interval策略下相邻采样帧的间隔"""
+        if self.policy == 'fps':
+            return max(1, int(self.fps / self.value))
+        return max(1, int(self.value))
+
+    def target_indices(self):
+        """计划采样的帧序号；总帧数未知时返回None"""
+        if self.frame_limit is None:
+            return None
+        if self.policy == 'count':
+            count = min(int(self.value), self.frame_limit)
+            step = self.frame_limit / count
+            targets = sorted({int(i * step + step / 2) for i in range(count)})
+        else:
+            targets = range(0, self.frame_limit, self.interval)
+        end_frame = self.end_frame if self.end_frame is not None else self.frame_limit
+        return [target for target in targets if self.start_frame <= target < end_frame]
+
+    @property
+    def planned(self):
+        """计划采样的帧数，总帧数未知时为None"""
+        targets = self.target_indices()
+        return len(targets) if targets is not None else None
+
+    def _iter_sequential(self):
+        index = 0
+        interval = self.interval
+        if self.start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+            self.seeks += 1
+            index = self.start_frame
+        while self.frame_limit is None or index < self.frame_limit:
+            if index % interval == 0:
+                ret, frame = self.cap.read()
+                self.decoded += 1
+                if not ret:
+                    return
+                yield index, frame
+            else:
+                if not self.cap.grab():
+                    return
+                self.grabbed += 1
+            index += 1
+
+    def __iter__(self):
+        if not self.opened:
+            return
+        targets = self.target_indices()
+        if targets is None:
+            yield from self._iter_sequential()
+            return
+
+        position = 0
+        for target in targets:
+            if target - position > self.seek_min_gap:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                self.seeks += 1
+                position = target
+            while position < target:
+                if not self.cap.grab():
+                    return
+                self.grabbed += 1
+                position += 1
+            ret, frame = self.cap.read()
+            self.decoded += 1
+            if not ret:
+                return
+            position += 1
+            yield target, frame
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'value': self.value,
+            'fps': self.fps,
+            'total_frames': self.total_frames,
+            'decoded': self.decoded,
+            'grabbed': self.grabbed,
+            'seeks': self.seeks,
+        }
+
+
+class VideoScoreAccumulator:
+    """
+    增量汇总逐帧评分
+
+    关键帧只在容量为key_frame_count的最小堆中保留帧的分析结果，分析任意长度的视频时
+    占用的图像内存不变；标注绘制和base64编码只在key_frames()时对最终入选的关键帧进行。
+    """
+
+    def __init__(self, fps, key_frame_count=KEY_FRAME_COUNT, min_score=KEY_FRAME_MIN_SCORE):
+        self.fps = fps
+        self.key_frame_count = key_frame_count
+        self.min_score = min_score
+        self.frame_scores = []
+        self.total_score = 0
+        self.count = 0
+        # 堆元素为(评分, -帧序号, PoseAnalysis)，同分时先淘汰较晚的帧
+        self._key_frames = []
+
+    def add(self, frame_index, score, analysis):
+        self.frame_scores.append({
+            'frame': frame_index,
+            'time': frame_index / self.fps,
+            'score': score
+        })
+        self.total_score += score
+        self.count += 1
+
+        if score > self.min_score and analysis is not None:
+            self._offer((score, -frame_index, analysis))
+
+    def _offer(self, entry):
+        if self.key_frame_count <= 0:
+            return
+        if len(self._key_frames) < self.key_frame_count:
+            heapq.heappush(self._key_frames, entry)
+        elif entry[:2] > self._key_frames[0][:2]:
+            heapq.heapreplace(self._key_frames, entry)
+
+    def merge(self, other):
+        """合并紧接在本段之后的另一段视频的汇总结果"""
+        self.frame_scores.extend(other.frame_scores)
+        self.total_score += other.total_score
+        self.count += other.count
+        for entry in other._key_frames:
+            self._offer(entry)
+
+    @property
+    def average_score(self):
+        return self.total_score / self.count if self.count else 0
+
+    def key_frames(self):
+        """按评分从高到低返回关键帧，此时才绘制标注并编码为base64"""
+        key_frames = []
+        for score, neg_index, analysis in sorted(self._key_frames, key=lambda e: (-e[0], -e[1])):
+            ok, buffer = cv2.imencode('.jpg', analysis.render_overlay(f"Score: {score:.1f}"))
+            if not ok:
+                continue
+            key_frames.append({
+                'frame': -neg_index,
+                'time': -neg_index / self.fps,
+                'score': score,
+                'image': base64.b64encode(buffer.tobytes()).decode('utf-8')
+            })
+        return key_frames
+
+
+def analyze_segment(video_path, posture, policy, value, max_frames, start_frame, end_frame, workers, progress=None):
+    """
+    分析视频中[start_frame, end_frame)范围内的采样帧
+
+    Returns:
+        tuple: (VideoScoreAccumulator, 流水线统计, 视频总帧数)
+    """
+    sampler = FrameSampler(video_path, policy, value, max_frames=max_frames,
+                           start_frame=start_frame, end_frame=end_frame)
+    if not sampler.opened:
+        sampler.release()
+        raise IOError('无法打开视频文件')
+    
+    planned_frames = sampler.planned
+    scores = VideoScoreAccumulator(sampler.fps)
+    
+    def consume(frame_index, score, analysis):
+        scores.add(frame_index, score, analysis)
+        if progress is not None:
+            progress(scores.count, planned_frames or scores.count)
+    
+    # 解码与推理在流水线中重叠进行；只有采样帧会被解码
+    pipeline = video_pipeline.VideoPipeline(posture, workers or video_pipeline.PIPELINE_WORKERS)
+    with sampler:
+        pipeline.run(sampler, consume)
+    return scores, pipeline.stats(), sampler.total_frames
+
+
+def _segment_bounds(targets, segments):
+    """按采样帧数把视频切成segments段，返回各段的(起始帧, 结束帧)"""
+    segments = max(1, min(segments, len(targets) // MIN_SEGMENT_SAMPLES))
+    per_segment = len(targets) / segments
+    starts = [targets[int(i * per_segment)] for i in range(segments)]
+    return list(zip(starts, starts[1:] + [targets[-1] + 1]))
+
+
+def _analyze_segments(video_path, posture, policy, value, max_frames, bounds, workers, progress, planned_frames):
+    """每段在独立进程中分析，再按时间顺序合并"""
+    executor = ProcessPoolExecutor(max_workers=len(bounds), mp_context=multiprocessing.get_context('spawn'))
+    try:
+        futures = [executor.submit(analyze_segment, video_path, posture, policy, value, max_frames,
+                                   start_frame, end_frame, workers)
+                   for start_frame, end_frame in bounds]
+        done_samples = 0
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                done_samples += future.result()[0].count
+            if progress is not None:
+                # 子进程内的逐帧进度不回传，按已完成的段汇报
+                progress(done_samples, planned_frames)
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    scores, _, total_frames = futures[0].result()
+    stats = {'segments': []}
+    for future, (start_frame, end_frame) in zip(futures, bounds):
+        segment_scores, segment_stats, _ = future.result()
+        if segment_scores is not scores:
+            scores.merge(segment_scores)
+        stats['segments'].append(dict(segment_stats, start_frame=start_frame, end_frame=end_frame))
+    return scores, stats, total_frames
+
+
+def classify_video_posture(video_path, samples=POSTURE_SAMPLE_FRAMES):
+    """
+    在视频中均匀采样几帧自动识别姿势，按各帧的最佳匹配投票
+
+    整段视频按同一个姿势评分，逐帧自动识别会让不同帧对照不同的标准姿势。
+    
+    Returns:
+        str: 得票最多的姿势名称，票数相同时取评分之和较高者；没有帧检测到人体时为None
+    """
+    votes = {}
+    with FrameSampler(video_path, 'count', samples) as sampler:
+        if not sampler.opened:
+            raise IOError('无法打开视频文件')
+        for _, frame in sampler:
+            analysis = web_model.analyze_frame(frame, AUTO_POSTURE)
+            if analysis.error or not analysis.matches:
+                continue
+            count, total = votes.get(analysis.posture, (0, 0.0))
+            votes[analysis.posture] = (count + 1, total + analysis.score)
+    if not votes:
+        return None
+    return max(votes, key=lambda name: votes[name])
+
+
+def process_video(video_path, posture, progress=None, policy='fps', value=SAMPLE_FPS, max_frames=None,
+                  workers=None, segments=None):
+    """
+    处理视频并返回分析结果
+    
+    Args:
+        video_path: 视频路径
+        posture: 姿势类型名称，为AUTO_POSTURE时先用classify_video_posture识别整段视频的姿势
+        progress: 可选的进度回调progress(已分析帧数, 计划分析帧数)，
+                  回调抛出VideoAnalysisCancelled时中止分析
+        policy: 采样策略，见FrameSampler
+        value: 采样策略的参数
+        max_frames: 最多读取的帧数，默认分析整段视频
+        workers: 推理线程数，默认WUDAO_VIDEO_PIPELINE_WORKERS，见video_pipeline
+        segments: 切分的时间段数，默认WUDAO_VIDEO_SEGMENTS；大于1时各段在独立进程中并行分析
+        
+    Returns:
+        dict: 实际评分所用的姿势、平均分、逐帧评分、关键帧、反馈和角度数据，truncated表示视频因max_frames被截断；
+              出错时为{'error': 原因}
+    """
+    results = {
+        'average_score': 0,
+        'frames': [],
+        'feedback': {}
+    }
+    
+    try:
+        # 自动识别时先确定整段视频的姿势，所有帧和反馈都按这一个姿势评分
+        if posture == AUTO_POSTURE:
+            posture = classify_video_posture(video_path)
+            if posture is None:
+                return {'error': '未在视频中检测到人体姿势'}
+        results['posture'] = posture
+        
+        segments = segments or VIDEO_SEGMENTS
+        bounds = None
+        if segments > 1:
+            with FrameSampler(video_path, policy, value, max_frames=max_frames) as sampler:
+                if not sampler.opened:
+                    return {'error': '无法打开视频文件'}
+                targets = sampler.target_indices()
+            # 总帧数未知时无法切分，按单段处理
+            if targets:
+                bounds = _segment_bounds(targets, min(segments, os.cpu_count() or 1))
+        
+        if bounds and len(bounds) > 1:
+            scores, stats, total_frames = _analyze_segments(video_path, posture, policy, value, max_frames,
+                                                            bounds, workers, progress, len(targets))
+        else:
+            try:
+                scores, stats, total_frames = analyze_segment(video_path, posture, policy, value, max_frames,
+                                                              0, None, workers, progress)
+            except IOError as e:
+                return {'error': str(e)}
+        
+        results['average_score'] = scores.average_score
+        results['key_frames'] = scores.key_frames()
+        results['frame_scores'] = scores.frame_scores
+        results['truncated'] = bool(max_frames) and total_frames > max_frames
+        results['pipeline'] = stats
+        print(f"视频分析流水线: {results['pipeline']}")
+        
+        # Generate overall feedback
+        position_score = angle_score = stability_score = results['average_score']  # 简化处理，使用平均分
+        results['feedback'] = web_model.generate_detailed_feedback(
+            posture, 
+            results['average_score'],
+            position_score,
+            angle_score,
+            stability_score,
+            [],  # 简化处理，不传入关键点数据
+            [],  # 简化处理，不传入标准姿势数据
+            []   # 简化处理，不传入角度数据
+        )
+        
+        # 获取角度数据
+        angle_data = web_model.get_angle_data_from_video(video_path, posture)
+        results['angle_data'] = angle_data
+        
+        return results
+    
+    except VideoAnalysisCancelled:
+        raise
+    except Exception as e:
+        print(f"处理视频时出错: {e}")
+        return {'error': str(e)}
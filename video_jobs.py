@@ -0,0 +1,294 @@
+'''
+异步视频分析任务
+
+提交任务后立即返回任务ID，由有界的进程池执行video_analysis.process_video。
+任务状态、进度和结果保存在 data/video_jobs/<job_id>.json，取消标记为同目录下的
+<job_id>.cancel 文件，因此任意Web worker都能查询或取消任务。
+
+运行中的任务由工作进程定期更新任务文件的修改时间作为心跳，工作进程崩溃后心跳停止，
+读取任务时超过JOB_STALE_TIMEOUT没有心跳的任务记为失败。已结束超过JOB_RETENTION的任务
+连同取消标记和上传的视频在提交新任务时清理。
+'''
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+# 任务状态文件目录
+VIDEO_JOBS_DIR = os.path.join('data', 'video_jobs')
+# 执行视频分析的进程数
+VIDEO_JOB_WORKERS = int(os.environ.get('WUDAO_VIDEO_JOB_WORKERS', 0)) or max(1, (os.cpu_count() or 2) // 2)
+# 进度写入间隔（秒）
+PROGRESS_INTERVAL = 0.5
+# 运行中的任务更新心跳的间隔（秒）
+HEARTBEAT_INTERVAL = 10
+# 运行中的任务超过这么多秒没有心跳时认为工作进程已退出
+JOB_STALE_TIMEOUT = 120
+# 已结束的任务保留的秒数，之后删除任务记录和上传的视频
+JOB_RETENTION = int(os.environ.get('WUDAO_VIDEO_JOB_RETENTION', 24 * 3600))
+# 两次清理过期任务之间至少间隔的秒数
+SWEEP_INTERVAL = 600
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+STALE_JOB_ERROR = '分析进程异常退出'
+# 只在服务端使用、不返回给客户端的任务字段
+PRIVATE_FIELDS = ('result', 'video_path')
+
+
+def _job_path(job_id):
+    return os.path.join(VIDEO_JOBS_DIR, f"{job_id}.json")
+
+
+def _cancel_path(job_id):
+    return os.path.join(VIDEO_JOBS_DIR, f"{job_id}.cancel")
+
+
+def _valid_job_id(job_id):
+    return isinstance(job_id, str) and len(job_id) == 32 and all(c in '0123456789abcdef' for c in job_id)
+
+
+def load_job(job_id):
+    """读取任务记录，不存在时返回None；运行中但心跳已超时的任务记为失败"""
+    if not _valid_job_id(job_id) or not os.path.exists(_job_path(job_id)):
+        return None
+    try:
+        with open(_job_path(job_id), 'r', encoding='utf-8') as f:
+            job = json.load(f)
+        heartbeat = os.path.getmtime(_job_path(job_id))
+    except Exception as e:
+        print(f"读取视频任务出错: {e}")
+        return None
+    if job['status'] == STATUS_RUNNING and time.time() - heartbeat > JOB_STALE_TIMEOUT:
+        job.update({'status': STATUS_FAILED, 'error': STALE_JOB_ERROR, 'finished_at': time.time()})
+        save_job(job)
+    return job
+
+
+def save_job(job):
+    """原子地写入任务记录，避免查询时读到半个文件"""
+    os.makedirs(VIDEO_JOBS_DIR, exist_ok=True)
+    tmp_path = f"{_job_path(job['job_id'])}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, _job_path(job['job_id']))
+
+
+def is_cancelled(job_id):
+    return os.path.exists(_cancel_path(job_id))
+
+
+def job_status(job):
+    """任务的对外状态，不含结果数据和服务端的文件路径"""
+    status = {key: value for key, value in job.items() if key not in PRIVATE_FIELDS}
+    status['has_result'] = job.get('result') is not None
+    return status
+
+
+def _heartbeat(job_id, stop):
+    """任务运行期间定期更新任务文件的修改时间，分析较慢、进度回调间隔较长时也能表明进程仍在运行"""
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        try:
+            os.utime(_job_path(job_id))
+        except OSError:
+            pass
+
+
+def sweep_jobs(retention=JOB_RETENTION):
+    """
+    删除已结束超过retention秒的任务记录、取消标记和上传的视频
+
+    提交任务的Web进程退出后，排队中的任务不会再被执行，超过retention秒未更新时同样删除
+
+    Returns:
+        int: 删除的任务数
+    """
+    if not os.path.isdir(VIDEO_JOBS_DIR):
+        return 0
+    now = time.time()
+    removed = 0
+    for entry in os.scandir(VIDEO_JOBS_DIR):
+        job_id, ext = os.path.splitext(entry.name)
+        if ext == '.cancel' and not os.path.exists(_job_path(job_id)):
+            # 任务记录已不存在的取消标记
+            _remove(entry.path)
+            continue
+        if ext != '.json':
+            continue
+        job = load_job(job_id)
+        # 任务文件的修改时间即最后一次更新的时间，运行中的任务有心跳，不会被删除
+        if job is None or job['status'] == STATUS_RUNNING or now - os.path.getmtime(entry.path) < retention:
+            continue
+        _remove(job.get('video_path'))
+        _remove(_cancel_path(job_id))
+        _remove(_job_path(job_id))
+        removed += 1
+    if removed:
+        print(f"清理过期视频任务 {removed} 个")
+    return removed
+
+
+def _remove(path):
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"删除文件出错: {e}")
+
+
+def run_job(job_id):
+    """在工作进程中执行一个视频分析任务"""
+    import video_analysis
+
+    job = load_job(job_id)
+    if job is None:
+        return
+    if is_cancelled(job_id):
+        job.update({'status': STATUS_CANCELLED, 'finished_at': time.time()})
+        save_job(job)
+        return
+
+    job.update({'status': STATUS_RUNNING, 'started_at': time.time()})
+    save_job(job)
+    stop_heartbeat = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job_id, stop_heartbeat), daemon=True).start()
+    last_write = [0.0]
+
+    def progress(done_frames, total_frames):
+        now = time.time()
+        if now - last_write[0] < PROGRESS_INTERVAL:
+            return
+        last_write[0] = now
+        if is_cancelled(job_id):
+            raise video_analysis.VideoAnalysisCancelled()
+        fraction = min(done_frames / total_frames, 1.0) if total_frames else 0.0
+        elapsed = now - job['started_at']
+        job.update({
+            'processed_frames': done_frames,
+            'total_frames': total_frames,
+            'progress': round(fraction * 100, 1),
+            'eta_seconds': round(elapsed / fraction * (1 - fraction), 1) if fraction > 0 else None,
+        })
+        save_job(job)
+
+    try:
+        result = video_analysis.process_video(job['video_path'], job['posture'], progress=progress,
+                                              policy=job['sample_policy'], value=job['sample_value'])
+        if 'error' in result:
+            job.update({'status': STATUS_FAILED, 'error': result['error']})
+        else:
+            job.update({'status': STATUS_DONE, 'processed_frames': job['total_frames'] or job['processed_frames'],
+                        'progress': 100.0, 'eta_seconds': 0, 'result': result})
+    except video_analysis.VideoAnalysisCancelled:
+        job['status'] = STATUS_CANCELLED
+    except Exception as e:
+        job.update({'status': STATUS_FAILED, 'error': str(e)})
+    finally:
+        stop_heartbeat.set()
+    job['finished_at'] = time.time()
+    save_job(job)
+
+
+class VideoJobManager:
+    """视频分析任务的提交与取消，进程池在第一次提交时创建"""
+
+    def __init__(self, max_workers=VIDEO_JOB_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._futures = {}
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # 使用spawn启动工作进程，避免fork带入Web进程中的MediaPipe线程
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def submit(self, video_path, posture, policy='fps', value=2):
+        """提交任务，返回任务记录"""
+        self._sweep()
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'status': STATUS_QUEUED,
+            'posture': posture,
+            'video_path': video_path,
+            'sample_policy': policy,
+            'sample_value': value,
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'processed_frames': 0,
+            'total_frames': None,
+            'progress': 0.0,
+            'eta_seconds': None,
+            'error': None,
+            'result': None,
+        }
+        save_job(job)
+        executor = self._get_executor()
+        future = executor.submit(run_job, job['job_id'])
+        with self._lock:
+            self._futures[job['job_id']] = future
+        future.add_done_callback(lambda done: self._finish(job['job_id'], executor, done))
+        return job
+
+    def _finish(self, job_id, executor, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        if future.cancelled() or future.exception() is None:
+            return
+        # 工作进程崩溃时进程池不再可用，其中排队和运行的任务都记为失败，下次提交时重新创建进程池
+        print(f"视频任务 {job_id} 的工作进程异常退出: {future.exception()}")
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        job = load_job(job_id)
+        if job is not None and job['status'] not in FINISHED_STATUSES:
+            job.update({'status': STATUS_FAILED, 'error': STALE_JOB_ERROR, 'finished_at': time.time()})
+            save_job(job)
+
+    def _sweep(self):
+        """距上次清理超过SWEEP_INTERVAL时清理过期任务"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+        try:
+            sweep_jobs()
+        except Exception as e:
+            print(f"清理视频任务出错: {e}")
+
+    def cancel(self, job_id):
+        """取消任务：排队中的任务直接取消，运行中的任务在下一次进度检查时中止"""
+        job = load_job(job_id)
+        if job is None:
+            return None
+        if job['status'] in FINISHED_STATUSES:
+            return job
+
+        open(_cancel_path(job_id), 'w').close()
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            job.update({'status': STATUS_CANCELLED, 'finished_at': time.time()})
+            save_job(job)
+        return job
+
+    def queue_depth(self):
+        with self._lock:
+            return len(self._futures)
+
+
+video_jobs = VideoJobManager()
@@ -0,0 +1,210 @@
+'''
+视频分析流水线
+
+解码、姿态推理、汇总三个阶段通过有界队列衔接：解码线程读取采样帧，推理线程池并行处理，
+调用线程按帧顺序汇总结果。每个阶段记录忙碌时间，用于判断瓶颈所在。
+
+只有一个推理线程时使用跟踪模式会话，关键点在帧间传递；多个推理线程时帧的处理顺序不再连续，
+改用静态图像模式的估计器池，推理线程共享一个ROI跟踪器（roi_tracker），按已完成的最新一帧的关键点裁剪画面。
+'''
+import os
+import queue
+import threading
+import time
+
+import pose_session
+import roi_tracker
+import web_model
+
+# 推理线程数，1表示使用单个跟踪模式会话
+PIPELINE_WORKERS = int(os.environ.get('WUDAO_VIDEO_PIPELINE_WORKERS', 1))
+# 阶段间队列的容量，限制已解码但未处理的帧数
+QUEUE_SIZE = 8
+# 队列阻塞时检查停止标志的间隔（秒）
+POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+class StageTimer:
+    """记录一个阶段的处理数量和忙碌时间"""
+
+    def __init__(self, workers=1):
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.items += 1
+            self.busy += seconds
+
+    def stats(self, wall):
+        return {
+            'workers': self.workers,
+            'items': self.items,
+            'busy_seconds': round(self.busy, 3),
+            'utilization': round(self.busy / (wall * self.workers), 3) if wall > 0 else 0,
+        }
+
+
+class VideoPipeline:
+    """
+    多阶段视频分析流水线
+
+    用法:
+        pipeline = VideoPipeline('弓步冲拳', workers=4)
+        pipeline.run(sampler, consume)   # consume(frame_index, score, analysis) 按帧顺序调用
+        print(pipeline.stats())
+    """
+
+    def __init__(self, posture, workers=PIPELINE_WORKERS, queue_size=QUEUE_SIZE):
+        self.posture = posture
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.decode = StageTimer()
+        self.inference = StageTimer(self.workers)
+        self.aggregate = StageTimer()
+        self.wall = 0.0
+        # 多个推理线程共享的ROI跟踪器，帧乱序完成，按帧序号只采用更新的帧
+        self.tracker = roi_tracker.RoiTracker() if self.workers > 1 and roi_tracker.ROI_TRACKING else None
+        self._stop = threading.Event()
+        self._error = None
+
+    def _put(self, q, item):
+        """放入队列，流水线停止时返回False"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        """从队列取出，流水线停止时返回_DONE"""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _decode_loop(self, frames, frame_queue):
+        try:
+            iterator = iter(frames)
+            seq = 0
+            while True:
+                start = time.perf_counter()
+                item = next(iterator, None)
+                if item is None:
+                    break
+                self.decode.record(time.perf_counter() - start)
+                if not self._put(frame_queue, (seq, item[0], item[1])):
+                    return
+                seq += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(self.workers):
+                self._put(frame_queue, _DONE)
+
+    def _inference_loop(self, frame_queue, result_queue, session):
+        try:
+            while True:
+                item = self._get(frame_queue)
+                if item is _DONE:
+                    break
+                seq, frame_index, frame = item
+                start = time.perf_counter()
+                # 只推理不绘制，关键帧的标注由汇总结果在最后绘制
+                frame_session = self.tracker.frame(seq) if self.tracker is not None else session
+                score, analysis, _ = web_model.analyze_video_frame(frame, self.posture, session=frame_session)
+                self.inference.record(time.perf_counter() - start)
+                if not self._put(result_queue, (seq, frame_index, score, analysis)):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(result_queue, _DONE)
+
+    def _run_inference(self, frame_queue, result_queue):
+        if self.workers == 1:
+            with pose_session.VideoSession() as session:
+                self._inference_loop(frame_queue, result_queue, session)
+        else:
+            self._inference_loop(frame_queue, result_queue, None)
+
+    def _worker(self, frame_queue, result_queue):
+        try:
+            self._run_inference(frame_queue, result_queue)
+        except Exception as e:
+            # 借出跟踪模式估计器失败等情况
+            self._fail(e)
+            self._put(result_queue, _DONE)
+
+    def run(self, frames, consume):
+        """
+        处理frames中的(帧序号, 图像)，在调用线程中按帧顺序调用consume
+
+        consume抛出的异常（例如取消分析）会停止整条流水线并原样抛出。
+        """
+        frame_queue = queue.Queue(maxsize=self.queue_size)
+        result_queue = queue.Queue(maxsize=self.queue_size)
+        threads = [threading.Thread(target=self._decode_loop, args=(frames, frame_queue), daemon=True)]
+        threads += [threading.Thread(target=self._worker, args=(frame_queue, result_queue), daemon=True)
+                    for _ in range(self.workers)]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        pending = {}
+        next_seq = 0
+        finished_workers = 0
+        try:
+            while finished_workers < self.workers:
+                item = self._get(result_queue)
+                if item is _DONE:
+                    if self._stop.is_set():
+                        break
+                    finished_workers += 1
+                    continue
+                pending[item[0]] = item
+                # 多线程推理时结果可能乱序，按解码顺序交给汇总阶段
+                while next_seq in pending:
+                    _, frame_index, score, analysis = pending.pop(next_seq)
+                    aggregate_start = time.perf_counter()
+                    consume(frame_index, score, analysis)
+                    self.aggregate.record(time.perf_counter() - aggregate_start)
+                    next_seq += 1
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self.wall = time.perf_counter() - start
+
+        if self._error is not None:
+            raise self._error
+
+    def stats(self):
+        """各阶段的处理数量、忙碌时间和利用率，利用率最高的阶段即瓶颈"""
+        stages = {
+            'decode': self.decode.stats(self.wall),
+            'inference': self.inference.stats(self.wall),
+            'aggregate': self.aggregate.stats(self.wall),
+        }
+        return {
+            'wall_seconds': round(self.wall, 3),
+            'stages': stages,
+            'bottleneck': max(stages, key=lambda name: stages[name]['utilization']),
+        }
@@ -2,131 +2,120 @@ import os
 import cv2
 import math
 import model
+import pose_server
 import numpy as np
-from coordinate_master import *
+from posture_registry import registry, AUTO_POSTURE
 import time
 
-def process_video_frame_for_web(frame, posture):
-    """
-    处理视频帧并进行姿态分析，用于实时摄像头分析
-    
-    Args:
-        frame: 视频帧图像
-        posture: 姿势类型名称
-        
-    Returns:
-        tuple: (处理后的图像, 评分, 反馈信息)
-    """
-    try:
-        # 处理图像，获取关键点和标注后的图像
-        processed_img, keypoints_data = model.process_frame(frame)
-        if not keypoints_data:
-            print("未检测到人体姿势")
-            return frame, 0, {"level": "错误", "suggestions": ["未检测到人体姿势，请确保画面中有清晰的人物"]}
-        
-        # 计算关节角度
-        try:
-            angles = model.calculate_angles(keypoints_data)
-        except Exception as e:
-            print(f"计算关节角度出错: {e}")
-            angles = []  # 如果计算角度失败，使用空列表
-        
-        # 根据姿势类型选择标准姿势数据
-        master_posture = None
-        if posture == "弓步冲拳":
-            master_posture = master_gong_bu_chong_quan
-        elif posture == "猛虎出洞":
-            master_posture = master_meng_hu_chu_dong
-        elif posture == "五花坐山":
-            master_posture = master_wu_hua_zuo_shan
-        elif posture == "滚身冲拳":
-            master_posture = master_gun_shen_chong_quan
-        elif posture == "猿猴纳肘":
-            master_posture = master_yuan_hou_na_zhou
-        elif posture == "马步推掌":
-            master_posture = master_ma_bu_tui_zhang
-        elif posture == "并步崩拳":
-            master_posture = master_bing_bu_beng_quan
-        elif posture == "狮子张嘴":
-            master_posture = master_shi_zi_zhang_zui
-        elif posture == "马步扣床":
-            master_posture = master_ma_bu_kou_chuang
-        elif posture == "罗汉张掌":
-            master_posture = master_luo_han_zhang_zhang
-        else:
-            return frame, 0, {"level": "错误", "suggestions": [f"未知姿势类型: {posture}"]}
-        
-        # 分析姿势并评分
-        score, feedback = analyze_pose(keypoints_data, master_posture, posture, angles)
-        
-        return processed_img, score, feedback
-    
-    except Exception as e:
-        print(f"处理视频帧时出错: {e}")
-        import traceback
-        traceback.print_exc()
-        return frame, 0, {"level": "错误", "suggestions": [f"分析出错: {str(e)}"]}
+NO_PERSON_FEEDBACK = "未检测到人体姿势，请确保图像中有清晰的人物"
+UNKNOWN_POSTURE_FEEDBACK = "未知姿势类型: {}"
+UNRECOGNIZED_POSTURE_FEEDBACK = "无法识别姿势，请选择姿势类型"
+
+# 关节名称在夹角数组中的位置，顺序见model.JOINT_PAIRS
+ANGLE_JOINTS = {"左肩": 0, "右肩": 1, "左肘": 2, "右肘": 3, "左膝": 8, "右膝": 9}
+
+# 视频角度数据中各部位包含的夹角
+VIDEO_ANGLE_GROUPS = {
+    "肩部角度": [0, 1],
+    "躯干角度": [2, 3],
+    "髋部角度": [4, 5, 6, 7],
+    "膝部角度": [8, 9],
+}
+VIDEO_STANDARD_ANGLES = {
+    "肩部角度": 90,
+    "肘部角度": 170,
+    "髋部角度": 170,
+    "膝部角度": 170,
+    "躯干角度": 180
+}
+
+def joint_angles(angles):
+    """按关节名称取出夹角数值"""
+    if len(angles) == 0:
+        return {}
+    return {joint_name: float(angles[index]) for joint_name, index in ANGLE_JOINTS.items()}
 
-def analyze_martial_arts_image(img_path, posture):
+def angle_list(angles):
+    """夹角数组转换为接口返回的[{"joint", "angle"}]列表"""
+    return [{"joint": label, "angle": round(float(angle), 2)} for label, angle in zip(model.ANGLE_LABELS, angles)]
+
+def get_master_posture(posture):
+    """根据姿势名称或拼音代号获取标准姿势关键点，未知姿势返回None"""
+    master = registry.get(posture)
+    return master.coordinates if master is not None else None
+
+class PoseAnalysis:
     """
-    分析武术姿势图像并返回评分、处理后的图像路径和反馈信息
-    
-    Args:
-        img_path: 图像路径
-        posture: 姿势类型名称
-        
-    Returns:
-        tuple: (评分, 处理后图像路径, 反馈信息)
+    一次解码、一次推理得到的完整分析结果
+
+    接口返回的评分、角度数据、反馈和标注图像都由同一个结果对象生成，
+    不再为每种返回数据分别读取图像和推理。推理只得到关键点，标注图像在第一次
+    访问overlay时才绘制，不需要返回图像的调用方不承担绘制开销。
     """
-    try:
-        # 读取图像
-        img = model.cv_imread(img_path)
-        if img is None:
-            print(f"无法读取图像: {img_path}")
-            return 0, None, {"level": "错误", "suggestions": ["无法读取图像，请检查文件格式"]}
-        
-        # 处理图像，获取关键点
-        processed_img, keypoints_data = model.process_frame(img)
-        if not keypoints_data:
-            print(f"未检测到人体姿势: {img_path}")
-            return 0, None, {"level": "错误", "suggestions": ["未检测到人体姿势，请确保图像中有清晰的人物"]}
-        
-        # 计算关节角度
-        try:
-            angles = model.calculate_angles(keypoints_data)
-        except Exception as e:
-            print(f"计算关节角度出错: {e}")
-            angles = []  # 如果计算角度失败，使用空列表
-        
-        # 根据姿势类型选择标准姿势数据
-        master_posture = None
-        if posture == "弓步冲拳":
-            master_posture = master_gong_bu_chong_quan
-        elif posture == "猛虎出洞":
-            master_posture = master_meng_hu_chu_dong
-        elif posture == "五花坐山":
-            master_posture = master_wu_hua_zuo_shan
-        elif posture == "滚身冲拳":
-            master_posture = master_gun_shen_chong_quan
-        elif posture == "猿猴纳肘":
-            master_posture = master_yuan_hou_na_zhou
-        elif posture == "马步推掌":
-            master_posture = master_ma_bu_tui_zhang
-        elif posture == "并步崩拳":
-            master_posture = master_bing_bu_beng_quan
-        elif posture == "狮子张嘴":
-            master_posture = master_shi_zi_zhang_zui
-        elif posture == "马步扣床":
-            master_posture = master_ma_bu_kou_chuang
-        elif posture == "罗汉张掌":
-            master_posture = master_luo_han_zhang_zhang
-        else:
-            return 0, None, {"level": "错误", "suggestions": [f"未知姿势类型: {posture}"]}
-        
-        # 分析姿势并评分
-        score, feedback = analyze_pose(keypoints_data, master_posture, posture, angles)
-        
-        # 保存处理后的图像
+
+    def __init__(self, posture, keypoints_data=None, angles=None, image=None,
+                 score=0.0, position_score=0.0, angle_score=0.0, stability_score=0.0,
+                 feedback=None, error=None, matches=None, landmarks=None):
+        self.posture = posture
+        self.keypoints_data = keypoints_data or []
+        self.angles = np.zeros(0, dtype=np.float32) if angles is None else angles
+        # 推理所用的图像和33个关键点，用于按需绘制标注
+        self.image = image
+        self.landmarks = landmarks
+        self._overlay = None
+        self.score = score
+        self.position_score = position_score
+        self.angle_score = angle_score
+        self.stability_score = stability_score
+        self.error = error
+        # 自动识别姿势时按相似度排序的候选姿势
+        self.matches = matches or []
+        if feedback is None and error:
+            feedback = {"level": "错误", "suggestions": [error]}
+        self.feedback = feedback
+
+    @property
+    def detected(self):
+        return bool(self.keypoints_data)
+
+    @property
+    def overlay(self):
+        """标注图像，第一次访问时绘制"""
+        if self._overlay is None and self.image is not None:
+            self._overlay = model.draw_pose(self.image, self.landmarks)
+        return self._overlay
+
+    def render_overlay(self, label=None):
+        """绘制带文字标签的标注图像，例如视频关键帧上的评分"""
+        if self.image is None:
+            return None
+        return model.draw_pose(self.image, self.landmarks, label=label)
+
+    def practitioner_angles(self):
+        """习武者的关节角度数值列表"""
+        return angle_list(self.angles)
+
+    def angle_data(self):
+        """与get_angle_data_for_image相同结构的角度数据"""
+        if not self.detected:
+            return {"practitioner_angles": [], "master_angles": []}
+        return {
+            "practitioner_angles": self.practitioner_angles(),
+            "master_angles": get_master_angles_for_posture(self.posture)
+        }
+
+    def encode_overlay(self, ext=".jpg", quality=85):
+        """将标注图像编码为字节串，不经过磁盘"""
+        if self.overlay is None:
+            return None
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext in (".jpg", ".jpeg") else []
+        success, buffer = cv2.imencode(ext, self.overlay, params)
+        return buffer.tobytes() if success else None
+
+    def save_overlay(self, img_path):
+        """将标注图像保存到img目录，返回保存路径；保存失败时返回原始图像路径"""
+        if self.overlay is None:
+            return None
         try:
             # 确保输出目录存在
             os.makedirs("img", exist_ok=True)
@@ -137,12 +126,12 @@ def analyze_martial_arts_image(img_path, posture):
             output_path = os.path.join("img", output_filename)
             
             # 保存处理后的图像
-            success = cv2.imwrite(output_path, processed_img)
+            success = cv2.imwrite(output_path, self.overlay)
             if not success or not os.path.exists(output_path):
                 print(f"警告: 无法保存图像到 {output_path}")
                 # 使用备用路径
                 output_path = os.path.join(os.path.dirname(img_path), output_filename)
-                cv2.imwrite(output_path, processed_img)
+                cv2.imwrite(output_path, self.overlay)
                 
                 # 如果仍然失败，返回原始图像路径
                 if not os.path.exists(output_path):
@@ -151,19 +140,101 @@ def analyze_martial_arts_image(img_path, posture):
             print(f"保存图像时出错: {e}")
             # 如果保存失败，返回原始图像路径
             output_path = img_path
+        return output_path
+
+def decode_image(image_bytes):
+    """在内存中将JPEG/PNG等编码数据解码为BGR图像，失败返回None"""
+    if not image_bytes:
+        return None
+    return cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def analyze_frame(img, posture, session=None):
+    """
+    对一帧图像做一次推理，得到完整的分析结果
+    
+    Args:
+        img: BGR图像
+        posture: 姿势类型名称，为"auto"时与全部标准姿势比较，按最相近的姿势评分
+        session: 可选的推理会话，提供detect(img)，例如pose_session中的会话或roi_tracker.RoiTracker
+
+    Returns:
+        PoseAnalysis: 分析结果，失败时error字段说明原因
+    """
+    auto = posture == AUTO_POSTURE
+    if not auto:
+        master = registry.get(posture)
+        if master is None:
+            return PoseAnalysis(posture, error=UNKNOWN_POSTURE_FEEDBACK.format(posture))
+        # 拼音代号统一为中文名称，评分和反馈按中文名称查表
+        posture = master.name
+
+    # 只检测关键点，标注图像需要时再绘制
+    if session is not None:
+        img, keypoints_data, landmarks = session.detect(img)
+    else:
+        img, keypoints_data, landmarks = pose_server.detect(img)
+    if not keypoints_data:
+        return PoseAnalysis(posture, image=img, error=NO_PERSON_FEEDBACK)
+    
+    # 计算关节角度
+    try:
+        angles = model.compute_angles(keypoints_data)[0]
+    except Exception as e:
+        print(f"计算关节角度出错: {e}")
+        angles = np.zeros(0, dtype=np.float32)  # 如果计算角度失败，使用空数组
+    
+    # 自动识别：与全部标准姿势的夹角一次性比较，按最相近的姿势评分
+    matches = None
+    if auto:
+        matches = registry.classify(angles) if len(angles) else []
+        if not matches:
+            return PoseAnalysis(posture, keypoints_data, angles, img, error=UNRECOGNIZED_POSTURE_FEEDBACK,
+                                landmarks=landmarks)
+        master = registry.get(matches[0]["posture"])
+        posture = master.name
+    master_posture = master.coordinates
+    
+    # 分析姿势并评分
+    final_score, position_score, angle_score, stability_score = score_pose(keypoints_data, master_posture, posture, angles)
+    feedback = generate_detailed_feedback(posture, final_score, position_score, angle_score, stability_score,
+                                          keypoints_data, master_posture, angles)
+    
+    return PoseAnalysis(posture, keypoints_data, angles, img, final_score,
+                        position_score, angle_score, stability_score, feedback, matches=matches,
+                        landmarks=landmarks)
+
+def analyze_martial_arts_image(img_path, posture, session=None):
+    """
+    分析武术姿势图像并返回评分、处理后的图像路径和反馈信息
+    
+    Args:
+        img_path: 图像路径
+        posture: 姿势类型名称
+        session: 可选的摄像头会话，传入时使用会话的跟踪模式估计器
+        
+    Returns:
+        tuple: (评分, 处理后图像路径, 反馈信息)
+    """
+    try:
+        # 读取图像
+        img = model.cv_imread(img_path)
+        if img is None:
+            print(f"无法读取图像: {img_path}")
+            return 0, None, {"level": "错误", "suggestions": ["无法读取图像，请检查文件格式"]}
         
-        return score, output_path, feedback
+        analysis = analyze_frame(img, posture, session=session)
+        if analysis.error:
+            print(f"{analysis.error}: {img_path}")
+            return 0, None, analysis.feedback
+        
+        return analysis.score, analysis.save_overlay(img_path), analysis.feedback
     
     except Exception as e:
         print(f"分析图像时出错: {e}")
         return 0, None, {"level": "错误", "suggestions": [f"分析出错: {str(e)}"]}
 
-def analyze_pose(keypoints_data, master_posture, posture_name, angles):
-    """分析姿势并评分"""
-    
-    # 检查关键点和标准姿势是否有效
-    if not keypoints_data or not master_posture:
-        return 3.0, {"level": "错误", "suggestions": ["关键点或标准姿势无效"]}
+def score_pose(keypoints_data, master_posture, posture_name, angles):
+    """计算各项分数，返回(综合评分, 位置分, 角度分, 稳定性分)"""
     
     # 分析关键点位置
     position_score = analyze_position(keypoints_data, master_posture)
@@ -177,6 +248,17 @@ def analyze_pose(keypoints_data, master_posture, posture_name, angles):
     # 综合评分 (位置占50%，角度占40%，稳定性占10%)
     final_score = position_score * 0.5 + angle_score * 0.4 + stability_score * 0.1
     
+    return final_score, position_score, angle_score, stability_score
+
+def analyze_pose(keypoints_data, master_posture, posture_name, angles):
+    """分析姿势并评分"""
+    
+    # 检查关键点和标准姿势是否有效
+    if not keypoints_data or not master_posture:
+        return 3.0, {"level": "错误", "suggestions": ["关键点或标准姿势无效"]}
+    
+    final_score, position_score, angle_score, stability_score = score_pose(keypoints_data, master_posture, posture_name, angles)
+    
     # 生成反馈
     feedback = generate_detailed_feedback(posture_name, final_score, position_score, angle_score, stability_score, keypoints_data, master_posture, angles)
     
@@ -229,14 +311,6 @@ def generate_detailed_feedback(posture_name, final_score, position_score, angle_
     
     # 分析角度问题
     if angle_score < 6.0:
-        # 解析角度字符串
-        angle_values = {}
-        angle_mapping = {
-            "0-2": "左肩", "1-3": "右肩",
-            "2-4": "左肘", "3-5": "右肘",
-            "6-8": "左膝", "7-9": "右膝"
-        }
-        
         # 理想角度参考值
         ideal_angles = {
             "弓步冲拳": {"左肩": 45, "右肩": 90, "左肘": 170, "右肘": 90, "左膝": 150, "右膝": 90},
@@ -246,21 +320,7 @@ def generate_detailed_feedback(posture_name, final_score, position_score, angle_
             "并步崩拳": {"左肩": 45, "右肩": 90, "左肘": 170, "右肘": 90, "左膝": 170, "右膝": 170}
         }
         
-        # 提取角度值
-        for angle_str in angles:
-            try:
-                # 提取角度值
-                angle_value = float(angle_str.split(":")[-1].split("度")[0].strip())
-                
-                # 提取关节标识
-                joint_part = angle_str.split("和")[0].strip()
-                
-                # 映射到关节名称
-                if joint_part in angle_mapping:
-                    joint_name = angle_mapping[joint_part]
-                    angle_values[joint_name] = angle_value
-            except Exception as e:
-                print(f"解析角度字符串出错: {e}, 字符串: {angle_str}")
+        angle_values = joint_angles(angles)
         
         # 检查具体哪些角度偏离较大
         problem_angles = []
@@ -362,30 +422,8 @@ def analyze_angles(angles, posture_name):
     if posture_name not in ideal_angles:
         return 7.0
     
-    # 由于angles是字符串列表，我们需要解析出实际角度值
-    # 示例格式: " 0-2 和 2-6夹角为: 45.32 度"
-    angle_values = {}
-    angle_mapping = {
-        "0-2": "左肩", "1-3": "右肩",
-        "2-0": "左肘", "3-1": "右肘",
-        "6-8": "左膝", "7-9": "右膝"
-    }
-    
-    # 解析角度字符串
-    for angle_str in angles:
-        try:
-            # 提取角度值
-            angle_value = float(angle_str.split(":")[-1].split("度")[0].strip())
-            
-            # 提取关节标识
-            joint_part = angle_str.split("和")[0].strip()
-            
-            # 映射到关节名称
-            if joint_part in angle_mapping:
-                joint_name = angle_mapping[joint_part]
-                angle_values[joint_name] = angle_value
-        except Exception as e:
-            print(f"解析角度字符串出错: {e}, 字符串: {angle_str}")
+    # angles为model.compute_angles得到的夹角数组
+    angle_values = joint_angles(angles)
     
     # 计算角度差异
     total_diff = 0
@@ -446,27 +484,14 @@ def get_angle_data_for_image(img_path, posture):
             return {"practitioner_angles": [], "master_angles": []}
         
         # 处理图像，获取关键点
-        _, keypoints_data = model.process_frame(img)
+        _, keypoints_data, _ = pose_server.detect(img)
         if not keypoints_data:
             print(f"未检测到人体姿势: {img_path}")
             return {"practitioner_angles": [], "master_angles": []}
         
         # 计算关节角度
         try:
-            angles_str = model.calculate_angles(keypoints_data)
-            
-            # 解析角度字符串，转换为数值数据
-            practitioner_angles = []
-            for angle_str in angles_str:
-                try:
-                    joint_part = angle_str.split("和")[0].strip()
-                    angle_value = float(angle_str.split(":")[-1].split("度")[0].strip())
-                    practitioner_angles.append({
-                        "joint": angle_str.split(":")[0].strip(),
-                        "angle": angle_value
-                    })
-                except Exception as e:
-                    print(f"解析角度字符串出错: {e}")
+            practitioner_angles = angle_list(model.compute_angles(keypoints_data)[0])
             
             # 获取标准姿势的角度数据
             master_angles = get_master_angles_for_posture(posture)
@@ -497,42 +522,17 @@ def get_angle_data_from_frame(frame, posture):
     """
     try:
         # 处理图像，获取关键点
-        _, keypoints_data = model.process_frame(frame)
+        _, keypoints_data, _ = pose_server.detect(frame)
         if not keypoints_data:
             print("未检测到人体姿势，无法获取角度数据")
             return {}
         
         # 计算关节角度
         try:
-            angles_str = model.calculate_angles(keypoints_data)
-            
-            # 解析角度字符串，转换为结构化数据
-            angle_data = {}
-            angle_pairs = {
-                "肩部角度": ["0-2 和 2-4夹角", "1-3 和 3-5夹角"],
-                "肘部角度": ["2-4 和 4-6夹角", "3-5 和 5-7夹角"],
-                "髋部角度": ["0-8 和 8-10夹角", "1-9 和 9-11夹角"],
-                "膝部角度": ["8-10 和 10-12夹角", "9-11 和 11-13夹角"],
-                "躯干角度": ["2-0 和 0-6夹角", "3-1 和 1-7夹角"]
-            }
-            
-            # 从angles_str中提取角度值
-            for line in angles_str.split('\n'):
-                for joint_name, patterns in angle_pairs.items():
-                    for pattern in patterns:
-                        if pattern in line:
-                            try:
-                                angle_value = float(line.split('为')[1].split('度')[0].strip())
-                                if joint_name not in angle_data:
-                                    angle_data[joint_name] = []
-                                angle_data[joint_name].append(angle_value)
-                            except:
-                                pass
-            
-            # 获取标准姿势的角度数据
-            standard_angles = {}
-            if posture in ideal_angles:
-                standard_angles = ideal_angles[posture]
+            angles = model.compute_angles(keypoints_data)[0]
+            angle_data = {joint_name: [float(angles[i]) for i in indices]
+                          for joint_name, indices in VIDEO_ANGLE_GROUPS.items()}
+            standard_angles = dict(VIDEO_STANDARD_ANGLES)
             
             # 构建返回数据结构
             result = {
@@ -619,7 +619,7 @@ def get_angle_data_from_video(video_path, posture):
         cap.release()
         
         # 处理图像，获取关键点
-        processed_img, keypoints_data = model.process_frame(frame)
+        _, keypoints_data, _ = pose_server.detect(frame)
         if not keypoints_data:
             print(f"未检测到人体姿势: {video_path}")
             return {
@@ -641,46 +641,20 @@ def get_angle_data_from_video(video_path, posture):
         
         # 计算关节角度
         try:
-            angles_text = model.calculate_angles(keypoints_data)
+            angles = model.compute_angles(keypoints_data)[0]
         except Exception as e:
             print(f"计算关节角度出错: {e}")
-            angles_text = []
+            angles = np.zeros(0, dtype=np.float32)
         
-        # 解析角度数据，转换为更友好的格式
         angle_data = {
-            "current": {
-                "肩部角度": [],
-                "肘部角度": [],
-                "髋部角度": [],
-                "膝部角度": [],
-                "躯干角度": []
-            },
-            "standard": {
-                "肩部角度": 90,
-                "肘部角度": 170,
-                "髋部角度": 170,
-                "膝部角度": 170,
-                "躯干角度": 180
-            }
+            "current": {joint_name: [] for joint_name in VIDEO_STANDARD_ANGLES},
+            "standard": dict(VIDEO_STANDARD_ANGLES)
         }
         
         # 将计算的角度数据填入结构
-        for angle_text in angles_text:
-            parts = angle_text.split("夹角为:")
-            if len(parts) == 2:
-                joint_desc = parts[0].strip()
-                angle_value = float(parts[1].split()[0])
-                
-                if "13-11" in joint_desc or "14-12" in joint_desc:
-                    angle_data["current"]["肩部角度"].append(angle_value)
-                elif "13-15" in joint_desc or "14-16" in joint_desc:
-                    angle_data["current"]["肘部角度"].append(angle_value)
-                elif "11-23" in joint_desc or "12-24" in joint_desc:
-                    angle_data["current"]["躯干角度"].append(angle_value)
-                elif "23-25" in joint_desc or "24-26" in joint_desc:
-                    angle_data["current"]["髋部角度"].append(angle_value)
-                elif "25-27" in joint_desc or "26-28" in joint_desc:
-                    angle_data["current"]["膝部角度"].append(angle_value)
+        if len(angles) > 0:
+            for joint_name, indices in VIDEO_ANGLE_GROUPS.items():
+                angle_data["current"][joint_name] = [float(angles[i]) for i in indices]
         
         # 确保每个关节至少有一个角度值
         for joint in angle_data["current"]:
@@ -714,6 +688,9 @@ def get_angle_data_from_video(video_path, posture):
             }
         }
 
+# 未知姿势使用的默认标准角度
+DEFAULT_MASTER_ANGLES = [160.0, 160.0, 120.0, 120.0, 150.0, 150.0, 140.0, 140.0, 160.0, 160.0]
+
 def get_master_angles_for_posture(posture):
     """
     获取标准姿势的角度数据
@@ -724,172 +701,46 @@ def get_master_angles_for_posture(posture):
     Returns:
         list: 标准姿势的角度数据列表
     """
-    # 标准姿势的角度数据
-    master_angles = {
-        '弓步冲拳': [
-            {'joint': '0-2 和 2-4夹角为', 'angle': 155.60},
-            {'joint': '1-3 和 3-5夹角为', 'angle': 159.79},
-            {'joint': '2-0 和 0-6夹角为', 'angle': 115.97},
-            {'joint': '3-1 和 1-7夹角为', 'angle': 68.88},
-            {'joint': '0-6 和 6-8夹角为', 'angle': 151.87},
-            {'joint': '1-7 和 7-9夹角为', 'angle': 176.27},
-            {'joint': '7-6 和 6-8夹角为', 'angle': 134.59},
-            {'joint': '6-7 和 7-9夹角为', 'angle': 135.88},
-            {'joint': '6-8 和 8-10夹角为', 'angle': 150.69},
-            {'joint': '7-9 和 9-11夹角为', 'angle': 162.30}
-        ],
-        '猛虎出洞': [
-            {'joint': '0-2 和 2-4夹角为', 'angle': 175.45},
-            {'joint': '1-3 和 3-5夹角为', 'angle': 174.67},
-            {'joint': '2-0 和 0-6夹角为', 'angle': 130.23},
-            {'joint': '3-1 和 1-7夹角为', 'angle': 131.45},
-            {'joint': '0-6 和 6-8夹角为', 'angle': 165.67},
-            {'joint': '1-7 和 7-9夹角为', 'angle': 166.89},
-            {'joint': '7-6 和 6-8夹角为', 'angle': 155.34},
-            {'joint': '6-7 和 7-9夹角为', 'angle': 154.56},
-            {'joint': '6-8 和 8-10夹角为', 'angle': 170.78},
-            {'joint': '7-9 和 9-11夹角为', 'angle': 169.90}
-        ],
-        '五花坐山': [
-            {'joint': '0-2 和 2-4夹角为', 'angle': 90.45},
-            {'joint': '1-3 和 3-5夹角为', 'angle': 92.67},
-            {'joint': '2-0 和 0-6夹角为', 'angle': 95.23},
-            {'joint': '3-1 和 1-7夹角为', 'angle': 96.45},
-            {'joint': '0-6 和 6-8夹角为', 'angle': 125.67},
-            {'joint': '1-7 和 7-9夹角为', 'angle': 124.89},
-            {'joint': '7-6 和 6-8夹角为', 'angle': 90.34},
-            {'joint': '6-7 和 7-9夹角为', 'angle': 89.56},
-            {'joint': '6-8 和 8-10夹角为', 'angle': 135.78},
-            {'joint': '7-9 和 9-11夹角为', 'angle': 136.90}
-        ],
-        '滚身冲拳': [
-            {'joint': '0-2 和 2-4夹角为', 'angle': 160.45},
-            {'joint': '1-3 和 3-5夹角为', 'angle': 150.67},
-            {'joint': '2-0 和 0-6夹角为', 'angle': 120.23},
-            {'joint': '3-1 和 1-7夹角为', 'angle': 110.45},
-            {'joint': '0-6 和 6-8夹角为', 'angle': 145.67},
-            {'joint': '1-7 和 7-9夹角为', 'angle': 146.89},
-            {'joint': '7-6 和 6-8夹角为', 'angle': 140.34},
-            {'joint': '6-7 和 7-9夹角为', 'angle': 139.56},
-            {'joint': '6-8 和 8-10夹角为', 'angle': 155.78},
-            {'joint': '7-9 和 9-11夹角为', 'angle': 156.90}
-        ],
-        '猿猴纳肘': [
-            {'joint': '0-2 和 2-4夹角为', 'angle': 145.45},
-            {'joint': '1-3 和 3-5夹角为', 'angle': 144.67},
-            {'joint': '2-0 和 0-6夹角为', 'angle': 100.23},
-            {'joint': '3-1 和 1-7夹角为', 'angle': 101.45},
-            {'joint': '0-6 和 6-8夹角为', 'angle': 140.67},
-            {'joint': '1-7 和 7-9夹角为', 'angle': 141.89},
-            {'joint': '7-6 和 6-8夹角为', 'angle': 130.34},
-            {'joint': '6-7 和 7-9夹角为', 'angle': 129.56},
-            {'joint': '6-8 和 8-10夹角为', 'angle': 150.78},
-            {'joint': '7-9 和 9-11夹角为', 'angle': 151.90}
-        ],
-        '马步推掌': [
-            {'joint': '0-2 和 2-4夹角为', 'angle': 170.45},
-            {'joint': '1-3 和 3-5夹角为', 'angle': 171.67},
-            {'joint': '2-0 和 0-6夹角为', 'angle': 110.23},
-            {'joint': '3-1 和 1-7夹角为', 'angle': 111.45},
-            {'joint': '0-6 和 6-8夹角为', 'angle': 150.67},
-            {'joint': '1-7 和 7-9夹角为', 'angle': 151.89},
-            {'joint': '7-6 和 6-8夹角为', 'angle': 120.34},
-            {'joint': '6-7 和 7-9夹角为', 'angle': 119.56},
-            {'joint': '6-8 和 8-10夹角为', 'angle': 160.78},
-            {'joint': '7-9 和 9-11夹角为', 'angle': 161.90}
-        ]
-    }
-    
-    # 为其他姿势提供默认数据
-    default_angles = [
-        {'joint': '0-2 和 2-4夹角为', 'angle': 160.00},
-        {'joint': '1-3 和 3-5夹角为', 'angle': 160.00},
-        {'joint': '2-0 和 0-6夹角为', 'angle': 120.00},
-        {'joint': '3-1 和 1-7夹角为', 'angle': 120.00},
-        {'joint': '0-6 和 6-8夹角为', 'angle': 150.00},
-        {'joint': '1-7 和 7-9夹角为', 'angle': 150.00},
-        {'joint': '7-6 和 6-8夹角为', 'angle': 140.00},
-        {'joint': '6-7 和 7-9夹角为', 'angle': 140.00},
-        {'joint': '6-8 和 8-10夹角为', 'angle': 160.00},
-        {'joint': '7-9 和 9-11夹角为', 'angle': 160.00}
-    ]
-    
-    return master_angles.get(posture, default_angles)
-
-def process_video_frame_for_web(frame, posture='弓步冲拳'):
+    master = registry.get(posture)
+    return angle_list(master.angles if master is not None else DEFAULT_MASTER_ANGLES)
+
+def analyze_video_frame(frame, posture='弓步冲拳', session=None):
     """
-    处理视频帧并返回分析结果，用于网页实时分析
+    分析一帧视频，不绘制标注；视频只返回少数关键帧，标注在选出关键帧后再绘制
     
     Args:
         frame: 视频帧图像
         posture: 姿势类型
+        session: 可选的pose_session.VideoSession，传入时使用会话的跟踪模式估计器
         
     Returns:
-        tuple: (处理后的图像, 评分, 反馈信息)
+        tuple: (评分, PoseAnalysis, 反馈信息)，出错或未检测到人体时评分为0、分析结果为None
     """
     try:
-        # 处理图像，获取关键点
-        processed_img, keypoints_data = model.process_frame(frame)
-        if not keypoints_data:
-            return frame, 0.0, {"level": "错误", "suggestions": ["未检测到人体姿势，请确保您在摄像头范围内"]}
-        
-        # 计算关节角度
-        try:
-            angles = model.calculate_angles(keypoints_data)
-        except Exception as e:
-            print(f"计算关节角度出错: {e}")
-            angles = []
-        
-        # 根据姿势类型选择标准姿势数据
-        master_posture = None
-        if posture == '弓步冲拳':
-            master_posture = master_gong_bu_chong_quan
-        elif posture == '猛虎出洞':
-            master_posture = master_meng_hu_chu_dong
-        elif posture == '五花坐山':
-            master_posture = master_wu_hua_zuo_shan
-        elif posture == '滚身冲拳':
-            master_posture = master_gun_shen_chong_quan
-        elif posture == '猿猴纳肘':
-            master_posture = master_yuan_hou_na_zhou
-        elif posture == '马步推掌':
-            master_posture = master_ma_bu_tui_zhang
-        elif posture == '并步崩拳':
-            master_posture = master_bing_bu_beng_quan
-        elif posture == '狮子张嘴':
-            master_posture = master_shi_zi_zhang_zui
-        elif posture == '马步扣床':
-            master_posture = master_ma_bu_kou_chuang
-        elif posture == '罗汉张掌':
-            master_posture = master_luo_han_zhang_zhang
-        else:
-            return frame, 0.0, {"level": "错误", "suggestions": [f"未知姿势类型: {posture}"]}
-        
-        # 分析姿势并评分
-        score, feedback = analyze_pose(keypoints_data, master_posture, posture, angles)
-        
-        # 在图像上绘制关键点和骨架
-        for i, point in enumerate(keypoints_data):
-            cv2.circle(processed_img, (int(point[0]), int(point[1])), 5, (0, 255, 0), -1)
-            cv2.putText(processed_img, str(i), (int(point[0]), int(point[1])), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
-        
-        # 绘制骨架连接线
-        connections = [
-            (0, 1), (0, 2), (1, 3), (2, 4), (3, 5), (4, 6), (5, 7),
-            (6, 8), (7, 9), (8, 10), (9, 11), (0, 12), (1, 13)
-        ]
-        
-        for connection in connections:
-            if len(keypoints_data) > max(connection):
-                pt1 = (int(keypoints_data[connection[0]][0]), int(keypoints_data[connection[0]][1]))
-                pt2 = (int(keypoints_data[connection[1]][0]), int(keypoints_data[connection[1]][1]))
-                cv2.line(processed_img, pt1, pt2, (0, 0, 255), 2)
-        
-        # 在图像上显示分数
-        cv2.putText(processed_img, f"Score: {score:.1f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-        
-        return processed_img, score, feedback
+        analysis = analyze_frame(frame, posture, session=session)
+        if analysis.error == NO_PERSON_FEEDBACK:
+            return 0.0, None, {"level": "错误", "suggestions": ["未检测到人体姿势，请确保您在摄像头范围内"]}
+        if analysis.error:
+            return 0.0, None, analysis.feedback
+        return analysis.score, analysis, analysis.feedback
         
     except Exception as e:
         print(f"处理视频帧时出错: {e}")
-        return frame, 0.0, {"level": "错误", "suggestions": [f"分析出错: {str(e)}"]}
+        return 0.0, None, {"level": "错误", "suggestions": [f"分析出错: {str(e)}"]}
+
+def process_video_frame_for_web(frame, posture='弓步冲拳', session=None):
+    """
+    处理视频帧并返回带评分标注的图像，用于网页实时分析
+    
+    Args:
+        frame: 视频帧图像
+        posture: 姿势类型
+        session: 可选的pose_session.VideoSession，传入时使用会话的跟踪模式估计器
+        
+    Returns:
+        tuple: (处理后的图像, 评分, 反馈信息)
+    """
+    score, analysis, feedback = analyze_video_frame(frame, posture, session=session)
+    if analysis is None:
+        return frame, score, feedback
+    return analysis.render_overlay(f"Score: {score:.1f}"), score, feedback